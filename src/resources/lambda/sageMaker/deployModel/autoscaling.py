@@ -0,0 +1,129 @@
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from throughput_profiles import ThroughputProfile
+
+# Variant name used by both the SageMaker SDK deployment and the blue/green endpoint configs
+VARIANT_NAME = 'AllTraffic'
+SCALABLE_DIMENSION = 'sagemaker:variant:DesiredInstanceCount'
+
+
+def scaling_resource_id(endpoint_name: str, variant_name: str = VARIANT_NAME) -> str:
+    return f"endpoint/{endpoint_name}/variant/{variant_name}"
+
+
+class EndpointAutoScaling:
+    """Register an endpoint variant with Application Auto Scaling according to a throughput profile.
+
+    Async endpoints track ApproximateBacklogSizePerInstance, the depth of their request
+    queue. When the profile allows zero instances, a step policy on HasBacklogWithoutCapacity
+    brings the first instance back, since a backlog per instance cannot be tracked while
+    there are none. Real-time endpoints track invocations per instance and keep at least one.
+    """
+
+    def __init__(self, autoscaling_client: Any, cloudwatch_client: Any):
+        self._autoscaling = autoscaling_client
+        self._cloudwatch = cloudwatch_client
+
+    def register(self, endpoint_name: str, profile: ThroughputProfile, asynchronous: bool, instance_count: int) -> Optional[Dict[str, int]]:
+        """Apply the profile's scaling policies; returns the capacity range, or None for a fixed instance count."""
+        if profile.max_capacity is None:
+            self.deregister(endpoint_name)
+            return None
+
+        resource_id = scaling_resource_id(endpoint_name)
+        min_capacity = profile.min_capacity if asynchronous else max(1, profile.min_capacity)
+        max_capacity = max(profile.max_capacity, instance_count)
+        self._autoscaling.register_scalable_target(
+            ServiceNamespace='sagemaker',
+            ResourceId=resource_id,
+            ScalableDimension=SCALABLE_DIMENSION,
+            MinCapacity=min_capacity,
+            MaxCapacity=max_capacity,
+        )
+
+        if asynchronous:
+            metric = {
+                'CustomizedMetricSpecification': {
+                    'MetricName': 'ApproximateBacklogSizePerInstance',
+                    'Namespace': 'AWS/SageMaker',
+                    'Dimensions': [{'Name': 'EndpointName', 'Value': endpoint_name}],
+                    'Statistic': 'Average',
+                },
+                'TargetValue': profile.target_backlog_per_instance,
+            }
+        else:
+            metric = {
+                'PredefinedMetricSpecification': {'PredefinedMetricType': 'SageMakerVariantInvocationsPerInstance'},
+                'TargetValue': profile.target_invocations_per_instance,
+            }
+
+        self._autoscaling.put_scaling_policy(
+            PolicyName=f"{endpoint_name}-target-tracking",
+            ServiceNamespace='sagemaker',
+            ResourceId=resource_id,
+            ScalableDimension=SCALABLE_DIMENSION,
+            PolicyType='TargetTrackingScaling',
+            TargetTrackingScalingPolicyConfiguration={
+                **metric,
+                'ScaleInCooldown': profile.scale_in_cooldown,
+                'ScaleOutCooldown': profile.scale_out_cooldown,
+            },
+        )
+
+        if min_capacity == 0:
+            self._register_scale_from_zero(endpoint_name, profile)
+        else:
+            self._delete_alarm(endpoint_name)
+
+        return {'MinCapacity': min_capacity, 'MaxCapacity': max_capacity}
+
+    def deregister(self, endpoint_name: str) -> None:
+        """Remove the endpoint's scaling target with its policies; a missing target is not an error."""
+        self._delete_alarm(endpoint_name)
+        try:
+            self._autoscaling.deregister_scalable_target(
+                ServiceNamespace='sagemaker',
+                ResourceId=scaling_resource_id(endpoint_name),
+                ScalableDimension=SCALABLE_DIMENSION,
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ObjectNotFoundException':
+                raise
+
+    def _register_scale_from_zero(self, endpoint_name: str, profile: ThroughputProfile) -> None:
+        policy = self._autoscaling.put_scaling_policy(
+            PolicyName=f"{endpoint_name}-scale-from-zero",
+            ServiceNamespace='sagemaker',
+            ResourceId=scaling_resource_id(endpoint_name),
+            ScalableDimension=SCALABLE_DIMENSION,
+            PolicyType='StepScaling',
+            StepScalingPolicyConfiguration={
+                'AdjustmentType': 'ChangeInCapacity',
+                'MetricAggregationType': 'Average',
+                'Cooldown': profile.scale_out_cooldown,
+                'StepAdjustments': [{'MetricIntervalLowerBound': 0, 'ScalingAdjustment': 1}],
+            },
+        )
+        self._cloudwatch.put_metric_alarm(
+            AlarmName=self._alarm_name(endpoint_name),
+            MetricName='HasBacklogWithoutCapacity',
+            Namespace='AWS/SageMaker',
+            Dimensions=[{'Name': 'EndpointName', 'Value': endpoint_name}],
+            Statistic='Average',
+            Period=60,
+            EvaluationPeriods=1,
+            Threshold=1,
+            ComparisonOperator='GreaterThanOrEqualToThreshold',
+            TreatMissingData='missing',
+            AlarmActions=[policy['PolicyARN']],
+        )
+
+    def _delete_alarm(self, endpoint_name: str) -> None:
+        # DeleteAlarms succeeds for alarms that do not exist
+        self._cloudwatch.delete_alarms(AlarmNames=[self._alarm_name(endpoint_name)])
+
+    @staticmethod
+    def _alarm_name(endpoint_name: str) -> str:
+        return f"{endpoint_name}-has-backlog-without-capacity"
@@ -0,0 +1,149 @@
+"""Replay recorded inference requests against an endpoint to compare throughput profiles.
+
+Each line of the requests file is one request: a TGI payload ({"inputs": ..., "parameters": ...})
+or a Messages API payload ({"messages": [...]}, as the extraction step sends page images) is
+sent as is, and for any other JSON object the first of `inputs`, `prompt`, `body` or `text`
+becomes the prompt. Every image counts as --image-tokens prompt tokens, by default a full
+page from the converter's standard render profile. Requests are sent with at most MAX_CONCURRENT_INVOCATIONS_PER_INSTANCE x
+instances in flight, which is how the async queue feeds the endpoint.
+
+Without --endpoint-url every profile is served by a local stand-in (see stand_in_endpoint),
+with times scaled by --time-scale and reported back in unscaled seconds. With --endpoint-url,
+requests go to a running container instead, e.g. the TGI image started locally with the
+environment of one profile, and only the client side of the profile applies.
+
+Usage (from the deployModel directory):
+
+    python benchmarks/load_test.py requests.jsonl [--profiles standard balanced throughput]
+        [--instances 1] [--repeat 1] [--time-scale 0.01] [--endpoint-url http://localhost:8080/invocations]
+        [--output report.json]
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+# Imported first: it puts the lambda directory on the path for the imports below
+from stand_in_endpoint import CostModel, StandInEndpoint, request_tokens
+from blue_green import percentile  # noqa: E402
+from throughput_profiles import THROUGHPUT_PROFILES, ThroughputProfile, get_throughput_profile  # noqa: E402
+
+PROMPT_FIELDS = ('inputs', 'prompt', 'body', 'text')
+
+
+def load_requests(path: str, max_new_tokens: int) -> List[Dict[str, Any]]:
+    payloads = []
+    with open(path) as requests_file:
+        for line in requests_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict) and ('inputs' in record or 'messages' in record):
+                payloads.append(record)
+                continue
+            prompt = next((record[field] for field in PROMPT_FIELDS if isinstance(record, dict) and field in record), record)
+            payloads.append({'inputs': prompt if isinstance(prompt, str) else json.dumps(prompt), 'parameters': {'max_new_tokens': max_new_tokens}})
+    return payloads
+
+
+def invoke(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return {'status': status, 'seconds': time.perf_counter() - start}
+
+
+def replay(url: str, payloads: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Send every payload with at most `concurrency` in flight; returns per-request results and wall time."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda payload: invoke(url, payload), payloads))
+    return {'results': results, 'seconds': time.perf_counter() - start}
+
+
+def summarize(profile: ThroughputProfile, payloads: List[Dict[str, Any]], run: Dict[str, Any], time_scale: float) -> Dict[str, Any]:
+    """Throughput and latency of one replay, in unscaled seconds."""
+    results = run['results']
+    succeeded = [result['seconds'] / time_scale for result in results if result['status'] == 200] or [0.0]
+    generated = sum(request_tokens(payload)[1] for payload, result in zip(payloads, results) if result['status'] == 200)
+    wall_seconds = run['seconds'] / time_scale
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result['status'])] = statuses.get(str(result['status']), 0) + 1
+
+    return {
+        'profile': profile.name,
+        'requests': len(results),
+        'succeeded': statuses.get('200', 0),
+        'statuses': statuses,
+        'requestsPerMinute': round(statuses.get('200', 0) / wall_seconds * 60, 1) if wall_seconds else 0.0,
+        'generatedTokensPerSecond': round(generated / wall_seconds, 1) if wall_seconds else 0.0,
+        'latencyP50Seconds': round(percentile(succeeded, 0.5), 2),
+        'latencyP95Seconds': round(percentile(succeeded, 0.95), 2),
+        'latencyP99Seconds': round(percentile(succeeded, 0.99), 2),
+    }
+
+
+def run_profile(profile: ThroughputProfile, payloads: List[Dict[str, Any]], instances: int, time_scale: float, cost: Optional[CostModel] = None, endpoint_url: Optional[str] = None) -> Dict[str, Any]:
+    concurrency = profile.max_concurrent_invocations_per_instance * instances
+    if endpoint_url:
+        return summarize(profile, payloads, replay(endpoint_url, payloads, concurrency), 1.0)
+
+    with StandInEndpoint(profile, instances, cost, time_scale) as stand_in:
+        return summarize(profile, payloads, replay(stand_in.url, payloads, concurrency), time_scale)
+
+
+def print_report(reports: List[Dict[str, Any]]) -> None:
+    columns = ['profile', 'succeeded', 'requests', 'requestsPerMinute', 'generatedTokensPerSecond', 'latencyP50Seconds', 'latencyP95Seconds', 'latencyP99Seconds']
+    widths = [max(len(column), *(len(str(report[column])) for report in reports)) for column in columns]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for report in reports:
+        print('  '.join(str(report[column]).ljust(width) for column, width in zip(columns, widths)))
+        rejected = {status: count for status, count in report['statuses'].items() if status != '200'}
+        if rejected:
+            print(f"  {report['profile']}: rejected {rejected} (422 prompt over MAX_INPUT_LENGTH, 429 over MAX_CONCURRENT_REQUESTS)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay inference requests against throughput profiles')
+    parser.add_argument('requests', help='JSON lines file of requests')
+    parser.add_argument('--profiles', nargs='+', default=list(THROUGHPUT_PROFILES), choices=list(THROUGHPUT_PROFILES))
+    parser.add_argument('--instances', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1, help='replay the file this many times')
+    parser.add_argument('--max-new-tokens', type=int, default=512, help='for requests that are not TGI payloads')
+    parser.add_argument('--time-scale', type=float, default=0.01, help='stand-in time per unit of simulated time')
+    parser.add_argument('--prefill-ms-per-token', type=float, default=CostModel.prefill_ms_per_token)
+    parser.add_argument('--decode-ms-per-token', type=float, default=CostModel.decode_ms_per_token)
+    parser.add_argument('--batch-slowdown', type=float, default=CostModel.batch_slowdown)
+    parser.add_argument('--image-tokens', type=int, default=CostModel.image_tokens, help='prompt tokens per image, e.g. the converter\'s IMAGE_TOKEN_BUDGET')
+    parser.add_argument('--endpoint-url', help='send to this /invocations URL instead of the stand-in')
+    parser.add_argument('--output', help='also write the reports as JSON')
+    args = parser.parse_args()
+
+    payloads = load_requests(args.requests, args.max_new_tokens) * args.repeat
+    if not payloads:
+        sys.exit(f"No requests in {args.requests}")
+    cost = CostModel(args.prefill_ms_per_token, args.decode_ms_per_token, args.batch_slowdown, args.image_tokens)
+
+    reports = [
+        run_profile(get_throughput_profile(name), payloads, args.instances, args.time_scale, cost, args.endpoint_url)
+        for name in args.profiles
+    ]
+    print_report(reports)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(reports, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""A local stand-in for the TGI container behind the SageMaker endpoint.
+
+Serves POST /invocations like the real container, without a GPU. Each simulated instance
+admits requests the way TGI does under a throughput profile: prompts longer than
+MAX_INPUT_LENGTH get a 422, requests beyond MAX_CONCURRENT_REQUESTS get a 429, and
+admitted requests wait until their tokens fit in MAX_BATCH_TOTAL_TOKENS. Images in a
+request count as the tokens of a full rendered page. A request then
+takes a prefill time per prompt token plus a decode step per generated token, and every
+decode step slows down a little for each other request in the batch.
+
+Times are multiplied by `time_scale`, so a replay finishes in a fraction of real time.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAMBDA_DIR)
+
+from throughput_profiles import FULL_PAGE_IMAGE_TOKENS, THROUGHPUT_PROFILES, ThroughputProfile, get_throughput_profile  # noqa: E402
+
+# TGI sizes its batch from free GPU memory when MAX_BATCH_TOTAL_TOKENS is unset
+DEFAULT_BATCH_TOTAL_TOKENS = 16000
+DEFAULT_MAX_CONCURRENT_REQUESTS = 128
+DEFAULT_MAX_NEW_TOKENS = 128
+# Images TGI reads from markdown in `inputs`, e.g. ![](https://...) or ![](data:image/png;base64,...)
+MARKDOWN_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """Per-token cost of the simulated model, in milliseconds of real time."""
+    prefill_ms_per_token: float = 0.25
+    decode_ms_per_token: float = 30.0
+    # Relative slowdown of a decode step per additional request in the batch
+    batch_slowdown: float = 0.04
+    # Prompt tokens of each image in a request
+    image_tokens: int = FULL_PAGE_IMAGE_TOKENS
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English text
+    return len(text) // 4 + 1
+
+
+def request_tokens(payload: Dict[str, Any], image_tokens: int = FULL_PAGE_IMAGE_TOKENS) -> Tuple[int, int]:
+    """Prompt and completion token counts of a TGI request or Messages API payload.
+
+    The image size is not known from its URL, so every image counts as `image_tokens`,
+    by default a full page from the converter's standard render profile.
+    """
+    if 'messages' in payload:
+        prompt_tokens = 0
+        for message in payload['messages']:
+            content = message.get('content', '')
+            parts = [{'type': 'text', 'text': content}] if isinstance(content, str) else content
+            for part in parts:
+                prompt_tokens += image_tokens if part.get('type') == 'image_url' else estimate_tokens(part.get('text', ''))
+        return prompt_tokens, int(payload.get('max_tokens') or DEFAULT_MAX_NEW_TOKENS)
+
+    inputs = payload.get('inputs', '')
+    if not isinstance(inputs, str):
+        inputs = json.dumps(inputs)
+    images = len(MARKDOWN_IMAGE.findall(inputs))
+    parameters = payload.get('parameters') or {}
+    return estimate_tokens(MARKDOWN_IMAGE.sub('', inputs)) + images * image_tokens, int(parameters.get('max_new_tokens', DEFAULT_MAX_NEW_TOKENS))
+
+
+class StandInInstance:
+    """One simulated endpoint instance with TGI's admission and batching."""
+
+    def __init__(self, profile: ThroughputProfile, cost: CostModel, time_scale: float):
+        self.profile = profile
+        self.cost = cost
+        self.time_scale = time_scale
+        self.batch_total_tokens = profile.max_batch_total_tokens or DEFAULT_BATCH_TOTAL_TOKENS
+        self.max_concurrent_requests = profile.max_concurrent_requests or DEFAULT_MAX_CONCURRENT_REQUESTS
+        self.in_flight = 0
+        self._tokens_in_use = 0
+        self._batch_size = 0
+        self._condition = threading.Condition()
+
+    def generate(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Serve one request; returns an HTTP status and response body."""
+        prompt_tokens, new_tokens = request_tokens(payload, self.cost.image_tokens)
+        if self.profile.max_input_length and prompt_tokens > self.profile.max_input_length:
+            return 422, {'error': f'Input validation error: inputs must have less than {self.profile.max_input_length} tokens'}
+        tokens = min(prompt_tokens + new_tokens, self.batch_total_tokens)
+
+        with self._condition:
+            if self.in_flight >= self.max_concurrent_requests:
+                return 429, {'error': 'Model is overloaded'}
+            self.in_flight += 1
+            self._condition.wait_for(lambda: self._tokens_in_use + tokens <= self.batch_total_tokens)
+            self._tokens_in_use += tokens
+            self._batch_size += 1
+            batch_size = self._batch_size
+
+        try:
+            step_ms = self.cost.decode_ms_per_token * (1 + self.cost.batch_slowdown * (batch_size - 1))
+            time.sleep((prompt_tokens * self.cost.prefill_ms_per_token + new_tokens * step_ms) / 1000 * self.time_scale)
+        finally:
+            with self._condition:
+                self._tokens_in_use -= tokens
+                self._batch_size -= 1
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+        return 200, {'generated_text': 'stand-in ' * new_tokens, 'details': {'generated_tokens': new_tokens}}
+
+
+class StandInEndpoint:
+    """HTTP server routing each request to the least busy of `instance_count` simulated instances."""
+
+    def __init__(self, profile: ThroughputProfile, instance_count: int = 1, cost: Optional[CostModel] = None, time_scale: float = 1.0, port: int = 0):
+        self.instances: List[StandInInstance] = [StandInInstance(profile, cost or CostModel(), time_scale) for _ in range(instance_count)]
+        self._routing = threading.Lock()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                # The container's health check
+                self._respond(200, {} if self.path == '/ping' else {'error': 'not found'})
+
+            def do_POST(self):
+                if self.path != '/invocations':
+                    self._respond(404, {'error': 'not found'})
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                status, body = endpoint._route().generate(payload)
+                self._respond(status, [body] if status == 200 else body)
+
+            def _respond(self, status, body):
+                encoded = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/invocations"
+
+    def _route(self) -> StandInInstance:
+        with self._routing:
+            return min(self.instances, key=lambda instance: instance.in_flight)
+
+    def __enter__(self) -> 'StandInEndpoint':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    # Serve a profile on a fixed port, e.g. to point other tools at it
+    parser = argparse.ArgumentParser(description='Serve a throughput profile like the TGI container')
+    parser.add_argument('profile', nargs='?', default='standard', choices=list(THROUGHPUT_PROFILES))
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    with StandInEndpoint(get_throughput_profile(args.profile), port=args.port) as stand_in:
+        print(f"Serving profile {args.profile} at {stand_in.url}")
+        threading.Event().wait()
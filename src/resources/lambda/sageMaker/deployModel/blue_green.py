@@ -0,0 +1,214 @@
+import json
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+logger = Logger(service="deploy model", child=True)
+
+# Sent to a new endpoint before it is reported ready; its round trips are the latency probe
+HEALTH_CHECK_PAYLOAD = {
+    "inputs": "What is the capital of France?",
+    "parameters": {
+        "do_sample": True,
+        "max_new_tokens": 128,
+        "temperature": 0.7,
+        "top_k": 50,
+        "top_p": 0.95,
+    }
+}
+
+ASYNC_POLL_SECONDS = 1.0
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of `samples` (fraction 0.5 for p50, 0.95 for p95)."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def versioned_name(base: str, version: str) -> str:
+    # SageMaker names are limited to 63 characters
+    return f"{base[:62 - len(version)]}-{version}"
+
+
+class EndpointRollout:
+    """Roll a model out to an endpoint without taking it down, then probe it.
+
+    `start` registers a new model and endpoint config and points the endpoint at them with
+    update_endpoint, which SageMaker performs blue/green: the old fleet keeps serving until
+    the new one passes its health checks, and rolls back if it does not. `is_ready` is then
+    polled (by the custom resource provider's waiter) until the endpoint serves the new
+    config, after which `probe` measures latency and `retire` removes the old config.
+
+    Clients are passed in, so every call can be stubbed in tests.
+    """
+
+    def __init__(self, sagemaker_client: Any, runtime_client: Any, s3_client: Any = None, clock: Callable[[], float] = time.perf_counter, sleep: Callable[[float], None] = time.sleep):
+        self._sagemaker = sagemaker_client
+        self._runtime = runtime_client
+        self._s3 = s3_client
+        self._clock = clock
+        self._sleep = sleep
+
+    def current_config(self, endpoint_name: str) -> Optional[str]:
+        try:
+            return self._sagemaker.describe_endpoint(EndpointName=endpoint_name)['EndpointConfigName']
+        except ClientError as e:
+            if 'Could not find endpoint' in e.response.get('Error', {}).get('Message', ''):
+                return None
+            raise
+
+    def start(self, endpoint_name: str, model_name: str, version: str, image_uri: str, environment: Dict[str, str], role_arn: str, instance_type: str, instance_count: int, async_inference_config: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        """Create the new model and endpoint config and start moving the endpoint onto them."""
+        new_model = versioned_name(model_name, version)
+        new_config = versioned_name(endpoint_name, version)
+        previous_config = self.current_config(endpoint_name)
+
+        self._sagemaker.create_model(
+            ModelName=new_model,
+            PrimaryContainer={'Image': image_uri, 'Environment': environment},
+            ExecutionRoleArn=role_arn,
+        )
+
+        config = {
+            'EndpointConfigName': new_config,
+            'ProductionVariants': [{
+                'VariantName': 'AllTraffic',
+                'ModelName': new_model,
+                'InstanceType': instance_type,
+                'InitialInstanceCount': instance_count,
+            }],
+        }
+        if async_inference_config:
+            config['AsyncInferenceConfig'] = async_inference_config
+        self._sagemaker.create_endpoint_config(**config)
+
+        if previous_config is None:
+            self._sagemaker.create_endpoint(EndpointName=endpoint_name, EndpointConfigName=new_config)
+        else:
+            self._sagemaker.update_endpoint(
+                EndpointName=endpoint_name,
+                EndpointConfigName=new_config,
+                RetainAllVariantProperties=False,
+                DeploymentConfig={
+                    'BlueGreenUpdatePolicy': {
+                        'TrafficRoutingConfiguration': {'Type': 'ALL_AT_ONCE', 'WaitIntervalInSeconds': 0},
+                        'TerminationWaitInSeconds': 0,
+                    },
+                },
+            )
+
+        return {
+            'EndpointName': endpoint_name,
+            'ModelName': new_model,
+            'EndpointConfigName': new_config,
+            'PreviousEndpointConfigName': previous_config or '',
+        }
+
+    def is_ready(self, endpoint_name: str, target_config: str) -> bool:
+        """Whether the endpoint serves `target_config`; raises if the rollout failed or was rolled back."""
+        endpoint = self._sagemaker.describe_endpoint(EndpointName=endpoint_name)
+        status = endpoint['EndpointStatus']
+        if status == 'Failed':
+            raise RuntimeError(f"Endpoint {endpoint_name} failed: {endpoint.get('FailureReason', 'unknown reason')}")
+        if status != 'InService':
+            return False
+        if endpoint['EndpointConfigName'] != target_config:
+            # update_endpoint returns the endpoint to InService on the old config when the new one fails
+            raise RuntimeError(f"Endpoint {endpoint_name} was rolled back to {endpoint['EndpointConfigName']}: {endpoint.get('FailureReason', 'unknown reason')}")
+        return True
+
+    def probe(self, endpoint_name: str, requests: int, async_input_uri: Optional[str] = None, async_timeout: float = 300.0) -> Dict[str, float]:
+        """Send the health-check prompt `requests` times and return p50/p95 latency in milliseconds.
+
+        With `async_input_uri` the endpoint is invoked asynchronously, with the prompt read
+        from that S3 location, and latency runs until the output object appears. All async
+        requests together must finish within `async_timeout` seconds.
+        """
+        deadline = self._clock() + async_timeout
+        if async_input_uri:
+            bucket, key = self._split_uri(async_input_uri)
+            self._s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(HEALTH_CHECK_PAYLOAD).encode('utf-8'), ContentType='application/json')
+
+        samples = []
+        for _ in range(max(1, requests)):
+            start = self._clock()
+            if async_input_uri:
+                self._invoke_async(endpoint_name, async_input_uri, deadline)
+            else:
+                response = self._runtime.invoke_endpoint(EndpointName=endpoint_name, ContentType='application/json', Body=json.dumps(HEALTH_CHECK_PAYLOAD))
+                response['Body'].read()
+            samples.append((self._clock() - start) * 1000)
+
+        return {
+            'LatencyP50Ms': round(percentile(samples, 0.5), 1),
+            'LatencyP95Ms': round(percentile(samples, 0.95), 1),
+            'ProbeRequests': len(samples),
+        }
+
+    def retire(self, previous_config: str, keep_models: List[str]) -> None:
+        """Delete a replaced endpoint config and its models (other than `keep_models`)."""
+        if not previous_config:
+            return
+        for model in self._config_models(previous_config):
+            if model not in keep_models:
+                self._ignore_missing(self._sagemaker.delete_model, ModelName=model)
+        self._ignore_missing(self._sagemaker.delete_endpoint_config, EndpointConfigName=previous_config)
+
+    def delete(self, endpoint_name: str) -> None:
+        """Delete the endpoint together with the config and models it serves."""
+        config = self.current_config(endpoint_name)
+        if config is None:
+            return
+        models = self._config_models(config)
+        self._sagemaker.delete_endpoint(EndpointName=endpoint_name)
+        self._ignore_missing(self._sagemaker.delete_endpoint_config, EndpointConfigName=config)
+        for model in models:
+            self._ignore_missing(self._sagemaker.delete_model, ModelName=model)
+
+    def _config_models(self, config: str) -> List[str]:
+        try:
+            variants = self._sagemaker.describe_endpoint_config(EndpointConfigName=config)['ProductionVariants']
+        except ClientError:
+            return []
+        return [variant['ModelName'] for variant in variants]
+
+    def _invoke_async(self, endpoint_name: str, input_uri: str, deadline: float) -> None:
+        response = self._runtime.invoke_endpoint_async(EndpointName=endpoint_name, InputLocation=input_uri, ContentType='application/json')
+        output = self._split_uri(response['OutputLocation'])
+        failure = self._split_uri(response['FailureLocation']) if response.get('FailureLocation') else None
+
+        while self._clock() < deadline:
+            if self._exists(*output):
+                return
+            if failure and self._exists(*failure):
+                raise RuntimeError(f"Async health check failed, see {response['FailureLocation']}")
+            self._sleep(ASYNC_POLL_SECONDS)
+        raise TimeoutError(f"No async health check output for {response['OutputLocation']} before the probe deadline")
+
+    def _exists(self, bucket: str, key: str) -> bool:
+        try:
+            self._s3.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    @staticmethod
+    def _split_uri(uri: str):
+        parsed = urlparse(uri)
+        return parsed.netloc, parsed.path.lstrip('/')
+
+    @staticmethod
+    def _ignore_missing(operation: Callable, **kwargs) -> None:
+        """Run a delete call, treating a resource that is already gone as deleted."""
+        try:
+            operation(**kwargs)
+        except ClientError as e:
+            error = e.response.get('Error', {})
+            if error.get('Code') != 'ValidationException' or 'Could not find' not in error.get('Message', ''):
+                raise
+            logger.info(f"Nothing to delete for {kwargs}: {error['Message']}")
@@ -1,11 +1,15 @@
-import json
 from sagemaker import Session
 import boto3
 from sagemaker.huggingface import HuggingFaceModel, get_huggingface_llm_image_uri
 from sagemaker.async_inference import AsyncInferenceConfig
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from aws_lambda_powertools import Logger
 import os
+import time
+
+from autoscaling import EndpointAutoScaling
+from blue_green import HEALTH_CHECK_PAYLOAD, EndpointRollout
+from throughput_profiles import ThroughputProfile, get_throughput_profile
 
 logger = Logger(service="deploy model")
 
@@ -22,9 +26,24 @@ INFERENCE_TYPE = os.environ.get('INFERENCE_TYPE', 'SYNC')  # Default to SYNC if
 ASYNC_S3_BUCKET = os.environ.get('ASYNC_S3_BUCKET')  # S3 bucket for async inference
 ASYNC_SNS_TOPIC = os.environ.get('ASYNC_SNS_TOPIC')  # Optional SNS topic for notifications
 
+# RECREATE: delete and redeploy the endpoint inside one invocation (downtime while it deploys)
+# BLUE_GREEN: move the live endpoint onto a new config with update_endpoint; is_complete polls until it serves
+DEPLOYMENT_MODE = os.environ.get('DEPLOYMENT_MODE', 'RECREATE')
+# Health-check prompts sent to a blue/green endpoint once it serves; their latency is reported as p50/p95
+PROBE_REQUESTS = int(os.environ.get('PROBE_REQUESTS', '5'))
+# Shared by all async probes, so is_complete stays well inside its 15 minute Lambda timeout
+PROBE_ASYNC_TIMEOUT_SECONDS = float(os.environ.get('PROBE_ASYNC_TIMEOUT_SECONDS', '300'))
+# TGI batching limits, async concurrency and autoscaling of the endpoint (see throughput_profiles)
+THROUGHPUT_PROFILE = os.environ.get('THROUGHPUT_PROFILE', 'standard')
+
 # Global Boto3 session
 boto_session = boto3.Session()
 sagemaker_session = Session(boto_session)
+sagemaker_client = boto_session.client('sagemaker')
+runtime_client = boto_session.client('sagemaker-runtime')
+s3_client = boto_session.client('s3')
+autoscaling_client = boto_session.client('application-autoscaling')
+cloudwatch_client = boto_session.client('cloudwatch')
 
 def delete_existing_model(model_name):
     try:
@@ -65,7 +84,7 @@ def create_async_inference_config():
 
     async_config = AsyncInferenceConfig(
         output_path=s3_output_path,
-        max_concurrent_invocations_per_instance=4,
+        max_concurrent_invocations_per_instance=get_profile().max_concurrent_invocations_per_instance,
         notification_config=notification_config if notification_config else None,
         failure_path=s3_error_path,
     )
@@ -107,18 +126,7 @@ def deploy_model_async(role: str, huggingface_model: HuggingFaceModel) -> None:
 def test_sync_endpoint(predictor):
     """Test synchronous endpoint with a sample request."""
     try:
-        response = predictor.predict(
-            {
-                "inputs": "What is the capital of France?",
-                "parameters": {
-                    "do_sample": True,
-                    "max_new_tokens": 128,
-                    "temperature": 0.7,
-                    "top_k": 50,
-                    "top_p": 0.95,
-                }
-            }
-        )
+        response = predictor.predict(HEALTH_CHECK_PAYLOAD)
         logger.info(f"Sync endpoint test successful: {response}")
     except Exception as e:
         logger.error(f"Sync endpoint test failed: {e}")
@@ -128,40 +136,88 @@ def test_async_endpoint(predictor):
     """Test asynchronous endpoint with a sample request."""
     try:
         # For async endpoints, predict returns a response with the invocation output location
-        response = predictor.predict_async(
-            {
-                "inputs": "What is the capital of France?",
-                "parameters": {
-                    "do_sample": True,
-                    "max_new_tokens": 128,
-                    "temperature": 0.7,
-                    "top_k": 50,
-                    "top_p": 0.95,
-                }
-            }
-        )
+        response = predictor.predict_async(HEALTH_CHECK_PAYLOAD)
         logger.info(f"Async endpoint test initiated: {response}")
     except Exception as e:
         logger.error(f"Async endpoint test failed: {e}")
         raise
 
+def get_profile() -> ThroughputProfile:
+    return get_throughput_profile(THROUGHPUT_PROFILE)
+
+def get_hub_environment() -> Dict[str, str]:
+    """Container environment of the TGI model, with the throughput profile's batching limits."""
+    return {
+        'HF_MODEL_ID': HF_MODEL_ID,
+        **get_profile().tgi_environment(),
+    }
+
+def get_image_uri() -> str:
+    return get_huggingface_llm_image_uri("huggingface", version="3.2.3")
+
+def async_inference_request() -> Dict[str, Any]:
+    """The endpoint config's AsyncInferenceConfig, as create_async_inference_config builds it for the SDK."""
+    config = create_async_inference_config()
+    output_config = {'S3OutputPath': config.output_path, 'S3FailurePath': config.failure_path}
+    if config.notification_config:
+        output_config['NotificationConfig'] = config.notification_config
+    return {
+        'OutputConfig': output_config,
+        'ClientConfig': {'MaxConcurrentInvocationsPerInstance': config.max_concurrent_invocations_per_instance},
+    }
+
+def validate_inference_type() -> None:
+    if INFERENCE_TYPE not in ['SYNC', 'ASYNC']:
+        raise ValueError(f"Invalid INFERENCE_TYPE: {INFERENCE_TYPE}. Must be 'SYNC' or 'ASYNC'")
+
+def get_rollout() -> EndpointRollout:
+    return EndpointRollout(sagemaker_client, runtime_client, s3_client)
+
+def get_autoscaling() -> EndpointAutoScaling:
+    return EndpointAutoScaling(autoscaling_client, cloudwatch_client)
+
+def register_autoscaling() -> Dict[str, Any]:
+    """Apply the throughput profile's scaling policies to the endpoint, which must be in service."""
+    capacity = get_autoscaling().register(ENDPOINT_NAME, get_profile(), INFERENCE_TYPE == 'ASYNC', int(INSTANCE_COUNT))
+    logger.info(f"Autoscaling of {ENDPOINT_NAME} with profile {THROUGHPUT_PROFILE}: {capacity or 'fixed instance count'}")
+    return {'ThroughputProfile': THROUGHPUT_PROFILE, **(capacity or {})}
+
+def start_blue_green_deployment(role: str) -> Dict[str, str]:
+    """Register a new model version and start moving the endpoint onto it; is_complete finishes the rollout."""
+    validate_inference_type()
+    version = time.strftime('%Y%m%d%H%M%S', time.gmtime())
+    logger.info(f"Starting blue/green deployment of version {version}")
+
+    # Scaling policies are detached while the endpoint moves to the new fleet; is_complete registers them again
+    get_autoscaling().deregister(ENDPOINT_NAME)
+
+    data = get_rollout().start(
+        ENDPOINT_NAME,
+        MODEL_NAME,
+        version,
+        get_image_uri(),
+        get_hub_environment(),
+        role,
+        INSTANCE_TYPE,
+        int(INSTANCE_COUNT),
+        async_inference_request() if INFERENCE_TYPE == 'ASYNC' else None,
+    )
+    logger.info(f"Blue/green deployment started: {data}")
+    return data
+
 def deploy_model(role: str) -> None:
     """Deploy model to SageMaker Inference (Sync or Async based on INFERENCE_TYPE)."""
     try:
         # Validate inference type
-        if INFERENCE_TYPE not in ['SYNC', 'ASYNC']:
-            raise ValueError(f"Invalid INFERENCE_TYPE: {INFERENCE_TYPE}. Must be 'SYNC' or 'ASYNC'")
+        validate_inference_type()
 
         # Hub Model configuration
-        hub = {
-            'HF_MODEL_ID': HF_MODEL_ID,
-            'SM_NUM_GPUS': json.dumps(1),
-        }
+        hub = get_hub_environment()
 
         logger.info(f"deploy_model: {hub}")
         logger.info(f"Inference type: {INFERENCE_TYPE}")
 
-        image_uri = get_huggingface_llm_image_uri("huggingface", version="3.2.3")
+        image_uri = get_image_uri()
 
         # Create Hugging Face Model Class
         huggingface_model = HuggingFaceModel(
@@ -178,6 +234,8 @@ def deploy_model(role: str) -> None:
         else:  # ASYNC
             deploy_model_async(role, huggingface_model)
 
+        register_autoscaling()
+
     except Exception as e:
         logger.error(f"Error deploying model: {e}")
         raise
@@ -206,11 +264,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             iam = boto3.client('iam')
             role = iam.get_role(RoleName='sagemaker_execution_role')['Role']['Arn']
 
-        if request_type == 'Create':
+        data = {
+            'EndpointName': ENDPOINT_NAME,
+            'ModelName': MODEL_NAME,
+            'InferenceType': INFERENCE_TYPE
+        }
+
+        if DEPLOYMENT_MODE == 'BLUE_GREEN':
+            if request_type in ('Create', 'Update'):
+                data.update(start_blue_green_deployment(role))
+            elif request_type == 'Delete':
+                get_autoscaling().deregister(ENDPOINT_NAME)
+                get_rollout().delete(ENDPOINT_NAME)
+                # Left over from a deployment made in RECREATE mode, if any
+                delete_existing_model(MODEL_NAME)
+                logger.info("Delete action completed")
+
+        elif request_type == 'Create':
             deploy_model(role)
             logger.info("Create action completed")
 
         elif request_type == 'Delete':
+            get_autoscaling().deregister(ENDPOINT_NAME)
             delete_existing_model(MODEL_NAME)
             delete_existing_endpoint(ENDPOINT_NAME)
             delete_existing_endpoint_config(ENDPOINT_NAME)
@@ -220,11 +295,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'Status': 'SUCCESS',
             'Reason': f'Successfully processed {request_type} request',
             'PhysicalResourceId': ENDPOINT_NAME,
-            'Data': {
-                'EndpointName': ENDPOINT_NAME,
-                'ModelName': MODEL_NAME,
-                'InferenceType': INFERENCE_TYPE
-            }
+            'Data': data
         }
 
     except Exception as e:
@@ -235,3 +306,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'PhysicalResourceId': ENDPOINT_NAME or 'unknown',
             'Data': {}
         }
+
+def get_probe_input_uri() -> Optional[str]:
+    if INFERENCE_TYPE != 'ASYNC':
+        return None
+    return f"s3://{ASYNC_S3_BUCKET}/health-check/{ENDPOINT_NAME}.json"
+
+def is_complete(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """isComplete handler of the custom resource provider, polled until a blue/green rollout is serving.
+
+    The provider passes on what `handler` returned; once the endpoint serves the new
+    config, the health-check prompt is timed and p50/p95 latency is added to `Data`.
+    """
+    if event.get('Status') == 'FAILED':
+        raise RuntimeError(event.get('Reason', 'Deployment failed'))
+
+    data = event.get('Data', {})
+    if DEPLOYMENT_MODE != 'BLUE_GREEN' or event['RequestType'] == 'Delete':
+        return {'IsComplete': True}
+
+    rollout = get_rollout()
+    if not rollout.is_ready(ENDPOINT_NAME, data['EndpointConfigName']):
+        logger.info(f"Endpoint {ENDPOINT_NAME} is not serving {data['EndpointConfigName']} yet")
+        return {'IsComplete': False}
+
+    latency = rollout.probe(ENDPOINT_NAME, PROBE_REQUESTS, get_probe_input_uri(), PROBE_ASYNC_TIMEOUT_SECONDS)
+    logger.info(f"Endpoint {ENDPOINT_NAME} is serving {data['EndpointConfigName']}", extra=latency)
+
+    rollout.retire(data.get('PreviousEndpointConfigName', ''), keep_models=[data['ModelName']])
+    return {'IsComplete': True, 'Data': {**data, **latency, **register_autoscaling()}}
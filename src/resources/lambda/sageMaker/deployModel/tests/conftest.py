@@ -0,0 +1,157 @@
+import os
+import sys
+from io import BytesIO
+from typing import Any, Dict, List
+
+import pytest
+from botocore.exceptions import ClientError
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAMBDA_DIR)
+
+
+class StubSageMaker:
+    """In-memory stand-in for the SageMaker control-plane calls made by a rollout.
+
+    Endpoint updates take `updates_before_ready` describe_endpoint calls to finish; with
+    `fail_update` the endpoint returns to its old config, as SageMaker's rollback does.
+    """
+
+    def __init__(self, updates_before_ready: int = 2, fail_update: bool = False):
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self.configs: Dict[str, Dict[str, Any]] = {}
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.calls: List[str] = []
+        self.updates_before_ready = updates_before_ready
+        self.fail_update = fail_update
+
+    def create_model(self, ModelName: str, **kwargs) -> Dict[str, Any]:
+        self.calls.append('create_model')
+        self.models[ModelName] = kwargs
+        return {}
+
+    def create_endpoint_config(self, EndpointConfigName: str, **kwargs) -> Dict[str, Any]:
+        self.calls.append('create_endpoint_config')
+        self.configs[EndpointConfigName] = kwargs
+        return {}
+
+    def create_endpoint(self, EndpointName: str, EndpointConfigName: str) -> Dict[str, Any]:
+        self.calls.append('create_endpoint')
+        self.endpoints[EndpointName] = {'config': EndpointConfigName, 'target': EndpointConfigName, 'pending': self.updates_before_ready}
+        return {}
+
+    def update_endpoint(self, EndpointName: str, EndpointConfigName: str, **kwargs) -> Dict[str, Any]:
+        self.calls.append('update_endpoint')
+        self.endpoints[EndpointName].update(target=EndpointConfigName, pending=self.updates_before_ready, deployment=kwargs.get('DeploymentConfig'))
+        return {}
+
+    def describe_endpoint(self, EndpointName: str) -> Dict[str, Any]:
+        if EndpointName not in self.endpoints:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': f'Could not find endpoint "{EndpointName}".'}}, 'DescribeEndpoint')
+        endpoint = self.endpoints[EndpointName]
+        if endpoint['pending']:
+            endpoint['pending'] -= 1
+            status = 'Creating' if endpoint['config'] == endpoint['target'] else 'Updating'
+            return {'EndpointStatus': status, 'EndpointConfigName': endpoint['config']}
+        if self.fail_update:
+            return {'EndpointStatus': 'InService', 'EndpointConfigName': endpoint['config'], 'FailureReason': 'health check failed'}
+        endpoint['config'] = endpoint['target']
+        return {'EndpointStatus': 'InService', 'EndpointConfigName': endpoint['config']}
+
+    def describe_endpoint_config(self, EndpointConfigName: str) -> Dict[str, Any]:
+        if EndpointConfigName not in self.configs:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Could not find endpoint configuration'}}, 'DescribeEndpointConfig')
+        return self.configs[EndpointConfigName]
+
+    def delete_endpoint(self, EndpointName: str) -> Dict[str, Any]:
+        self.endpoints.pop(EndpointName)
+        return {}
+
+    def delete_endpoint_config(self, EndpointConfigName: str) -> Dict[str, Any]:
+        if self.configs.pop(EndpointConfigName, None) is None:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': f'Could not find endpoint configuration "{EndpointConfigName}".'}}, 'DeleteEndpointConfig')
+        return {}
+
+    def delete_model(self, ModelName: str) -> Dict[str, Any]:
+        if self.models.pop(ModelName, None) is None:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': f'Could not find model "{ModelName}".'}}, 'DeleteModel')
+        return {}
+
+
+class StubRuntime:
+    """Answers invocations instantly; async outputs land in the given S3 stub."""
+
+    def __init__(self, s3=None):
+        self.invocations = 0
+        self._s3 = s3
+
+    def invoke_endpoint(self, EndpointName: str, Body: str, **kwargs) -> Dict[str, Any]:
+        self.invocations += 1
+        return {'Body': BytesIO(b'[{"generated_text": "Paris"}]')}
+
+    def invoke_endpoint_async(self, EndpointName: str, InputLocation: str, **kwargs) -> Dict[str, Any]:
+        self.invocations += 1
+        key = f'output/{self.invocations}.out'
+        self._s3.objects[('async-bucket', key)] = b'[{"generated_text": "Paris"}]'
+        return {'OutputLocation': f's3://async-bucket/{key}', 'FailureLocation': f's3://async-bucket/error/{self.invocations}.out'}
+
+
+class StubS3:
+    def __init__(self):
+        self.objects: Dict[Any, bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> Dict[str, Any]:
+        self.objects[(Bucket, Key)] = Body
+        return {}
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return {}
+
+
+@pytest.fixture
+def stub_sagemaker() -> StubSageMaker:
+    return StubSageMaker()
+
+
+@pytest.fixture
+def stub_s3() -> StubS3:
+    return StubS3()
+
+
+class StubAutoScaling:
+    """Records Application Auto Scaling targets and policies by resource id."""
+
+    def __init__(self):
+        self.targets: Dict[str, Dict[str, Any]] = {}
+        self.policies: Dict[str, Dict[str, Any]] = {}
+
+    def register_scalable_target(self, ResourceId: str, **kwargs) -> Dict[str, Any]:
+        self.targets[ResourceId] = kwargs
+        return {}
+
+    def put_scaling_policy(self, PolicyName: str, **kwargs) -> Dict[str, Any]:
+        self.policies[PolicyName] = kwargs
+        return {'PolicyARN': f'arn:aws:autoscaling:policy/{PolicyName}'}
+
+    def deregister_scalable_target(self, ResourceId: str, **kwargs) -> Dict[str, Any]:
+        if ResourceId not in self.targets:
+            raise ClientError({'Error': {'Code': 'ObjectNotFoundException', 'Message': 'No scalable target registered'}}, 'DeregisterScalableTarget')
+        del self.targets[ResourceId]
+        self.policies = {name: policy for name, policy in self.policies.items() if policy['ResourceId'] != ResourceId}
+        return {}
+
+
+class StubCloudWatch:
+    def __init__(self):
+        self.alarms: Dict[str, Dict[str, Any]] = {}
+
+    def put_metric_alarm(self, AlarmName: str, **kwargs) -> Dict[str, Any]:
+        self.alarms[AlarmName] = kwargs
+        return {}
+
+    def delete_alarms(self, AlarmNames: List[str]) -> Dict[str, Any]:
+        for name in AlarmNames:
+            self.alarms.pop(name, None)
+        return {}
@@ -0,0 +1,140 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from blue_green import EndpointRollout, percentile
+from conftest import StubRuntime, StubS3, StubSageMaker
+
+
+def start(rollout, version):
+    return rollout.start('endpoint', 'model', version, 'image', {'HF_MODEL_ID': 'model-id'}, 'role', 'ml.g5.2xlarge', 1)
+
+
+def wait_until_ready(rollout, data):
+    polls = 0
+    while not rollout.is_ready('endpoint', data['EndpointConfigName']):
+        polls += 1
+    return polls
+
+
+def test_percentiles_use_nearest_rank():
+    samples = [float(value) for value in range(1, 21)]
+    assert percentile(samples, 0.5) == 10.0
+    assert percentile(samples, 0.95) == 19.0
+    assert percentile([7.0], 0.95) == 7.0
+
+
+def test_update_swaps_the_live_endpoint_and_retires_the_old_config(stub_sagemaker):
+    rollout = EndpointRollout(stub_sagemaker, StubRuntime())
+    first = start(rollout, 'v1')
+    wait_until_ready(rollout, first)
+
+    second = start(rollout, 'v2')
+    assert second['PreviousEndpointConfigName'] == 'endpoint-v1'
+    assert stub_sagemaker.calls.count('create_endpoint') == 1
+    assert stub_sagemaker.endpoints['endpoint']['deployment']['BlueGreenUpdatePolicy']['TrafficRoutingConfiguration']['Type'] == 'ALL_AT_ONCE'
+
+    assert wait_until_ready(rollout, second) == 2
+    rollout.retire(second['PreviousEndpointConfigName'], keep_models=[second['ModelName']])
+
+    assert set(stub_sagemaker.configs) == {'endpoint-v2'}
+    assert set(stub_sagemaker.models) == {'model-v2'}
+
+
+def test_rolled_back_update_fails_the_deployment():
+    stub_sagemaker = StubSageMaker()
+    rollout = EndpointRollout(stub_sagemaker, StubRuntime())
+    wait_until_ready(rollout, start(rollout, 'v1'))
+
+    stub_sagemaker.fail_update = True
+    second = start(rollout, 'v2')
+    with pytest.raises(RuntimeError, match='rolled back'):
+        wait_until_ready(rollout, second)
+
+
+def test_probe_reports_latency_percentiles(stub_sagemaker):
+    ticks = iter(range(0, 1000, 10))
+    rollout = EndpointRollout(stub_sagemaker, StubRuntime(), clock=lambda: next(ticks) / 1000)
+
+    latency = rollout.probe('endpoint', 4)
+
+    assert latency == {'LatencyP50Ms': 10.0, 'LatencyP95Ms': 10.0, 'ProbeRequests': 4}
+
+
+def test_async_probe_waits_for_the_output_object(stub_sagemaker, stub_s3):
+    runtime = StubRuntime(stub_s3)
+    rollout = EndpointRollout(stub_sagemaker, runtime, stub_s3, sleep=lambda seconds: None)
+
+    latency = rollout.probe('endpoint', 2, async_input_uri='s3://async-bucket/health-check/endpoint.json')
+
+    assert latency['ProbeRequests'] == 2
+    assert ('async-bucket', 'health-check/endpoint.json') in stub_s3.objects
+    assert runtime.invocations == 2
+
+
+class SlowRuntime(StubRuntime):
+    """Async outputs appear `seconds` after each invocation on the given simulated clock."""
+
+    def __init__(self, s3, now, seconds):
+        super().__init__(s3)
+        self._now = now
+        self._seconds = seconds
+        self.ready_at = {}
+
+    def invoke_endpoint_async(self, EndpointName, InputLocation, **kwargs):
+        response = super().invoke_endpoint_async(EndpointName, InputLocation, **kwargs)
+        self.ready_at[response['OutputLocation'].removeprefix('s3://async-bucket/')] = self._now[0] + self._seconds
+        return response
+
+
+class ClockedS3(StubS3):
+    def __init__(self, now):
+        super().__init__()
+        self.runtime = None
+        self._now = now
+
+    def head_object(self, Bucket, Key):
+        if self._now[0] < self.runtime.ready_at.get(Key, 0):
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return super().head_object(Bucket, Key)
+
+
+def test_async_probes_share_one_deadline(stub_sagemaker):
+    now = [0.0]
+    def sleep(seconds):
+        now[0] += seconds
+    s3 = ClockedS3(now)
+    s3.runtime = SlowRuntime(s3, now, seconds=100)
+    rollout = EndpointRollout(stub_sagemaker, s3.runtime, s3, clock=lambda: now[0], sleep=sleep)
+
+    # Each probe fits in the timeout on its own, but five of them do not
+    with pytest.raises(TimeoutError, match='probe deadline'):
+        rollout.probe('endpoint', 5, async_input_uri='s3://async-bucket/health-check/endpoint.json', async_timeout=250)
+
+    assert s3.runtime.invocations == 3
+    assert now[0] <= 251
+
+
+def test_retire_ignores_only_resources_that_are_already_gone(stub_sagemaker):
+    rollout = EndpointRollout(stub_sagemaker, StubRuntime())
+    first = start(rollout, 'v1')
+    wait_until_ready(rollout, first)
+    del stub_sagemaker.models['model-v1']
+
+    rollout.retire('endpoint-v1', keep_models=[])
+    assert 'endpoint-v1' not in stub_sagemaker.configs
+
+    def denied(**kwargs):
+        raise ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'not authorized'}}, 'DeleteEndpointConfig')
+    stub_sagemaker.delete_endpoint_config = denied
+    stub_sagemaker.configs['endpoint-v0'] = {'ProductionVariants': []}
+    with pytest.raises(ClientError, match='not authorized'):
+        rollout.retire('endpoint-v0', keep_models=[])
+
+
+def test_delete_removes_endpoint_config_and_models(stub_sagemaker):
+    rollout = EndpointRollout(stub_sagemaker, StubRuntime())
+    wait_until_ready(rollout, start(rollout, 'v1'))
+
+    rollout.delete('endpoint')
+
+    assert not stub_sagemaker.endpoints and not stub_sagemaker.configs and not stub_sagemaker.models
@@ -0,0 +1,96 @@
+import os
+import sys
+from dataclasses import replace
+
+import pytest
+
+from autoscaling import EndpointAutoScaling
+from conftest import LAMBDA_DIR, StubAutoScaling, StubCloudWatch
+from throughput_profiles import FULL_PAGE_IMAGE_TOKENS, THROUGHPUT_PROFILES, get_throughput_profile
+
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'benchmarks'))
+
+from load_test import run_profile  # noqa: E402
+from stand_in_endpoint import CostModel, request_tokens  # noqa: E402
+
+
+def test_standard_profile_keeps_tgi_defaults():
+    assert get_throughput_profile('standard').tgi_environment() == {'SM_NUM_GPUS': '1'}
+
+
+def test_profile_sets_tgi_batching_limits():
+    environment = get_throughput_profile('balanced').tgi_environment()
+
+    assert environment['MAX_BATCH_TOTAL_TOKENS'] == '32768'
+    assert environment['MAX_INPUT_LENGTH'] == '28672'
+    assert environment['MAX_CONCURRENT_REQUESTS'] == '64'
+
+
+def test_page_images_count_towards_prompt_tokens():
+    page = {'type': 'image_url', 'image_url': {'url': 'https://bucket.s3.amazonaws.com/images/fax-1.png'}}
+    messages = {'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': 'x' * 400}, page]}], 'max_tokens': 512}
+
+    assert FULL_PAGE_IMAGE_TOKENS == 89 * 126
+    assert request_tokens(messages) == (101 + FULL_PAGE_IMAGE_TOKENS, 512)
+    assert request_tokens({'inputs': '![](https://host/page.png)Extract the fields'}, image_tokens=1000)[0] == 1000 + 5
+
+
+@pytest.mark.parametrize('name', [name for name in THROUGHPUT_PROFILES if name != 'standard'])
+def test_profiles_admit_a_full_page_with_its_prompt(name):
+    profile = get_throughput_profile(name)
+    page = {'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': 'x' * 8000}, {'type': 'image_url', 'image_url': {'url': 'page'}}]}], 'max_tokens': 2048}
+    prompt_tokens, new_tokens = request_tokens(page)
+
+    assert prompt_tokens <= profile.max_input_length <= profile.max_batch_prefill_tokens
+    assert prompt_tokens + new_tokens <= profile.max_total_tokens <= profile.max_batch_total_tokens
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match='Unknown throughput profile'):
+        get_throughput_profile('fastest')
+
+
+def test_async_scale_to_zero_tracks_backlog_and_wakes_on_queued_requests():
+    autoscaling, cloudwatch = StubAutoScaling(), StubCloudWatch()
+
+    capacity = EndpointAutoScaling(autoscaling, cloudwatch).register('endpoint', get_throughput_profile('scale-to-zero'), True, 1)
+
+    assert capacity == {'MinCapacity': 0, 'MaxCapacity': 4}
+    tracking = autoscaling.policies['endpoint-target-tracking']['TargetTrackingScalingPolicyConfiguration']
+    assert tracking['CustomizedMetricSpecification']['MetricName'] == 'ApproximateBacklogSizePerInstance'
+    alarm = cloudwatch.alarms['endpoint-has-backlog-without-capacity']
+    assert alarm['MetricName'] == 'HasBacklogWithoutCapacity'
+    assert alarm['AlarmActions'] == ['arn:aws:autoscaling:policy/endpoint-scale-from-zero']
+
+
+def test_real_time_endpoint_keeps_one_instance():
+    autoscaling, cloudwatch = StubAutoScaling(), StubCloudWatch()
+
+    capacity = EndpointAutoScaling(autoscaling, cloudwatch).register('endpoint', get_throughput_profile('scale-to-zero'), False, 1)
+
+    assert capacity == {'MinCapacity': 1, 'MaxCapacity': 4}
+    tracking = autoscaling.policies['endpoint-target-tracking']['TargetTrackingScalingPolicyConfiguration']
+    assert tracking['PredefinedMetricSpecification']['PredefinedMetricType'] == 'SageMakerVariantInvocationsPerInstance'
+    assert not cloudwatch.alarms
+
+
+def test_fixed_profile_removes_earlier_scaling():
+    autoscaling, cloudwatch = StubAutoScaling(), StubCloudWatch()
+    scaling = EndpointAutoScaling(autoscaling, cloudwatch)
+    scaling.register('endpoint', get_throughput_profile('scale-to-zero'), True, 1)
+
+    assert scaling.register('endpoint', get_throughput_profile('standard'), True, 1) is None
+    assert not autoscaling.targets and not autoscaling.policies and not cloudwatch.alarms
+    # Deregistering again is a no-op
+    scaling.deregister('endpoint')
+
+
+def test_stand_in_rejects_requests_over_the_profile_limits():
+    profile = replace(get_throughput_profile('balanced'), max_concurrent_invocations_per_instance=6, max_concurrent_requests=2)
+    payloads = [{'inputs': 'x' * 100, 'parameters': {'max_new_tokens': 8}}] * 6 + [{'inputs': 'x' * 120000}]
+
+    report = run_profile(profile, payloads, 1, time_scale=0.05, cost=CostModel(decode_ms_per_token=50.0))
+
+    assert report['statuses']['422'] == 1
+    assert report['statuses']['429'] >= 1
+    assert report['succeeded'] >= 2
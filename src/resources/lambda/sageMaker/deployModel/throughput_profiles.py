@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Qwen2.5-VL reads one token per 28x28 pixel patch. The converter's standard profile renders
+# TXT, MD and DOCX pages at 2480x3508, below the model's max_pixels, so such a page is ~11.2k
+# tokens before the prompt; IMAGE_TOKEN_BUDGET on the converter lowers this.
+PATCH_PIXELS = 28
+FULL_PAGE_IMAGE_TOKENS = -(-2480 // PATCH_PIXELS) * -(-3508 // PATCH_PIXELS)
+# Text pages are cut to 28000 tokens by TokenLimit.ts, so requests stay within this, and
+# the model's context window bounds prompt plus completion
+MAX_REQUEST_TOKENS = 28672
+CONTEXT_TOKENS = 32768
+
+
+@dataclass(frozen=True)
+class ThroughputProfile:
+    """How the endpoint batches requests and how many instances serve them.
+
+    TGI fields left as None keep the container's defaults; TGI then sizes its batches
+    from the GPU memory left after loading the model.
+    """
+    name: str
+    # Invocations the async queue hands to one instance at a time
+    max_concurrent_invocations_per_instance: int
+    num_gpus: int = 1
+    # TGI batching: longest prompt, longest prompt plus completion, tokens prefilled per
+    # batch, tokens across the whole running batch, and requests admitted before 429s
+    max_input_length: Optional[int] = None
+    max_total_tokens: Optional[int] = None
+    max_batch_prefill_tokens: Optional[int] = None
+    max_batch_total_tokens: Optional[int] = None
+    max_concurrent_requests: Optional[int] = None
+    # Application Auto Scaling; no max_capacity means the instance count stays fixed
+    min_capacity: int = 1
+    max_capacity: Optional[int] = None
+    # Target for async endpoints: queued requests per instance (ApproximateBacklogSizePerInstance)
+    target_backlog_per_instance: float = 5.0
+    # Target for real-time endpoints: invocations per instance per minute
+    target_invocations_per_instance: float = 60.0
+    scale_in_cooldown: int = 600
+    scale_out_cooldown: int = 120
+
+    def tgi_environment(self) -> Dict[str, str]:
+        """Container environment variables for the profile's TGI settings."""
+        settings = {
+            'SM_NUM_GPUS': self.num_gpus,
+            'MAX_INPUT_LENGTH': self.max_input_length,
+            'MAX_TOTAL_TOKENS': self.max_total_tokens,
+            'MAX_BATCH_PREFILL_TOKENS': self.max_batch_prefill_tokens,
+            'MAX_BATCH_TOTAL_TOKENS': self.max_batch_total_tokens,
+            'MAX_CONCURRENT_REQUESTS': self.max_concurrent_requests,
+        }
+        return {name: str(value) for name, value in settings.items() if value is not None}
+
+
+THROUGHPUT_PROFILES: Dict[str, ThroughputProfile] = {
+    profile.name: profile
+    for profile in (
+        # Matches the original deployment: TGI defaults, 4 async invocations per instance, fixed instance count
+        ThroughputProfile('standard', max_concurrent_invocations_per_instance=4),
+        # One ml.g5.2xlarge (A10G, 24 GB) per instance: an 8B model in fp16 leaves KV cache for ~32k tokens
+        ThroughputProfile(
+            'balanced', max_concurrent_invocations_per_instance=8,
+            max_input_length=MAX_REQUEST_TOKENS, max_total_tokens=CONTEXT_TOKENS, max_batch_prefill_tokens=MAX_REQUEST_TOKENS,
+            max_batch_total_tokens=32768, max_concurrent_requests=64,
+            min_capacity=1, max_capacity=4, target_backlog_per_instance=8.0,
+        ),
+        # Larger batches trade per-request latency for pages per instance-hour
+        ThroughputProfile(
+            'throughput', max_concurrent_invocations_per_instance=16,
+            max_input_length=MAX_REQUEST_TOKENS, max_total_tokens=CONTEXT_TOKENS, max_batch_prefill_tokens=MAX_REQUEST_TOKENS,
+            max_batch_total_tokens=40960, max_concurrent_requests=128,
+            min_capacity=1, max_capacity=8, target_backlog_per_instance=16.0,
+        ),
+        # Async only: no instances while the queue is empty, at the price of a cold start for the first request
+        ThroughputProfile(
+            'scale-to-zero', max_concurrent_invocations_per_instance=8,
+            max_input_length=MAX_REQUEST_TOKENS, max_total_tokens=CONTEXT_TOKENS, max_batch_prefill_tokens=MAX_REQUEST_TOKENS,
+            max_batch_total_tokens=32768, max_concurrent_requests=64,
+            min_capacity=0, max_capacity=4, target_backlog_per_instance=8.0,
+        ),
+    )
+}
+
+
+def get_throughput_profile(name: str) -> ThroughputProfile:
+    if name not in THROUGHPUT_PROFILES:
+        raise ValueError(f"Unknown throughput profile: {name}. Must be one of {', '.join(THROUGHPUT_PROFILES)}")
+    return THROUGHPUT_PROFILES[name]
@@ -0,0 +1,101 @@
+"""Compare converting many small documents one invocation each against one batch invocation.
+
+"single" starts a fresh interpreter per document, which is what one execution per
+uploaded file pays (cold import plus one handler call). "batch" converts every
+document in one interpreter through the `documents` batch event. Both run against
+an in-memory S3 stub, so the numbers exclude network time.
+
+Usage (from the 01pdfToImages directory, with poppler installed for --kind pdf):
+
+    python benchmarks/batch_throughput.py [--documents 50] [--kind pdf|txt] [--batch-concurrency 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from profile_handler import StubS3, load_lambda
+
+
+def make_document(kind: str, number: int) -> bytes:
+    if kind == 'txt':
+        return f"Fax {number}\nReferral for patient {number}.\n".encode('utf-8') * 20
+
+    image = Image.new('L', (1700, 2200), color=255)
+    ImageDraw.Draw(image).text((100, 100), f"Fax {number}", fill=0)
+    buffer = BytesIO()
+    image.save(buffer, format='PDF', resolution=200)
+    return buffer.getvalue()
+
+
+def run_child(kind: str, numbers: list) -> None:
+    """Convert the given documents in this interpreter and print the handler time."""
+    stub = StubS3()
+    lambda_module = load_lambda(stub)
+
+    records = []
+    for number in numbers:
+        key = f"uploads/fax-{number}.{kind}"
+        stub.objects[('input', key)] = make_document(kind, number)
+        records.append({'bucket': 'input', 'pdfKey': key, 'fileId': f'file-{number}'})
+
+    shared = {'resultBucket': 'output', 'outputPrefix': 'images', 'format': 'jpeg'}
+    start = time.perf_counter()
+    if len(records) == 1:
+        results = [lambda_module.handler({**shared, **records[0]}, None)]
+    else:
+        results = lambda_module.handler({**shared, 'documents': records}, None)['documents']
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if 'items' not in result]
+    if failed:
+        raise SystemExit(f"conversion failed: {failed[0]}")
+    print(json.dumps({'handlerSeconds': elapsed, 'pages': sum(result['pages'] for result in results)}))
+
+
+def spawn(kind: str, numbers: list, environment: dict) -> dict:
+    child = subprocess.run(
+        [sys.executable, __file__, '--child', kind, *map(str, numbers)],
+        capture_output=True, text=True, env=environment,
+    )
+    if child.returncode != 0:
+        raise SystemExit(child.stderr or child.stdout)
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], [int(number) for number in sys.argv[3:]])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--kind', choices=['pdf', 'txt'], default='pdf')
+    parser.add_argument('--batch-concurrency', default='4')
+    args = parser.parse_args()
+
+    environment = {**os.environ, 'LOG_LEVEL': 'ERROR', 'POWERTOOLS_LOG_LEVEL': 'ERROR', 'BATCH_CONCURRENCY': args.batch_concurrency}
+    numbers = list(range(args.documents))
+
+    start = time.perf_counter()
+    for number in numbers:
+        spawn(args.kind, [number], environment)
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = spawn(args.kind, numbers, environment)
+    batch_seconds = time.perf_counter() - start
+
+    print(f"{'mode':<10}{'documents':>10}{'seconds':>10}{'docs/s':>10}")
+    print(f"{'single':<10}{args.documents:>10}{single_seconds:>10.2f}{args.documents / single_seconds:>10.1f}")
+    print(f"{'batch':<10}{args.documents:>10}{batch_seconds:>10.2f}{args.documents / batch_seconds:>10.1f}")
+    print(f"batch handler time {batch['handlerSeconds']:.2f}s for {batch['pages']} pages; speed-up {single_seconds / batch_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Regression suite for the pdfToImages handler: throughput, memory, upload volume and cold start.
+
+Every case converts one generated document (PDF, DOCX, TXT or MD, 1 to 500 pages)
+through `handler` against an in-memory S3 stub, with no network. Per case it records:
+
+    pagesPerSecond  warm conversion rate, timed by pytest-benchmark
+    peakRssMb       peak RSS of one conversion in a fresh interpreter, poppler included
+    bytesUploaded   total size of the page objects written to the result bucket
+
+plus coldStartMs, the median time to import lambda.py in a fresh interpreter. Metrics
+are compared with a JSON baseline, and a case fails when a metric is worse than its
+baseline by more than its REGRESSION_TOLERANCES fraction. Cases missing from the
+baseline pass and are added to it. Baselines are only comparable on the machine that
+recorded them, so keep one per benchmark host rather than committing it.
+
+The file is not named test_*, so the unit test run never collects it.
+
+Usage (from the 01pdfToImages directory, with poppler and requirements-dev.txt installed):
+
+    python -m pytest benchmarks/bench_conversion.py [--benchmark-json timings.json]
+
+Environment:
+
+    BENCHMARK_BASELINE=path      baseline file (default benchmarks/baseline.json)
+    BENCHMARK_UPDATE_BASELINE=1  overwrite the baseline with this run instead of comparing
+    BENCHMARK_MAX_PAGES=50       skip corpus documents longer than this
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import pytest
+from docx import Document
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from profile_handler import LAMBDA_DIR, StubS3, load_lambda  # noqa: E402
+from text_renderer import LINE_HEIGHT, MARGIN, PAGE_HEIGHT  # noqa: E402
+
+BASELINE_PATH = os.environ.get('BENCHMARK_BASELINE', os.path.join(BENCHMARKS_DIR, 'baseline.json'))
+UPDATE_BASELINE = os.environ.get('BENCHMARK_UPDATE_BASELINE') == '1'
+MAX_PAGES = int(os.environ.get('BENCHMARK_MAX_PAGES', '500'))
+
+CORPUS_KINDS = ['pdf', 'docx', 'txt', 'md']
+CORPUS_PAGES = [1, 50, 500]
+
+# Allowed relative change before a metric counts as a regression. Timings and memory
+# vary between runs on one machine; upload volume is deterministic
+REGRESSION_TOLERANCES = {
+    'pagesPerSecond': 0.20,
+    'peakRssMb': 0.20,
+    'bytesUploaded': 0.02,
+    'coldStartMs': 0.30,
+}
+HIGHER_IS_BETTER = {'pagesPerSecond'}
+
+COLD_START_RUNS = 5
+
+# Text pages hold this many lines below the title (see text_renderer)
+TEXT_LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT - 2
+# Lines of 10pt Helvetica on a generated US Letter PDF page
+PDF_LINES_PER_PAGE = 56
+
+CHILD_ENVIRONMENT = {
+    'LOG_LEVEL': 'ERROR',
+    'POWERTOOLS_LOG_LEVEL': 'ERROR',
+    'PROGRESS_MANIFEST_ENABLED': 'false',
+    'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-central-1'),
+}
+
+COLD_START_CHILD = r'''
+import importlib.util, json, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('pdf_to_images_lambda', sys.argv[1] + '/lambda.py')
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({'coldStartMs': (time.perf_counter() - start) * 1000}))
+'''
+
+# Converts one document in a fresh interpreter, so the high-water marks belong to that conversion alone
+PEAK_RSS_CHILD = r'''
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from profile_handler import StubS3, load_lambda
+from instrumentation import peak_rss_mb
+
+stub = StubS3()
+module = load_lambda(stub)
+with open(sys.argv[2], 'rb') as document:
+    stub.objects[('input', sys.argv[3])] = document.read()
+result = module.handler({'bucket': 'input', 'resultBucket': 'output', 'pdfKey': sys.argv[3], 'fileId': 'benchmark', 'outputPrefix': 'images', 'format': 'jpeg'}, None)
+if 'items' not in result:
+    raise SystemExit('handler failed: %s' % result)
+print(json.dumps({'peakRssMb': max(peak_rss_mb())}))
+'''
+
+
+def corpus_lines(count: int):
+    return [f"{number:05d} Referral note: patient seen in clinic, follow-up in two weeks, labs pending." for number in range(count)]
+
+
+def make_text_pdf(page_count: int) -> bytes:
+    """A PDF of full pages of Helvetica text, like a document exported from an EHR."""
+    font_id = 3 + 2 * page_count
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(f"{3 + 2 * i} 0 R".encode() for i in range(page_count)) + f"] /Count {page_count} >>".encode(),
+    ]
+    lines = corpus_lines(PDF_LINES_PER_PAGE)
+    for i in range(page_count):
+        text = ' '.join(f"({line}) Tj T*" for line in [f"Page {i + 1}", *lines])
+        stream = f"BT /F1 10 Tf 12 TL 40 760 Td {text} ET".encode('latin-1')
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R /Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def write_corpus_document(kind: str, pages: int, directory: str) -> str:
+    """Write a document of `kind` that converts to about `pages` pages and return its path."""
+    path = os.path.join(directory, f"corpus-{pages}.{kind}")
+    lines = corpus_lines(pages * TEXT_LINES_PER_PAGE)
+
+    if kind == 'pdf':
+        with open(path, 'wb') as output:
+            output.write(make_text_pdf(pages))
+    elif kind == 'docx':
+        document = Document()
+        for line in lines:
+            document.add_paragraph(line)
+        document.save(path)
+    elif kind == 'md':
+        with open(path, 'w') as output:
+            for number, line in enumerate(lines):
+                output.write(f"## Section {number}\n" if number % TEXT_LINES_PER_PAGE == 0 else f"- {line}\n")
+    else:
+        with open(path, 'w') as output:
+            output.write('\n'.join(lines))
+    return path
+
+
+def run_child(script: str, *args: str) -> dict:
+    child = subprocess.run(
+        [sys.executable, '-c', script, *args],
+        capture_output=True, text=True, env={**os.environ, **CHILD_ENVIRONMENT},
+    )
+    if child.returncode != 0:
+        raise RuntimeError(child.stderr or child.stdout)
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def find_regressions(metrics: dict, baseline: dict) -> list:
+    regressions = []
+    for metric, value in metrics.items():
+        if metric not in baseline:
+            continue
+        expected = baseline[metric]
+        change = (value - expected) / expected if expected else 0.0
+        if metric in HIGHER_IS_BETTER:
+            change = -change
+        if change > REGRESSION_TOLERANCES[metric]:
+            regressions.append(f"{metric}: {value:.1f} vs baseline {expected:.1f} ({change:.0%} worse)")
+    return regressions
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    """Baseline metrics by case; written back after the module with this run's new or updated cases."""
+    recorded = {}
+    if os.path.exists(BASELINE_PATH) and not UPDATE_BASELINE:
+        with open(BASELINE_PATH) as baseline_file:
+            recorded = json.load(baseline_file)
+
+    cases = dict(recorded)
+    yield cases
+
+    if cases != recorded:
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(cases, baseline_file, indent=2, sort_keys=True)
+
+
+def check_against_baseline(case: str, metrics: dict, baseline: dict) -> None:
+    if case not in baseline:
+        baseline[case] = metrics
+        return
+
+    regressions = find_regressions(metrics, baseline[case])
+    assert not regressions, f"{case} regressed: " + '; '.join(regressions)
+
+
+@pytest.fixture(scope='module')
+def corpus_dir():
+    with tempfile.TemporaryDirectory() as directory:
+        yield directory
+
+
+@pytest.fixture(scope='module')
+def lambda_module():
+    stub = StubS3()
+    module = load_lambda(stub)
+    # Every round has to render: no render cache, no resuming from a previous round's progress
+    module.RENDER_CACHE_ENABLED = False
+    module.PROGRESS_MANIFEST_ENABLED = False
+    return module
+
+
+@pytest.mark.parametrize('pages', CORPUS_PAGES)
+@pytest.mark.parametrize('kind', CORPUS_KINDS)
+def test_conversion(benchmark, baseline, corpus_dir, lambda_module, kind, pages):
+    if pages > MAX_PAGES:
+        pytest.skip(f"longer than BENCHMARK_MAX_PAGES={MAX_PAGES}")
+
+    path = write_corpus_document(kind, pages, corpus_dir)
+    key = f"uploads/{os.path.basename(path)}"
+    with open(path, 'rb') as document:
+        content = document.read()
+
+    stubs = []
+    def fresh_stub():
+        stub = StubS3()
+        stub.objects[('input', key)] = content
+        lambda_module.s3_client = stub
+        stubs.append(stub)
+
+    event = {'bucket': 'input', 'resultBucket': 'output', 'pdfKey': key, 'fileId': 'benchmark', 'outputPrefix': 'images', 'format': 'jpeg'}
+    result = benchmark.pedantic(lambda_module.handler, args=(event, None), setup=fresh_stub, rounds=1 if pages > 50 else 3)
+    assert 'items' in result, result
+
+    metrics = {
+        'pagesPerSecond': result['pages'] / benchmark.stats.stats.mean,
+        'peakRssMb': run_child(PEAK_RSS_CHILD, BENCHMARKS_DIR, path, key)['peakRssMb'],
+        'bytesUploaded': sum(len(body) for (bucket, _), body in stubs[-1].objects.items() if bucket == 'output'),
+    }
+    benchmark.extra_info.update(metrics, pages=result['pages'])
+    check_against_baseline(f"{kind}-{pages}", metrics, baseline)
+
+
+def test_cold_start(baseline):
+    samples = [run_child(COLD_START_CHILD, LAMBDA_DIR)['coldStartMs'] for _ in range(COLD_START_RUNS)]
+    check_against_baseline('cold-start', {'coldStartMs': statistics.median(samples)}, baseline)
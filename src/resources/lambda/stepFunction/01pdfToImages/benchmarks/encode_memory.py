@@ -0,0 +1,147 @@
+"""Measure the peak Python heap used to encode and upload one page.
+
+"copied" encodes and then copies the encoded page once before uploading it, which is
+what any bytes(...) of the encoder's buffer or slice of a page costs. "put" is the lambda's path: encode_image
+hands over the encoder's buffer and PageUploader sends it with a single put_object.
+"multipart" sends the same page as parts that are views into it. A peak close to one
+encoded page plus a small fixed botocore overhead means the page was never copied.
+
+Uploads go through a real boto3 client to a local HTTP sink running in a separate
+process, so botocore's own buffering is included. The decoded page is excluded: PIL
+allocates it outside the Python heap that tracemalloc sees.
+
+Usage (from the 01pdfToImages directory):
+
+    python benchmarks/encode_memory.py [--profile high-fidelity-png] [--part-size-mb 5]
+"""
+import argparse
+import http.server
+import multiprocessing
+import os
+import random
+import sys
+import tracemalloc
+from io import BytesIO
+import boto3
+from PIL import Image, ImageDraw
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAMBDA_DIR)
+
+from page_uploader import PageUploader  # noqa: E402
+from render_profiles import encode_image, fit_to_profile, get_render_profile  # noqa: E402
+
+
+class SinkHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts PUT and multipart requests and discards their bodies."""
+
+    def _drain(self) -> None:
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+
+    def _reply(self, body: bytes = b'') -> None:
+        self.send_response(200)
+        self.send_header('ETag', '"sink"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self) -> None:
+        self._drain()
+        self._reply()
+
+    def do_POST(self) -> None:
+        self._drain()
+        if 'uploads' in self.path:
+            self._reply(b'<InitiateMultipartUploadResult><UploadId>sink</UploadId></InitiateMultipartUploadResult>')
+        else:
+            self._reply(b'<CompleteMultipartUploadResult><ETag>"sink"</ETag></CompleteMultipartUploadResult>')
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def serve(port_queue) -> None:
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SinkHandler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def make_page(width: int, height: int) -> Image.Image:
+    """A scanned-looking page: text lines over light noise, which keeps PNG output large."""
+    generator = random.Random(0)
+    noise = Image.frombytes('L', (width, height), bytes(generator.randrange(235, 256) for _ in range(width * height)))
+    page = Image.merge('RGB', (noise, noise, noise))
+    draw = ImageDraw.Draw(page)
+    for line in range(0, height - 100, 40):
+        draw.text((100, 50 + line), 'Referral received by fax ' * 6, fill=(0, 0, 0))
+    return page
+
+
+def measure(label: str, upload) -> dict:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    encoded_size = upload()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'path': label, 'encoded_mb': encoded_size / 1024 / 1024, 'peak_mb': peak / 1024 / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default='high-fidelity-png')
+    parser.add_argument('--part-size-mb', type=int, default=5)
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    sink = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+    sink.start()
+    client = boto3.client(
+        's3', endpoint_url=f"http://127.0.0.1:{port_queue.get()}", region_name='eu-central-1',
+        aws_access_key_id='benchmark', aws_secret_access_key='benchmark',
+    )
+
+    profile = get_render_profile(args.profile, 'png')
+    page = fit_to_profile(make_page(2480, 3508), profile)
+
+    part_size = args.part_size_mb * 1024 * 1024
+
+    def upload(body: bytes, multipart_threshold: int) -> None:
+        with PageUploader(client, 1, 1024 * 1024 * 1024, multipart_threshold=multipart_threshold, part_size=part_size) as uploader:
+            uploader.submit('sink', 'page', body, 'image/png')
+            uploader.wait()
+
+    def copied_path() -> int:
+        buffer = BytesIO()
+        page.save(buffer, format=profile.format)
+        body = bytes(buffer.getbuffer())
+        upload(body, len(body))
+        return len(body)
+
+    def put_path() -> int:
+        body = encode_image(page, profile)
+        upload(body, len(body))
+        return len(body)
+
+    def multipart_path() -> int:
+        body = encode_image(page, profile)
+        upload(body, part_size)
+        return len(body)
+
+    paths = [('copied', copied_path), ('put', put_path), ('multipart', multipart_path)]
+    # One untimed round each so lazily imported botocore internals are not counted
+    for _, path in paths:
+        path()
+
+    print(f"profile {profile.name}, page {page.width}x{page.height} {page.mode}, multipart parts of {args.part_size_mb} MB")
+    print(f"{'path':<11}{'encoded MB':>12}{'peak heap MB':>14}{'peak / page':>13}")
+    for label, path in paths:
+        result = measure(label, path)
+        print(f"{result['path']:<11}{result['encoded_mb']:>12.2f}{result['peak_mb']:>14.2f}{result['peak_mb'] / result['encoded_mb']:>12.2f}x")
+
+    sink.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+"""Load-test the whole document pipeline to size Map concurrency, lambda memory and endpoint instances.
+
+Replays documents through the processing state machine: plan, rendering shards (Map,
+maxConcurrency 10), merge, text extraction per page (Map, maxConcurrency 2) and file
+processing. It runs in two phases.
+
+1. Measure. Every distinct document goes through the real `handler` (plan, each shard,
+   merge) once, one invocation at a time, against an in-memory S3 stub. This records how
+   long each invocation takes and how many pages it yields. Render workers are set to the
+   vCPUs Lambda grants at --memory-mb, so the timings match that memory size as long as
+   this machine has at least that many cores.
+2. Replay. Documents arrive at --arrival-rate and run through the state machine
+   concurrently. Each Map state is a pool of its maxConcurrency. The pdfToImages lambda is
+   held to its reserved concurrency, and a new container pays the measured cold start.
+   Pages go to a stand-in for the vision endpoint, whose latency and error distributions
+   are configurable and whose capacity is instances x invocations per instance, queueing
+   beyond that like the async endpoint. Time is compressed by --time-scale and reported
+   back in unscaled seconds.
+
+The report gives documents and pages per minute, document latency p50/p95/p99, and per
+stage the time spent queueing (for a Map slot, a lambda container or endpoint capacity)
+next to the time spent being served.
+
+The stand-in is pluggable: --stand-in module:factory is called with the parsed arguments
+and must return an object with `sample(item, rng) -> (seconds, failed)`.
+
+Usage (from the 01pdfToImages directory, with poppler installed for PDFs):
+
+    python benchmarks/pipeline_load.py [documents or directories ...] [--synthetic pdf:20 docx:5]
+        [--documents 100] [--arrival-rate 30] [--memory-mb 2048] [--lambda-concurrency 40]
+        [--shard-concurrency 10] [--map-concurrency 2] [--endpoint-instances 1]
+        [--invocations-per-instance 4] [--vision-latency lognormal:8,0.4] [--vision-error-rate 0.01]
+        [--vision-retries 2] [--time-scale 0.01] [--output report.json]
+"""
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from bench_conversion import write_corpus_document  # noqa: E402
+from profile_handler import StubS3, load_lambda  # noqa: E402
+
+# Lambda grants one vCPU per 1769 MB of memory, up to six
+MB_PER_VCPU = 1769
+MAX_VCPUS = 6
+
+STAGES = ('plan', 'render', 'merge', 'extract', 'fileProcessing')
+
+
+def lambda_vcpus(memory_mb: int) -> int:
+    return max(1, min(MAX_VCPUS, memory_mb // MB_PER_VCPU))
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile; 0 for no samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+# Measure --------------------------------------------------------------------------------------------
+
+@dataclass
+class MeasuredDocument:
+    """Durations of the real handler invocations for one document, in seconds."""
+    name: str
+    plan_seconds: float
+    shard_seconds: List[float]
+    merge_seconds: float
+    items: List[Dict[str, Any]]
+
+
+def collect_documents(paths: List[str], synthetic: List[str], directory: str) -> List[str]:
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            documents.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if not name.startswith('.')))
+        else:
+            documents.append(path)
+
+    for spec in synthetic:
+        # Generated like the benchmark corpus: full pages of text in the requested format
+        kind, pages = spec.split(':')
+        documents.append(write_corpus_document(kind, int(pages), directory))
+    return documents
+
+
+def measure_documents(paths: List[str]) -> Tuple[List[MeasuredDocument], float]:
+    """Run every document through plan, shards and merge; returns the measurements and the cold start."""
+    stub = StubS3()
+    start = time.perf_counter()
+    lambda_module = load_lambda(stub)
+    cold_start_seconds = time.perf_counter() - start
+    # Measure rendering, not the shortcuts a repeated document would take
+    lambda_module.RENDER_CACHE_ENABLED = False
+    lambda_module.PROGRESS_MANIFEST_ENABLED = False
+
+    measured = []
+    for number, path in enumerate(paths):
+        key = f"uploads/{number}-{os.path.basename(path)}"
+        with open(path, 'rb') as document:
+            stub.objects[('input', key)] = document.read()
+        event = {'bucket': 'input', 'resultBucket': 'output', 'pdfKey': key, 'fileId': f'load-{number}', 'outputPrefix': 'images', 'format': 'jpeg'}
+
+        plan_seconds, plan = timed(lambda_module.handler, {'action': 'plan', 'document': event})
+        shard_seconds, shard_results = [], []
+        for shard in plan['shards']:
+            seconds, result = timed(lambda_module.handler, shard)
+            if 'items' not in result:
+                raise SystemExit(f"{path} failed to convert: {result}")
+            shard_seconds.append(seconds)
+            shard_results.append(result)
+        merge_seconds, merged = timed(lambda_module.handler, {'action': 'merge', 'document': plan, 'shards': shard_results})
+
+        measured.append(MeasuredDocument(os.path.basename(path), plan_seconds, shard_seconds, merge_seconds, merged['items']))
+        print(f"measured {os.path.basename(path)}: {len(merged['items'])} pages, {len(shard_seconds)} shards, {sum(shard_seconds):.2f}s rendering", file=sys.stderr)
+
+    return measured, cold_start_seconds
+
+
+def timed(function: Callable, *args) -> Tuple[float, Any]:
+    start = time.perf_counter()
+    result = function(*args, None)
+    return time.perf_counter() - start, result
+
+
+# Vision endpoint stand-in -------------------------------------------------------------------------
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """A latency sampler in seconds from 'constant:S', 'uniform:LOW,HIGH', 'exponential:MEAN' or 'lognormal:MEDIAN,SIGMA'."""
+    kind, _, values = spec.partition(':')
+    parameters = [float(value) for value in values.split(',')] if values else []
+    if kind == 'constant':
+        return lambda rng: parameters[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(parameters[0], parameters[1])
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1 / parameters[0])
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(math.log(parameters[0]), parameters[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class VisionStandIn:
+    """Answers each page after a sampled latency; fails a fraction of pages after their latency."""
+
+    def __init__(self, latency: Callable[[random.Random], float], error_rate: float):
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def sample(self, item: Dict[str, Any], rng: random.Random) -> Tuple[float, bool]:
+        return self.latency(rng), rng.random() < self.error_rate
+
+
+def load_stand_in(args: argparse.Namespace) -> Any:
+    if not args.stand_in:
+        return VisionStandIn(parse_distribution(args.vision_latency), args.vision_error_rate)
+    module_name, _, factory = args.stand_in.partition(':')
+    return getattr(importlib.import_module(module_name), factory)(args)
+
+
+# Replay -------------------------------------------------------------------------------------------
+
+class Capacity:
+    """A shared limit (reserved concurrency, endpoint slots) that records its peak use."""
+
+    def __init__(self, slots: int):
+        self._slots = threading.Semaphore(slots)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak = 0
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        self._slots.acquire()
+        with self._lock:
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+
+class LambdaFunction(Capacity):
+    """Reserved concurrency plus warm containers: an invocation without an idle container pays a cold start."""
+
+    def __init__(self, reserved_concurrency: int, cold_start_seconds: float):
+        super().__init__(reserved_concurrency)
+        self.cold_start_seconds = cold_start_seconds
+        self.containers = 0
+        self._idle = 0
+
+    def start_invocation(self) -> float:
+        """Take a container; returns the cold start it adds (0 when warm)."""
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+                return 0.0
+            self.containers += 1
+            return self.cold_start_seconds
+
+    def end_invocation(self) -> None:
+        with self._lock:
+            self._idle += 1
+
+
+class PipelineReplay:
+    """Replays measured documents through the state machine on a compressed clock."""
+
+    def __init__(self, args: argparse.Namespace, stand_in: Any, cold_start_seconds: float):
+        self.args = args
+        self.stand_in = stand_in
+        self.time_scale = args.time_scale
+        self.renderer = LambdaFunction(args.lambda_concurrency, cold_start_seconds)
+        self.endpoint = Capacity(args.endpoint_instances * args.invocations_per_instance)
+        self.rng = random.Random(args.seed)
+        self._rng_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.queueing: Dict[str, List[float]] = defaultdict(list)
+        self.service: Dict[str, List[float]] = defaultdict(list)
+        self.documents: List[Dict[str, Any]] = []
+        self.start = 0.0
+
+    def now(self) -> float:
+        """Unscaled seconds since the replay started."""
+        return (time.perf_counter() - self.start) / self.time_scale
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds * self.time_scale)
+
+    def random(self, function: Callable[[random.Random], Any]) -> Any:
+        with self._rng_lock:
+            return function(self.rng)
+
+    def record(self, stage: str, queued_at: float, started_at: float) -> None:
+        with self._lock:
+            self.queueing[stage].append(started_at - queued_at)
+            self.service[stage].append(self.now() - started_at)
+
+    def invoke_renderer(self, stage: str, seconds: float, queued_at: float) -> None:
+        with self.renderer.hold():
+            started_at = self.now()
+            self.sleep(self.renderer.start_invocation() + seconds)
+            self.renderer.end_invocation()
+            self.record(stage, queued_at, started_at)
+
+    def extract(self, item: Dict[str, Any], queued_at: float) -> bool:
+        """One text-extraction iteration: call the endpoint, retrying failed pages."""
+        for _ in range(self.args.vision_retries + 1):
+            with self.endpoint.hold():
+                started_at = self.now()
+                seconds, failed = self.random(lambda rng: self.stand_in.sample(item, rng))
+                self.sleep(seconds)
+                self.record('extract', queued_at, started_at)
+            if not failed:
+                return True
+            queued_at = self.now()
+        return False
+
+    def run_document(self, document: MeasuredDocument, arrived_at: float) -> None:
+        self.invoke_renderer('plan', document.plan_seconds, arrived_at)
+
+        with ThreadPoolExecutor(max_workers=self.args.shard_concurrency) as shards:
+            queued_at = self.now()
+            list(shards.map(lambda seconds: self.invoke_renderer('render', seconds, queued_at), document.shard_seconds))
+
+        self.invoke_renderer('merge', document.merge_seconds, self.now())
+
+        with ThreadPoolExecutor(max_workers=self.args.map_concurrency) as items:
+            queued_at = self.now()
+            succeeded = all(list(items.map(lambda item: self.extract(item, queued_at), document.items)))
+
+        if succeeded:
+            started_at = self.now()
+            self.sleep(self.args.file_processing_seconds)
+            self.record('fileProcessing', started_at, started_at)
+
+        with self._lock:
+            self.documents.append({
+                'name': document.name,
+                'pages': len(document.items),
+                'succeeded': succeeded,
+                'seconds': self.now() - arrived_at,
+            })
+
+    def run(self, documents: List[MeasuredDocument]) -> Dict[str, Any]:
+        self.start = time.perf_counter()
+        threads = []
+        for number in range(self.args.documents):
+            document = documents[number % len(documents)]
+            thread = threading.Thread(target=self.run_document, args=(document, self.now()), daemon=True)
+            thread.start()
+            threads.append(thread)
+            if self.args.arrival_rate:
+                # Poisson arrivals at arrival_rate documents per minute
+                self.sleep(self.random(lambda rng: rng.expovariate(self.args.arrival_rate / 60)))
+        for thread in threads:
+            thread.join()
+        return self.report(self.now())
+
+    def report(self, elapsed_seconds: float) -> Dict[str, Any]:
+        completed = [document for document in self.documents if document['succeeded']]
+        latencies = [document['seconds'] for document in completed]
+        minutes = elapsed_seconds / 60
+        return {
+            'documents': len(self.documents),
+            'completed': len(completed),
+            'failed': len(self.documents) - len(completed),
+            'elapsedSeconds': round(elapsed_seconds, 1),
+            'documentsPerMinute': round(len(completed) / minutes, 2) if minutes else 0.0,
+            'pagesPerMinute': round(sum(document['pages'] for document in completed) / minutes, 1) if minutes else 0.0,
+            'latencyP50Seconds': round(percentile(latencies, 0.5), 1),
+            'latencyP95Seconds': round(percentile(latencies, 0.95), 1),
+            'latencyP99Seconds': round(percentile(latencies, 0.99), 1),
+            'lambdaPeakConcurrency': self.renderer.peak,
+            'lambdaContainers': self.renderer.containers,
+            'endpointPeakInFlight': self.endpoint.peak,
+            'stages': {
+                stage: {
+                    'count': len(self.service[stage]),
+                    'queueP50Seconds': round(percentile(self.queueing[stage], 0.5), 2),
+                    'queueP95Seconds': round(percentile(self.queueing[stage], 0.95), 2),
+                    'serviceP50Seconds': round(percentile(self.service[stage], 0.5), 2),
+                    'serviceP95Seconds': round(percentile(self.service[stage], 0.95), 2),
+                }
+                for stage in STAGES if self.service[stage]
+            },
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['completed']}/{report['documents']} documents in {report['elapsedSeconds']}s: "
+          f"{report['documentsPerMinute']} documents/min, {report['pagesPerMinute']} pages/min")
+    print(f"document latency p50 {report['latencyP50Seconds']}s, p95 {report['latencyP95Seconds']}s, p99 {report['latencyP99Seconds']}s")
+    print(f"pdfToImages peak concurrency {report['lambdaPeakConcurrency']} ({report['lambdaContainers']} containers), "
+          f"endpoint peak in flight {report['endpointPeakInFlight']}")
+    print(f"{'stage':<16}{'count':>8}{'queue p50':>12}{'queue p95':>12}{'service p50':>14}{'service p95':>14}")
+    for stage, timings in report['stages'].items():
+        print(f"{stage:<16}{timings['count']:>8}{timings['queueP50Seconds']:>12}{timings['queueP95Seconds']:>12}"
+              f"{timings['serviceP50Seconds']:>14}{timings['serviceP95Seconds']:>14}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help='documents, or directories of documents, to replay')
+    parser.add_argument('--synthetic', nargs='*', default=[], help='generated documents as KIND:PAGES, e.g. pdf:20')
+    parser.add_argument('--documents', type=int, default=50, help='documents to replay, cycling through the inputs')
+    parser.add_argument('--arrival-rate', type=float, default=0.0, help='documents per minute; 0 starts them all at once')
+    parser.add_argument('--memory-mb', type=int, default=2048, help='pdfToImages memory size, which sets its render workers')
+    parser.add_argument('--lambda-concurrency', type=int, default=40, help='pdfToImages reserved concurrency')
+    parser.add_argument('--shard-concurrency', type=int, default=10, help='maxConcurrency of the render-shards Map')
+    parser.add_argument('--map-concurrency', type=int, default=2, help='maxConcurrency of the process-items Map')
+    parser.add_argument('--endpoint-instances', type=int, default=1)
+    parser.add_argument('--invocations-per-instance', type=int, default=4)
+    parser.add_argument('--vision-latency', default='lognormal:8,0.4', help='seconds per page, see parse_distribution')
+    parser.add_argument('--vision-error-rate', type=float, default=0.0)
+    parser.add_argument('--vision-retries', type=int, default=0, help='retries of a failed page before its document fails')
+    parser.add_argument('--stand-in', help='module:factory building a custom vision endpoint stand-in')
+    parser.add_argument('--file-processing-seconds', type=float, default=1.0)
+    parser.add_argument('--time-scale', type=float, default=0.01, help='real time per unit of simulated time')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the report as JSON')
+    args = parser.parse_args()
+
+    workers = str(lambda_vcpus(args.memory_mb))
+    os.environ['TEXT_RENDER_WORKERS'] = os.environ['PDF_RENDER_WORKERS'] = workers
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ.setdefault('POWERTOOLS_LOG_LEVEL', 'ERROR')
+    # The report replaces the per-invocation EMF records
+    os.environ.setdefault('POWERTOOLS_METRICS_DISABLED', 'true')
+    if int(workers) > (os.cpu_count() or 1):
+        print(f"warning: {args.memory_mb} MB grants {workers} vCPUs but this machine has {os.cpu_count()}; render times will be too slow", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = collect_documents(args.paths, args.synthetic, directory)
+        if not paths:
+            parser.error('no documents: pass paths or --synthetic')
+        measured, cold_start_seconds = measure_documents(paths)
+
+    from instrumentation import peak_rss_mb
+    peak_own, peak_children = peak_rss_mb()
+
+    report = PipelineReplay(args, load_stand_in(args), cold_start_seconds).run(measured)
+    report['coldStartSeconds'] = round(cold_start_seconds, 2)
+    report['measurePeakRssMb'] = round(max(peak_own, peak_children), 1)
+    print_report(report)
+    if report['measurePeakRssMb'] > args.memory_mb:
+        print(f"warning: converting these documents peaked at {report['measurePeakRssMb']} MB, over --memory-mb {args.memory_mb}")
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
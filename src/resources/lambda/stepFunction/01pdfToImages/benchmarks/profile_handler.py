@@ -0,0 +1,170 @@
+"""Profile one handler invocation locally against an in-memory S3 stub.
+
+Writes a folded-stack profile (one "frame;frame;frame count" line per stack) that
+flamegraph.pl, speedscope and inferno read directly, plus the per-stage timings the
+lambda publishes as metrics. Upload and download threads are sampled as well as the
+main thread; time spent inside poppler shows up as the frames waiting on it.
+
+Usage (from the 01pdfToImages directory):
+
+    python benchmarks/profile_handler.py path/to/document.pdf [--render-profile standard]
+        [--output-mode images] [--interval-ms 1] [--output profile.folded] [--cprofile profile.prof]
+"""
+import argparse
+import cProfile
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from io import BytesIO
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAMBDA_DIR)
+
+# Every run must render, so the render cache is off; logs would otherwise dominate the profile
+os.environ['RENDER_CACHE_ENABLED'] = 'false'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('POWERTOOLS_METRICS_NAMESPACE', 'LocalProfile')
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+
+class StubS3:
+    """The subset of the S3 client the lambda uses, backed by a dict."""
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        body = bytes(Body.read() if hasattr(Body, 'read') else Body)
+        with self.lock:
+            self.objects[(Bucket, Key)] = body
+        return {'ETag': f'"{len(body)}"'}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        body = self._get(Bucket, Key)
+        return {'ContentLength': len(body), 'ETag': f'"{len(body)}"'}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        body = self._get(Bucket, Key)
+        if Range:
+            start, end = Range.removeprefix('bytes=').split('-')
+            body = body[int(start):int(end) + 1]
+        return {'Body': BytesIO(body), 'ContentLength': len(body)}
+
+    def _get(self, bucket, key):
+        with self.lock:
+            if (bucket, key) not in self.objects:
+                raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+            return self.objects[(bucket, key)]
+
+
+class StackSampler:
+    """Sample the Python stacks of every thread at a fixed interval into folded-stack counts."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def __enter__(self) -> 'StackSampler':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Pool threads share a prefix so their samples merge into one tower
+                thread_name = names.get(thread_id, 'thread').split('_')[0]
+                self.samples[';'.join([thread_name, *reversed(stack)])] += 1
+
+    def write_folded(self, path: str) -> None:
+        with open(path, 'w') as output:
+            for stack, count in self.samples.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+def load_lambda(stub: StubS3):
+    spec = importlib.util.spec_from_file_location('pdf_to_images_lambda', os.path.join(LAMBDA_DIR, 'lambda.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.s3_client = stub
+    return module
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('document')
+    parser.add_argument('--render-profile', default='standard')
+    parser.add_argument('--output-mode', default='images')
+    parser.add_argument('--format', default='jpeg')
+    parser.add_argument('--interval-ms', type=float, default=1.0)
+    parser.add_argument('--output', default='profile.folded', help='folded-stack output path')
+    parser.add_argument('--cprofile', help='also write a cProfile (pstats) file; adds overhead to the sampled run')
+    args = parser.parse_args()
+
+    stub = StubS3()
+    lambda_module = load_lambda(stub)
+
+    key = f"uploads/{os.path.basename(args.document)}"
+    with open(args.document, 'rb') as document:
+        stub.objects[('input', key)] = document.read()
+
+    event = {
+        'bucket': 'input',
+        'resultBucket': 'output',
+        'pdfKey': key,
+        'fileId': 'local-profile',
+        'outputPrefix': 'images',
+        'format': args.format,
+        'renderProfile': args.render_profile,
+        'outputMode': args.output_mode,
+    }
+
+    profiler = cProfile.Profile() if args.cprofile else None
+    start = time.perf_counter()
+    with StackSampler(args.interval_ms / 1000) as sampler:
+        if profiler:
+            profiler.enable()
+        result = lambda_module.handler(event, None)
+        if profiler:
+            profiler.disable()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if 'items' not in result:
+        raise SystemExit(f"handler failed: {result}")
+
+    sampler.write_folded(args.output)
+    if profiler:
+        profiler.dump_stats(args.cprofile)
+
+    print(json.dumps({
+        'pages': result['pages'],
+        'elapsedMs': round(elapsed_ms, 1),
+        'stages': lambda_module.stage_timings.summary(),
+        'samples': sum(sampler.samples.values()),
+        'folded': args.output,
+        'cprofile': args.cprofile,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
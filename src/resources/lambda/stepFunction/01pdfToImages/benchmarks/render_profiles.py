@@ -0,0 +1,66 @@
+"""Report encoded bytes per page and encode time per page for every render profile.
+
+Usage (from the 01pdfToImages directory, with poppler installed):
+
+    python benchmarks/render_profiles.py [--pdf path/to/file.pdf] [--poppler-path /opt/poppler/bin]
+"""
+import argparse
+import os
+import sys
+import time
+
+from pdf2image import convert_from_path
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAMBDA_DIR)
+
+from render_profiles import RENDER_PROFILES, encode_image, fit_to_profile, get_render_profile  # noqa: E402
+
+SAMPLE_PDF = os.path.join(LAMBDA_DIR, '..', '..', '..', '..', 'assets', 'P9-Jordan request.pdf')
+
+
+def benchmark_profile(pdf_path: str, poppler_path: str, name: str) -> dict:
+    profile = get_render_profile(name, 'jpeg')
+
+    start = time.perf_counter()
+    images = convert_from_path(pdf_path, dpi=profile.dpi, fmt='ppm', grayscale=profile.color_mode != 'RGB', poppler_path=poppler_path)
+    render_seconds = time.perf_counter() - start
+
+    encoded_bytes = 0
+    encode_seconds = 0.0
+    dimensions = None
+    for image in images:
+        start = time.perf_counter()
+        fitted = fit_to_profile(image, profile)
+        encoded_bytes += len(encode_image(fitted, profile))
+        encode_seconds += time.perf_counter() - start
+        dimensions = fitted.size
+
+    pages = len(images)
+    return {
+        'profile': name,
+        'pages': pages,
+        'size': f"{dimensions[0]}x{dimensions[1]}" if dimensions else '-',
+        'kb_per_page': encoded_bytes / pages / 1024,
+        'encode_ms_per_page': encode_seconds / pages * 1000,
+        'render_ms_per_page': render_seconds / pages * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdf', default=os.path.normpath(SAMPLE_PDF))
+    parser.add_argument('--poppler-path', default='/opt/poppler/bin')
+    args = parser.parse_args()
+
+    print(f"{'profile':<26}{'pages':>6}{'size':>12}{'KB/page':>10}{'encode ms/page':>16}{'render ms/page':>16}")
+    for name in RENDER_PROFILES:
+        result = benchmark_profile(args.pdf, args.poppler_path, name)
+        print(
+            f"{result['profile']:<26}{result['pages']:>6}{result['size']:>12}"
+            f"{result['kb_per_page']:>10.1f}{result['encode_ms_per_page']:>16.1f}{result['render_ms_per_page']:>16.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
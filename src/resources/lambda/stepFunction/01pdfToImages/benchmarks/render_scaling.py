@@ -0,0 +1,69 @@
+"""Measure how PDF rasterize-and-encode throughput scales with the number of render workers.
+
+Builds a synthetic PDF (200 pages of fax-like text by default) and runs the lambda's
+render path with each worker count, without uploading. Speed-up is bounded by the
+CPUs available to this process, which the report prints first.
+
+Usage (from the 01pdfToImages directory, with poppler installed):
+
+    python benchmarks/render_scaling.py [--pages 200] [--workers 1 2 4 6] [--render-profile standard]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from profile_handler import StubS3, load_lambda
+from process_pool import available_cpus
+
+
+def make_synthetic_pdf(path: str, pages: int) -> None:
+    """Write a PDF of letter-size pages at 100 DPI covered in pseudo-random text lines."""
+    generator = random.Random(0)
+    words = ['referral', 'patient', 'date', 'signature', 'fax', 'page', 'clinic', 'diagnosis', 'notes', 'urgent']
+
+    images = []
+    for number in range(1, pages + 1):
+        image = Image.new('L', (850, 1100), color=255)
+        draw = ImageDraw.Draw(image)
+        draw.text((60, 40), f"Synthetic fax page {number}", fill=0)
+        for line in range(60):
+            draw.text((60, 70 + line * 16), ' '.join(generator.choice(words) for _ in range(12)), fill=0)
+        images.append(image)
+
+    images[0].save(path, format='PDF', save_all=True, append_images=images[1:], resolution=100)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 6])
+    parser.add_argument('--render-profile', default='standard')
+    parser.add_argument('--format', default='jpeg')
+    args = parser.parse_args()
+
+    lambda_module = load_lambda(StubS3())
+    profile = lambda_module.get_render_profile(args.render_profile, args.format)
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf_file:
+        make_synthetic_pdf(pdf_file.name, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(pdf_file.name) / 1024 / 1024:.1f} MB, {available_cpus()} CPUs available, profile {profile.name}")
+        print(f"{'workers':>8}{'seconds':>10}{'pages/s':>10}{'speed-up':>10}{'MB out':>10}")
+
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            encoded_bytes = 0
+            for _, body in lambda_module.iter_encoded_pdf_pages(pdf_file.name, list(range(1, args.pages + 1)), profile, workers):
+                encoded_bytes += len(body)
+            seconds = time.perf_counter() - start
+
+            baseline = baseline or seconds
+            print(f"{workers:>8}{seconds:>10.2f}{args.pages / seconds:>10.1f}{baseline / seconds:>9.2f}x{encoded_bytes / 1024 / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Measure cold-import time and first-request latency of the pdfToImages lambda.
+
+Every run starts a fresh interpreter, imports lambda.py, then sends a first and a
+second request through the handler against an in-memory S3 stub. Use --compare-ref
+to measure the lambda as it was at another git revision (e.g. before a change).
+
+Usage (from the 01pdfToImages directory):
+
+    python benchmarks/startup.py [--runs 5] [--pdf] [--compare-ref HEAD~1]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from io import BytesIO
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.normpath(os.path.join(LAMBDA_DIR, '..', '..', '..', '..', 'assets', 'P9-Jordan request.pdf'))
+
+CHILD_ENVIRONMENT = {
+    'LOG_LEVEL': 'ERROR',
+    'POWERTOOLS_LOG_LEVEL': 'ERROR',
+    'RENDER_CACHE_ENABLED': 'false',
+    'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-central-1'),
+}
+
+CHILD = r'''
+import importlib.util, json, sys, time
+from io import BytesIO
+
+lambda_dir, document_path, document_key = sys.argv[1:4]
+sys.path.insert(0, lambda_dir)
+
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('pdf_to_images_lambda', lambda_dir + '/lambda.py')
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - start) * 1000
+
+from botocore.exceptions import ClientError
+
+
+class StubS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body.read() if hasattr(Body, 'read') else Body)
+        return {'ETag': '"%d"' % len(self.objects[(Bucket, Key)])}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        body = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range.removeprefix('bytes=').split('-')
+            body = body[int(start):int(end) + 1]
+        return {'Body': BytesIO(body), 'ContentLength': len(body), 'ETag': '"%d"' % len(body)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        response = self.get_object(Bucket, Key)
+        return {'ContentLength': response['ContentLength'], 'ETag': response['ETag']}
+
+
+stub = StubS3()
+module.s3_client = stub
+with open(document_path, 'rb') as document:
+    content = document.read()
+
+latencies = []
+for attempt in range(2):
+    key = 'uploads/%d-%s' % (attempt, document_key)
+    stub.objects[('input', key)] = content
+    event = {'bucket': 'input', 'resultBucket': 'output', 'pdfKey': key, 'fileId': 'benchmark', 'outputPrefix': 'images', 'format': 'jpeg'}
+    start = time.perf_counter()
+    result = module.handler(event, None)
+    latencies.append((time.perf_counter() - start) * 1000)
+    if 'items' not in result:
+        raise SystemExit('handler failed: %s' % result)
+
+print(json.dumps({'import_ms': import_ms, 'first_request_ms': latencies[0], 'second_request_ms': latencies[1]}))
+'''
+
+
+def measure(lambda_dir: str, document_path: str, document_key: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        # The render cache is off so the second request renders the document again
+        child = subprocess.run(
+            [sys.executable, '-c', CHILD, lambda_dir, document_path, document_key],
+            capture_output=True, text=True, env={**os.environ, **CHILD_ENVIRONMENT},
+        )
+        if child.returncode != 0:
+            raise SystemExit(f"{lambda_dir}: {child.stderr or child.stdout}")
+        samples.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    return {metric: statistics.median(sample[metric] for sample in samples) for metric in samples[0]}
+
+
+def export_revision(ref: str, target_dir: str) -> str:
+    """Extract the lambda directory as of a git revision into target_dir."""
+    top_level = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=LAMBDA_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    prefix = os.path.relpath(LAMBDA_DIR, top_level)
+    archive = subprocess.run(['git', 'archive', '--format=tar', f"{ref}:{prefix}"], cwd=top_level, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(target_dir)
+    return target_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--pdf', action='store_true', help='also measure the bundled sample PDF (needs poppler)')
+    parser.add_argument('--compare-ref', help='git revision to measure for comparison')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        text_path = os.path.join(work_dir, 'startup.txt')
+        with open(text_path, 'w') as text_file:
+            text_file.write('Referral received by fax.\n' * 200)
+
+        documents = [(text_path, 'startup.txt')]
+        if args.pdf:
+            documents.append((SAMPLE_PDF, 'startup.pdf'))
+
+        versions = [('current', LAMBDA_DIR)]
+        if args.compare_ref:
+            versions.insert(0, (args.compare_ref, export_revision(args.compare_ref, os.path.join(work_dir, 'reference'))))
+
+        print(f"{'version':<16}{'document':<14}{'import ms':>12}{'1st request ms':>16}{'2nd request ms':>16}")
+        for document_path, document_key in documents:
+            for label, lambda_dir in versions:
+                result = measure(lambda_dir, document_path, document_key, args.runs)
+                print(
+                    f"{label:<16}{document_key:<14}{result['import_ms']:>12.1f}"
+                    f"{result['first_request_ms']:>16.1f}{result['second_request_ms']:>16.1f}"
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+"""Lay out DOCX paragraphs and tables on text-renderer pages, keeping table structure.
+
+Flattening a document to plain text runs the cells of a table together, so the
+model cannot tell which value belongs to which field. Here tables are drawn as
+bordered grids in their own column widths, and paragraphs are wrapped to their
+measured width with single spacing, which fits more text on a page than the
+fixed-width lines of the text renderer.
+
+Only what changes the page is read: paragraph and run font size and weight,
+alignment, left indent, list paragraphs, explicit page breaks and table grids.
+Images, floating shapes, headers and footers are not drawn.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from text_renderer import FONT_SIZE, LINE_HEIGHT, MARGIN, PAGE_HEIGHT, PAGE_WIDTH, get_font, get_word_mask
+
+# Body text ("Normal") is drawn at the text renderer's font size; other sizes keep their proportion to it
+MIN_FONT_SIZE = 24
+MAX_FONT_SIZE = 96
+# Line height as a multiple of the largest font on the line; Word's single spacing is ~1.17
+LINE_SPACING = 1.25
+PARAGRAPH_SPACING = LINE_HEIGHT // 4
+CELL_PADDING = 12
+RULE_WIDTH = 2
+LIST_BULLET = '•'
+
+CONTENT_LEFT = MARGIN
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+CONTENT_BOTTOM = PAGE_HEIGHT - MARGIN
+
+EMU_PER_INCH = 914400
+# Word's size when neither the document nor its Normal style sets one (11pt)
+DEFAULT_HALF_POINTS = 22
+
+
+class TextStyle(NamedTuple):
+    size: int
+    bold: bool = False
+
+
+BODY_STYLE = TextStyle(FONT_SIZE)
+
+
+class LaidLine(NamedTuple):
+    """One wrapped line: its width, ascent and height, and (x offset, word, style) for every word."""
+    width: int
+    ascent: int
+    height: int
+    words: Tuple[Tuple[int, str, TextStyle], ...]
+
+    @property
+    def text(self) -> str:
+        return ' '.join(word for _, word, _ in self.words)
+
+
+@dataclass
+class LayoutPage:
+    """Everything drawn on one page: lines at (x, y), table rules, and the page's text."""
+    lines: List[Tuple[int, int, LaidLine]] = field(default_factory=list)
+    rules: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    text_lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.text_lines)
+
+
+@lru_cache(maxsize=None)
+def font_ascent(style: TextStyle) -> int:
+    return get_font(style.size, style.bold).getmetrics()[0]
+
+
+@lru_cache(maxsize=None)
+def line_height(size: int) -> int:
+    return round(size * LINE_SPACING)
+
+
+def measure(word: str, style: TextStyle) -> int:
+    return round(get_word_mask(word, style.size, style.bold)[3])
+
+
+def wrap_words(tokens: List[Tuple[str, TextStyle, bool]], width: int) -> List[LaidLine]:
+    """Greedily wrap (text, style, space before) tokens to `width` pixels.
+
+    Tokens without a space before them (a word whose runs change style midway) stay on
+    the line of the previous token. A single word wider than the line is broken.
+    A token of '\\n' ends the line.
+    """
+    lines: List[LaidLine] = []
+    words: List[Tuple[int, str, TextStyle]] = []
+    x = 0
+    largest = BODY_STYLE.size
+    ascent = font_ascent(BODY_STYLE)
+
+    def finish() -> None:
+        nonlocal words, x, largest, ascent
+        lines.append(LaidLine(x, ascent, line_height(largest), tuple(words)))
+        words, x, largest, ascent = [], 0, BODY_STYLE.size, font_ascent(BODY_STYLE)
+
+    for text, style, space_before in tokens:
+        if text == '\n':
+            finish()
+            continue
+
+        gap = measure(' ', style) if space_before and words else 0
+        advance = measure(text, style)
+        if words and space_before and x + gap + advance > width:
+            finish()
+            gap = 0
+
+        while advance > width - x and len(text) > 1:
+            # Break a word that cannot fit on a line of its own (long IDs in narrow cells)
+            cut = len(text) - 1
+            while cut > 1 and measure(text[:cut], style) > width - x - gap:
+                cut -= 1
+            if words and measure(text[:cut], style) > width - x - gap:
+                finish()
+                gap = 0
+                continue
+            words.append((x + gap, text[:cut], style))
+            x += gap + measure(text[:cut], style)
+            largest, ascent = max(largest, style.size), max(ascent, font_ascent(style))
+            finish()
+            gap = 0
+            text = text[cut:]
+            advance = measure(text, style)
+
+        words.append((x + gap, text, style))
+        x += gap + advance
+        largest, ascent = max(largest, style.size), max(ascent, font_ascent(style))
+
+    if words or not lines:
+        finish()
+    return lines
+
+
+class StyleResolver:
+    """Resolve the font size and weight of paragraph and character styles, once per style id."""
+
+    def __init__(self, document: Any):
+        from docx.enum.style import WD_STYLE_TYPE
+
+        self._paragraph_type = WD_STYLE_TYPE.PARAGRAPH
+        self._styles = document.styles
+        default_half_points = self._styles.element.xpath('w:docDefaults/w:rPrDefault/w:rPr/w:sz/@w:val')
+        self._document_size = int(default_half_points[0]) / 2 if default_half_points else DEFAULT_HALF_POINTS / 2
+        self._resolved: Dict[Optional[str], Tuple[Optional[float], Optional[bool], str]] = {}
+        self._body_points = self.resolve(None)[0] or self._document_size
+
+    def resolve(self, style_id: Optional[str]) -> Tuple[Optional[float], Optional[bool], str]:
+        """(size in points, bold, style name) for a style id, following basedOn; None id is Normal."""
+        if style_id not in self._resolved:
+            element = self._styles.element.get_by_id(style_id) if style_id else self._styles.element.default_for(self._paragraph_type)
+            size, bold, name = None, None, ''
+            seen = set()
+            while element is not None and element.styleId not in seen:
+                seen.add(element.styleId)
+                name = name or (element.name_val or '')
+                rPr = element.rPr
+                if rPr is not None:
+                    if size is None and rPr.sz is not None:
+                        size = rPr.sz.val.pt
+                    if bold is None and rPr.b is not None:
+                        bold = rPr.b.val
+                based_on = element.basedOn_val
+                element = self._styles.element.get_by_id(based_on) if based_on else None
+            self._resolved[style_id] = (size, bold, name)
+        return self._resolved[style_id]
+
+    def pixels(self, points: Optional[float]) -> int:
+        if points is None:
+            return BODY_STYLE.size
+        return max(MIN_FONT_SIZE, min(MAX_FONT_SIZE, round(FONT_SIZE * points / self._body_points)))
+
+    def paragraph_style(self, paragraph: Any) -> Tuple[TextStyle, str]:
+        size, bold, name = self.resolve(paragraph._p.style)
+        if size is None:
+            size = self._body_points
+        return TextStyle(self.pixels(size), bool(bold)), name
+
+    def run_style(self, run: Any, paragraph_style: TextStyle) -> TextStyle:
+        size, bold = paragraph_style.size, paragraph_style.bold
+        if run._r.style:
+            style_size, style_bold, _ = self.resolve(run._r.style)
+            size = self.pixels(style_size) if style_size is not None else size
+            bold = style_bold if style_bold is not None else bold
+        if run.font.size is not None:
+            size = self.pixels(run.font.size.pt)
+        if run.bold is not None:
+            bold = run.bold
+        return TextStyle(size, bool(bold))
+
+
+def iter_blocks(container: Any) -> Iterator[Any]:
+    """Paragraphs and tables of a document body or table cell, in document order."""
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    element = container.element.body if hasattr(container, 'element') and hasattr(container.element, 'body') else container._tc
+    for child in element.iterchildren():
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            yield Paragraph(child, container)
+        elif tag == 'tbl':
+            yield Table(child, container)
+
+
+def has_page_break(run: Any) -> bool:
+    return bool(run._r.xpath('w:br[@w:type="page"]'))
+
+
+class DocxLayout:
+    """Paginate one document into LayoutPages."""
+
+    def __init__(self, document: Any, title: Optional[str] = None):
+        self._styles = StyleResolver(document)
+        self.pages: List[LayoutPage] = []
+        self._new_page()
+        if title:
+            title_line = wrap_words([(word, BODY_STYLE, True) for word in title.split()], CONTENT_WIDTH)[0]
+            self._page.lines.append((CONTENT_LEFT, self._y, title_line))
+            self._page.text_lines.extend([title, ''])
+            self._y += 2 * LINE_HEIGHT
+
+        for block in iter_blocks(document):
+            if block.__class__.__name__ == 'Table':
+                self._place_table(block)
+            else:
+                self._place_paragraph(block)
+
+    def _new_page(self) -> None:
+        self._page = LayoutPage()
+        self.pages.append(self._page)
+        self._y = MARGIN
+
+    def _paragraph_lines(self, paragraph: Any, width: int) -> Tuple[List[LaidLine], List[bool]]:
+        """Wrap a paragraph; also return, per line, whether a page break follows it."""
+        style, name = self._styles.paragraph_style(paragraph)
+        tokens: List[Tuple[str, TextStyle, bool]] = []
+        breaks_after = set()
+        if name.startswith('List') or paragraph._p.pPr is not None and paragraph._p.pPr.numPr is not None:
+            tokens.append((LIST_BULLET, style, True))
+
+        space_before = True
+        for run in paragraph.runs:
+            run_style = self._styles.run_style(run, style)
+            for piece in re.findall(r'\n|[^\S\n]+|[^\s]+', run.text):
+                if piece == '\n':
+                    tokens.append(('\n', run_style, False))
+                    space_before = False
+                elif piece.isspace():
+                    space_before = True
+                else:
+                    tokens.append((piece, run_style, space_before))
+                    space_before = False
+            if has_page_break(run):
+                breaks_after.add(len(tokens))
+
+        if not breaks_after:
+            return wrap_words(tokens, width), []
+
+        # Wrap each stretch between page breaks separately, so a break ends its line
+        lines, page_breaks, start = [], [], 0
+        for end in sorted(breaks_after) + [len(tokens)]:
+            stretch = wrap_words(tokens[start:end], width) if end > start or not lines else []
+            lines.extend(stretch)
+            page_breaks.extend([False] * len(stretch))
+            if end in breaks_after and page_breaks:
+                page_breaks[-1] = True
+            start = end
+        return lines, page_breaks
+
+    def _place_paragraph(self, paragraph: Any) -> None:
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+        paragraph_format = paragraph.paragraph_format
+        if paragraph_format.page_break_before and self._page.lines:
+            self._new_page()
+
+        indent = 0
+        if paragraph_format.left_indent:
+            indent = min(CONTENT_WIDTH // 2, max(0, round(paragraph_format.left_indent.emu * 300 / EMU_PER_INCH)))
+        width = CONTENT_WIDTH - indent
+        lines, page_breaks = self._paragraph_lines(paragraph, width)
+
+        for number, line in enumerate(lines):
+            if self._y + line.height > CONTENT_BOTTOM and self._page.lines:
+                self._new_page()
+            x = CONTENT_LEFT + indent
+            if paragraph_format.alignment == WD_ALIGN_PARAGRAPH.CENTER:
+                x += (width - line.width) // 2
+            elif paragraph_format.alignment == WD_ALIGN_PARAGRAPH.RIGHT:
+                x += width - line.width
+            if line.words:
+                self._page.lines.append((x, self._y, line))
+            self._page.text_lines.append(line.text)
+            self._y += line.height if line.words else line.height // 2
+            if page_breaks and page_breaks[number]:
+                self._new_page()
+
+        self._y += PARAGRAPH_SPACING
+
+    def _cell_lines(self, cell: Any, width: int) -> List[LaidLine]:
+        lines: List[LaidLine] = []
+        for block in iter_blocks(cell):
+            if block.__class__.__name__ == 'Table':
+                # Nested tables are rare in forms; their rows are kept as text
+                for row in block.rows:
+                    row_text = ' | '.join(nested.text for nested in row.cells)
+                    lines.extend(wrap_words([(word, BODY_STYLE, True) for word in row_text.split()], width))
+            else:
+                lines.extend(line for line in self._paragraph_lines(block, width)[0] if line.words)
+        return lines
+
+    def _place_table(self, table: Any) -> None:
+        from docx.table import _Cell
+
+        grid = [column.w.emu if column.w is not None else 0 for column in table._tbl.tblGrid.gridCol_lst]
+        if not grid:
+            return
+        if not all(grid):
+            grid = [1] * len(grid)
+        total = sum(grid)
+        edges = [CONTENT_LEFT + round(CONTENT_WIDTH * sum(grid[:index]) / total) for index in range(len(grid) + 1)]
+
+        for row in table.rows:
+            cells = []
+            column = 0
+            for tc in row._tr.tc_lst:
+                span = max(1, tc.grid_span)
+                left, right = edges[min(column, len(grid))], edges[min(column + span, len(grid))]
+                column += span
+                if right <= left:
+                    continue
+                # Vertically merged continuation cells repeat the box but not the text
+                lines = [] if tc.vMerge == 'continue' else self._cell_lines(_Cell(tc, table), right - left - 2 * CELL_PADDING)
+                cells.append((left, right, lines))
+            self._place_row(cells)
+
+        self._y += PARAGRAPH_SPACING
+
+    def _place_row(self, cells: List[Tuple[int, int, List[LaidLine]]]) -> None:
+        """Place one table row, moving it to the next page if it fits there, and splitting it if not even that."""
+        def height_of(lines: List[LaidLine]) -> int:
+            return sum(line.height for line in lines)
+
+        row_height = max((height_of(lines) for _, _, lines in cells), default=0) + 2 * CELL_PADDING
+        full_page = CONTENT_BOTTOM - MARGIN
+        if self._y + row_height > CONTENT_BOTTOM and row_height <= full_page and self._page.lines:
+            self._new_page()
+
+        remaining = [lines for _, _, lines in cells]
+        while True:
+            available = CONTENT_BOTTOM - self._y - 2 * CELL_PADDING
+            taken = []
+            for lines in remaining:
+                count, used = 0, 0
+                while count < len(lines) and used + lines[count].height <= available:
+                    used += lines[count].height
+                    count += 1
+                taken.append(count)
+
+            if any(lines for lines in remaining) and not any(taken):
+                if self._page.lines:
+                    self._new_page()
+                    continue
+                # Not even one line fits on an empty page: place a line per cell regardless
+                taken = [min(1, len(lines)) for lines in remaining]
+
+            slice_height = max(height_of(lines[:count]) for lines, count in zip(remaining, taken)) + 2 * CELL_PADDING
+            cell_texts = []
+            for (left, right, _), lines, count in zip(cells, remaining, taken):
+                y = self._y + CELL_PADDING
+                for line in lines[:count]:
+                    self._page.lines.append((left + CELL_PADDING, y, line))
+                    y += line.height
+                self._page.rules.append((left, self._y, right, self._y + slice_height))
+                cell_texts.append(' '.join(line.text for line in lines[:count]))
+            self._page.text_lines.append(' | '.join(cell_texts))
+            self._y += slice_height
+
+            remaining = [lines[count:] for lines, count in zip(remaining, taken)]
+            if not any(remaining):
+                return
+            self._new_page()
+
+
+def layout_docx(docx_path: str, title: Optional[str] = None) -> List[LayoutPage]:
+    """Open a .docx file and lay it out into pages; raises if python-docx cannot read it."""
+    from docx import Document
+
+    pages = DocxLayout(Document(docx_path), title).pages
+    # A page break at the very end leaves an empty page behind
+    while len(pages) > 1 and not pages[-1].lines and not pages[-1].rules:
+        pages.pop()
+    return pages
+
+
+class LayoutCanvas:
+    """A single page-sized image that layout pages are drawn on in turn."""
+
+    def __init__(self, mode: str):
+        self.image = Image.new(mode, (PAGE_WIDTH, PAGE_HEIGHT), color=255)
+        self.draw = ImageDraw.Draw(self.image)
+
+    def render(self, page: LayoutPage) -> Image.Image:
+        self.image.paste(255, (0, 0, PAGE_WIDTH, PAGE_HEIGHT))
+
+        for x, y, line in page.lines:
+            baseline = y + line.ascent
+            for offset, word, style in line.words:
+                mask, left, top, _ = get_word_mask(word, style.size, style.bold)
+                self.image.paste(0, (x + offset + left, baseline - font_ascent(style) + top), mask)
+
+        for box in page.rules:
+            self.draw.rectangle(box, outline=0, width=RULE_WIDTH)
+
+        return self.image
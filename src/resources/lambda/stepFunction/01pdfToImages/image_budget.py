@@ -0,0 +1,104 @@
+import math
+from typing import List, Tuple, Union
+
+from PIL import Image
+
+from page_filter import image_signature
+
+# Qwen2.5-VL splits images into 14 px patches and merges 2x2 of them into one token,
+# so every started 28x28 block of the image costs one token
+VISION_PATCH_SIZE = 28
+
+# Tiles overlap by this many patches so a line cut by a tile edge is whole in one of them
+TILE_OVERLAP_PATCHES = 2
+
+# Smallest budget accepted; below it tiles would be thinner than their own overlap
+MIN_TOKEN_BUDGET = 64
+
+# A page is tiled rather than downscaled when fitting the budget would shrink it below this
+# factor and at least this fraction of it is ink (a dense page, where detail would be lost)
+TILE_MAX_SCALE = 0.75
+TILE_MIN_INK_RATIO = 0.02
+
+TileBox = Tuple[int, int, int, int]
+# An encoded page, or its (tile box, encoded tile) pairs when it was tiled
+EncodedPage = Union[bytes, List[Tuple[TileBox, bytes]]]
+
+
+def image_tokens(width: int, height: int) -> int:
+    """Vision tokens the model spends on an image of this size."""
+    return math.ceil(width / VISION_PATCH_SIZE) * math.ceil(height / VISION_PATCH_SIZE)
+
+
+def tokens_for_pixels(pixels: int) -> int:
+    return max(1, pixels // (VISION_PATCH_SIZE * VISION_PATCH_SIZE))
+
+
+def budget_scale(width: int, height: int, max_tokens: int) -> float:
+    """The factor a page has to shrink by to cost at most `max_tokens` (1.0 when it already does)."""
+    if image_tokens(width, height) <= max_tokens:
+        return 1.0
+    return math.sqrt(max_tokens * VISION_PATCH_SIZE * VISION_PATCH_SIZE / (width * height))
+
+
+def fit_to_token_budget(image: Image.Image, max_tokens: int) -> Image.Image:
+    """Downscale to the largest size that costs at most `max_tokens`, keeping the aspect ratio.
+
+    Sides are rounded down to whole patches, so the model does not resize the image again.
+    Returns the input image when it already fits.
+    """
+    scale = budget_scale(image.width, image.height, max_tokens)
+    if scale >= 1.0:
+        return image
+
+    width = max(1, int(image.width * scale) // VISION_PATCH_SIZE) * VISION_PATCH_SIZE
+    height = max(1, int(image.height * scale) // VISION_PATCH_SIZE) * VISION_PATCH_SIZE
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def is_dense_page(image: Image.Image, max_tokens: int) -> bool:
+    """Whether a page should be tiled: it has to shrink a lot to fit the budget and carries a lot of ink."""
+    if budget_scale(image.width, image.height, max_tokens) >= TILE_MAX_SCALE:
+        return False
+    return image_signature(image).ink_ratio >= TILE_MIN_INK_RATIO
+
+
+def plan_tiles(width: int, height: int, max_tokens: int, overlap: int = TILE_OVERLAP_PATCHES) -> List[TileBox]:
+    """Cover a page with overlapping (left, top, right, bottom) tiles costing at most `max_tokens` each.
+
+    Tiles are whole patches (except where the page itself ends), so each one's token cost
+    is known exactly. Full-width horizontal strips are preferred, as they keep lines of text
+    whole; columns are only added when a full-width strip would be under 2 * overlap tall.
+    """
+    if max_tokens < MIN_TOKEN_BUDGET:
+        raise ValueError(f"Token budget {max_tokens} is below the minimum of {MIN_TOKEN_BUDGET}")
+
+    # Plan in patches, then convert back to pixels
+    page_columns = math.ceil(width / VISION_PATCH_SIZE)
+    page_rows = math.ceil(height / VISION_PATCH_SIZE)
+
+    columns = 1
+    while True:
+        tile_columns = math.ceil((page_columns + (columns - 1) * overlap) / columns)
+        max_tile_rows = max_tokens // tile_columns
+        if max_tile_rows >= 2 * overlap or tile_columns <= overlap + 1:
+            break
+        columns += 1
+
+    rows = 1 if max_tile_rows >= page_rows else math.ceil((page_rows - overlap) / (max_tile_rows - overlap))
+    # Spread the page evenly over the rows instead of leaving a thin last strip
+    tile_rows = math.ceil((page_rows + (rows - 1) * overlap) / rows)
+
+    tile_width = min(width, tile_columns * VISION_PATCH_SIZE)
+    tile_height = min(height, tile_rows * VISION_PATCH_SIZE)
+    step_x = (tile_columns - overlap) * VISION_PATCH_SIZE
+    step_y = (tile_rows - overlap) * VISION_PATCH_SIZE
+
+    tiles = []
+    for row in range(rows):
+        # The last row and column are moved back inside the page rather than cut short
+        top = min(row * step_y, height - tile_height)
+        for column in range(columns):
+            left = min(column * step_x, width - tile_width)
+            tiles.append((left, top, left + tile_width, top + tile_height))
+    return tiles
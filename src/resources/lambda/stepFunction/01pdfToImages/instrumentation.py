@@ -0,0 +1,146 @@
+import os
+import resource
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+from aws_lambda_powertools import Metrics, Tracer
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit
+
+SERVICE_NAME = "FILE_DB_REPRESENTATION"
+
+METRICS_NAMESPACE = os.environ.get('POWERTOOLS_METRICS_NAMESPACE', 'DocumentProcessor')
+
+# Invocation-level counts, flushed by the handler's log_metrics decorator
+metrics = Metrics(namespace=METRICS_NAMESPACE, service=SERVICE_NAME)
+# Tracing is a no-op outside Lambda, so tests and local runs need no X-Ray daemon
+tracer = Tracer(service=SERVICE_NAME)
+
+T = TypeVar('T')
+
+# Stages recorded once per page; their individual timings are published so CloudWatch can report percentiles
+PAGE_STAGES = ('Render', 'Encode', 'Filter', 'Upload')
+
+
+class StageTimings:
+    """Per-document timings and counters, safe to record from upload and download threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.durations: Dict[str, List[float]] = defaultdict(list)
+            self.counters: Dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def count(self, counter: str, value: int) -> None:
+        with self._lock:
+            self.counters[counter] += value
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timed_iter(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield from `items`, recording the time spent producing each item (e.g. rasterizing a page)."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(stage, time.perf_counter() - start)
+            yield item
+
+    def record_upload(self, size: int, seconds: float) -> None:
+        """PageUploader callback: per-page put_object time and bytes."""
+        self.record('Upload', seconds)
+        self.count('bytesUploaded', size)
+
+    def snapshot(self) -> Tuple[Dict[str, List[float]], Dict[str, int]]:
+        """Copies of the recorded durations (seconds) and counters."""
+        with self._lock:
+            return {stage: list(values) for stage, values in self.durations.items()}, dict(self.counters)
+
+    def summary(self) -> Dict[str, float]:
+        """Total milliseconds per stage plus counters, for logs and local profiling."""
+        durations, counters = self.snapshot()
+        return {
+            **{f"{stage[0].lower()}{stage[1:]}Ms": round(sum(values) * 1000, 1) for stage, values in durations.items()},
+            **counters,
+        }
+
+
+# Single-document invocations reset and reuse this instance; batch workers each install their own
+stage_timings = StageTimings()
+_current_stage_timings: ContextVar[StageTimings] = ContextVar('stage_timings', default=stage_timings)
+
+
+def current_stage_timings() -> StageTimings:
+    """The timings of the document being converted by the calling thread."""
+    return _current_stage_timings.get()
+
+
+@contextmanager
+def document_stage_timings() -> Iterator[StageTimings]:
+    """Record stages on a fresh StageTimings for the duration of one document in this thread."""
+    timings = StageTimings()
+    token = _current_stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_stage_timings.reset(token)
+
+
+def peak_rss_mb() -> Tuple[float, float]:
+    """Peak resident memory of this process and of its largest child (poppler), in MB.
+
+    Both are high-water marks for the lifetime of the container, not just this request.
+    """
+    # ru_maxrss is reported in kilobytes on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def publish_document_metrics(file_type: str, pages: int) -> None:
+    """Emit this document's stage timings, upload volume, memory and page count as one EMF record.
+
+    Each document gets its own metric set, so documents of different types converted in
+    the same batch invocation keep separate FileType dimensions.
+    """
+    document_metrics = EphemeralMetrics(namespace=METRICS_NAMESPACE, service=SERVICE_NAME)
+    document_metrics.add_dimension('FileType', file_type.lstrip('.') or 'unknown')
+    document_metrics.add_metric(name='Pages', unit=MetricUnit.Count, value=pages)
+
+    durations, counters = current_stage_timings().snapshot()
+
+    for stage, values in durations.items():
+        document_metrics.add_metric(name=f'{stage}Time', unit=MetricUnit.Milliseconds, value=round(sum(values) * 1000, 3))
+        if stage in PAGE_STAGES:
+            for value in values:
+                document_metrics.add_metric(name=f'Page{stage}Time', unit=MetricUnit.Milliseconds, value=round(value * 1000, 3))
+
+    document_metrics.add_metric(name='BytesUploaded', unit=MetricUnit.Bytes, value=counters.get('bytesUploaded', 0))
+    document_metrics.add_metric(name='BytesDownloaded', unit=MetricUnit.Bytes, value=counters.get('bytesDownloaded', 0))
+    document_metrics.add_metric(name='ResumedPages', unit=MetricUnit.Count, value=counters.get('pagesResumed', 0))
+    document_metrics.add_metric(name='SkippedPages', unit=MetricUnit.Count, value=counters.get('pagesSkipped', 0))
+
+    own_rss, child_rss = peak_rss_mb()
+    document_metrics.add_metric(name='PeakRss', unit=MetricUnit.Megabytes, value=round(own_rss, 1))
+    document_metrics.add_metric(name='PopplerPeakRss', unit=MetricUnit.Megabytes, value=round(child_rss, 1))
+
+    document_metrics.flush_metrics()
@@ -1,51 +1,321 @@
 import os
 import json
-from typing import Dict, Any, List, Optional
-import boto3
-from pdf2image import convert_from_bytes
-from io import BytesIO
+from typing import Collection, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import asdict, replace
 from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
 import subprocess
-from PIL import Image, ImageDraw, ImageFont
-import mammoth
-import markdown
-import textwrap
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from PIL import Image
 import urllib.parse
+from aws_lambda_powertools.metrics import MetricUnit
+from instrumentation import metrics, tracer, current_stage_timings, document_stage_timings, publish_document_metrics
+from page_uploader import PageUploader
+from process_pool import imap_ordered, resolve_workers
+import render_cache
+from progress_manifest import ProgressManifest, compute_fingerprint, load_progress, manifest_key
+from page_filter import PageFilter
+from page_derivatives import DERIVATIVE_CONTENT_TYPES, DerivativeIndex, DerivedPage, encode_original, get_derivative_key, get_index_key, load_index, make_thumbnail, merge_indexes, parse_derivatives, save_index
+from image_budget import MIN_TOKEN_BUDGET, EncodedPage, fit_to_token_budget, is_dense_page, plan_tiles, tokens_for_pixels
+from s3_io import create_s3_client
+from source_download import downloaded_source
+from render_profiles import RenderProfile, CONTENT_TYPES, encode_image, fit_to_profile, get_render_profile
+from text_renderer import PAGE_WIDTH, PAGE_HEIGHT, MARGIN, FONT_SIZE, MAX_CHARS_PER_LINE, get_font, get_word_mask, iter_canvas_pages, iter_text_pages, paginate_text
+from docx_renderer import LayoutCanvas, LayoutPage, layout_docx
+from text_extraction import extract_pdf_page_texts, has_usable_text_layer, paginate_plain_text
 
 logger = Logger(service="FILE_DB_REPRESENTATION")
 
 REGION = os.environ.get('REGION', 'eu-central-1')
 
-s3_client = boto3.client('s3')
+# Page uploads run on thread pools that share this client, so its connection pool is sized to match
+UPLOAD_CONCURRENCY = max(1, int(os.environ.get('UPLOAD_CONCURRENCY', '8')))
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.environ.get('UPLOAD_MAX_INFLIGHT_MB', '64')) * 1024 * 1024
+# Pages larger than this are sent as multipart uploads of slices of the encoded page
+UPLOAD_MULTIPART_THRESHOLD_BYTES = int(os.environ.get('UPLOAD_MULTIPART_THRESHOLD_MB', '16')) * 1024 * 1024
 
-os.environ['PATH'] = f"/usr/bin:{os.environ.get('PATH', '')}"
+# Batch events convert this many documents at once, each with its own upload pool
+BATCH_CONCURRENCY = max(1, int(os.environ.get('BATCH_CONCURRENCY', '4')))
+
+# Requests in flight at once across every pool and batch document, to stay under S3's per-prefix request rate
+S3_MAX_CONCURRENCY = max(1, int(os.environ.get('S3_MAX_CONCURRENCY', str(UPLOAD_CONCURRENCY * BATCH_CONCURRENCY))))
+# Attempts per request, including throttled (SlowDown) and transient failures, with exponential backoff
+S3_MAX_ATTEMPTS = max(1, int(os.environ.get('S3_MAX_ATTEMPTS', '5')))
 
-# Constants for text rendering
-PAGE_WIDTH = 2480  # A4 at 300 DPI
-PAGE_HEIGHT = 3508
-MARGIN = 200
-FONT_SIZE = 36
-LINE_HEIGHT = int(FONT_SIZE * 1.5)
-MAX_CHARS_PER_LINE = 80
+s3_client = create_s3_client(UPLOAD_CONCURRENCY * BATCH_CONCURRENCY, S3_MAX_CONCURRENCY, S3_MAX_ATTEMPTS)
 
-def process_page(image, bucket, output_key: str, format: str) -> None:
-    """Process a single page and upload to S3."""
+os.environ['PATH'] = f"/usr/bin:{os.environ.get('PATH', '')}"
+
+# Pages are rasterized and encoded in this many forked processes ('auto': one per vCPU);
+# 1 keeps everything in the main interpreter
+TEXT_RENDER_WORKERS = resolve_workers(os.environ.get('TEXT_RENDER_WORKERS', 'auto'))
+PDF_RENDER_WORKERS = resolve_workers(os.environ.get('PDF_RENDER_WORKERS', 'auto'))
+
+# Constants for PDF rendering
+POPPLER_PATH = "/opt/poppler/bin"
+# Number of pages rasterized per poppler call; bounds peak memory regardless of document length
+PDF_RENDER_WINDOW = max(1, int(os.environ.get('PDF_RENDER_WINDOW', '4')))
+# Number of pages rendered by each invocation when the state machine fans a PDF out into shards
+PDF_SHARD_PAGES = max(1, int(os.environ.get('PDF_SHARD_PAGES', '50')))
+
+# Identical re-uploads reuse previously rendered pages, located through manifests under this prefix
+RENDER_CACHE_ENABLED = os.environ.get('RENDER_CACHE_ENABLED', 'true').lower() == 'true'
+RENDER_CACHE_PREFIX = os.environ.get('RENDER_CACHE_PREFIX', 'render-cache')
+
+# Uploaded pages are checkpointed per fileId under this prefix, so a retried conversion resumes where it stopped
+PROGRESS_MANIFEST_ENABLED = os.environ.get('PROGRESS_MANIFEST_ENABLED', 'true').lower() == 'true'
+PROGRESS_PREFIX = os.environ.get('PROGRESS_PREFIX', 'progress')
+PROGRESS_CHECKPOINT_PAGES = max(1, int(os.environ.get('PROGRESS_CHECKPOINT_PAGES', '10')))
+
+# Render profile used when the event does not name one (see render_profiles.RENDER_PROFILES)
+DEFAULT_RENDER_PROFILE = os.environ.get('RENDER_PROFILE', 'standard')
+
+# Source documents are streamed to /tmp in ranged chunks; anything over the cap is rejected before download
+MAX_SOURCE_BYTES = int(os.environ.get('MAX_SOURCE_MB', '400')) * 1024 * 1024
+SOURCE_CHUNK_BYTES = int(os.environ.get('SOURCE_CHUNK_MB', '8')) * 1024 * 1024
+
+SUPPORTED_FILE_EXTENSIONS = ['.pdf', '.doc', '.docx', '.txt', '.md']
+
+# images: every page as an image (default)
+# text: machine-readable pages as text items; only PDF pages without a usable text layer are rendered
+# hybrid: every page as an image, with a textKey on pages whose text could be extracted
+OUTPUT_MODES = ['images', 'text', 'hybrid']
+DEFAULT_OUTPUT_MODE = os.environ.get('OUTPUT_MODE', 'images')
+
+# Vision-token budget per image, unless the event sets maxImageTokens or maxImagePixels; unset keeps pages at full size
+DEFAULT_IMAGE_TOKEN_BUDGET = os.environ.get('IMAGE_TOKEN_BUDGET')
+# Split dense pages into overlapping tiles within the budget instead of downscaling them
+DEFAULT_TILE_DENSE_PAGES = os.environ.get('TILE_DENSE_PAGES', 'false').lower() == 'true'
+
+# layout: DOCX paragraphs and tables are laid out with python-docx, keeping table grids
+# text: DOCX is flattened to plain text through mammoth and rendered like a .txt file
+DOCX_RENDERER = os.environ.get('DOCX_RENDERER', 'layout')
+
+# Near-blank and repeated pages are flagged or dropped before they reach extraction (see page_filter.PAGE_FILTER_MODES)
+DEFAULT_PAGE_FILTER = os.environ.get('PAGE_FILTER', 'off')
+
+# Derivatives listed in each document's page index besides the model-input page (see page_derivatives.DERIVATIVE_NAMES).
+# Conversions with derivatives bypass the render cache, so leave this unset until a consumer reads them
+DEFAULT_PAGE_DERIVATIVES = os.environ.get('PAGE_DERIVATIVES', '')
+# Longest side of a page thumbnail
+THUMBNAIL_MAX_PX = int(os.environ.get('THUMBNAIL_MAX_PX', '320'))
+# Resolution of originals rendered by the derive action, independent of the render profile
+ORIGINAL_DPI = int(os.environ.get('ORIGINAL_DPI', '300'))
+
+
+def fit_and_encode(image: Image.Image, profile: RenderProfile) -> EncodedPage:
+    """Fit a rendered page to the profile and encode it; safe to call in render worker processes.
+
+    With a token budget the page is downscaled to fit it, or, for dense pages when the
+    profile tiles them, encoded as a list of (tile box, encoded tile) pairs instead. When
+    the profile has a thumbnail size, the result is a DerivedPage carrying the thumbnail too.
+    """
+    fitted = fit_to_profile(image, profile)
+    budget = profile.max_image_tokens
+    if budget and profile.tile_dense_pages and is_dense_page(fitted, budget):
+        encoded = [(box, encode_image(fitted.crop(box), profile)) for box in plan_tiles(fitted.width, fitted.height, budget)]
+    else:
+        budgeted = fit_to_token_budget(fitted, budget) if budget else fitted
+        encoded = encode_image(budgeted, profile)
+        if budgeted is not fitted:
+            budgeted.close()
+
+    if fitted is not image:
+        fitted.close()
+    if profile.thumbnail_size:
+        # From the rendered page rather than the fitted one, which may be bilevel or budget-scaled
+        return DerivedPage(encoded, *make_thumbnail(image, profile.thumbnail_size))
+    return encoded
+
+
+@tracer.capture_method(capture_response=False)
+def process_page(image, profile: RenderProfile) -> EncodedPage:
+    """Fit a single page to the render profile and encode it in this process."""
     try:
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format=format, quality=100)
-        img_byte_arr = img_byte_arr.getvalue()
-
-        s3_client.put_object(
-            Bucket=bucket,
-            Key=output_key,
-            Body=img_byte_arr,
-            ContentType=f'image/{format}'
-        )
+        with current_stage_timings().stage('Encode'):
+            return fit_and_encode(image, profile)
     except Exception as e:
         logger.error(f"Error processing page: {e}")
         raise
 
 
+def encode_pages(pages: Iterable[Tuple[int, Image.Image]], profile: RenderProfile) -> Iterator[Tuple[int, EncodedPage]]:
+    """Encode (page_number, image) pairs in this process."""
+    # Time spent waiting on the page iterator is rasterization (poppler or the text renderer)
+    for page, image in current_stage_timings().timed_iter('Render', pages):
+        yield page, process_page(image, profile)
+
+
+def get_render_workers(configured: int) -> int:
+    """Render worker processes to use for the current document."""
+    if threading.current_thread() is not threading.main_thread():
+        # Batch documents already run in parallel, and forking while sibling threads hold locks is unsafe
+        return 1
+    return configured
+
+
+def get_output_key(key_info: Dict[str, str], page: int) -> str:
+    filename = key_info.get('filename', 'image')
+    outputPrefix = key_info.get('outputPrefix', '')
+    format = key_info.get('format', 'jpeg')
+    return f"{outputPrefix}/{filename}-{page}.{format}"
+
+
+def upload_pages(pages: Iterable[Tuple[int, EncodedPage]], page_count: int, key_info: Dict[str, str], fileId: str, bucket: str, profile: RenderProfile, label: str, progress: Optional[ProgressManifest] = None, page_filter: Optional[PageFilter] = None, derivatives: Optional[DerivativeIndex] = None) -> List[Dict[str, Any]]:
+    """Upload encoded (page_number, bytes) pairs, overlapping uploads with rendering of the next pages.
+
+    With `progress`, every uploaded page is checkpointed, and the pages it already held
+    (skipped by the caller) are returned alongside the new ones. With `page_filter`,
+    blank and repeated pages are marked on their items or, in drop mode, left out.
+    Tiled pages become one item per tile; they are not checkpointed or filtered.
+    Thumbnails of DerivedPage bodies are uploaded next to their page and recorded
+    in `derivatives`, without becoming items.
+    """
+    output_keys = []
+    # Whether each submitted upload is a page item, as opposed to a thumbnail
+    submitted_items = []
+    filename = key_info.get('filename', 'image')
+    content_type = CONTENT_TYPES.get(profile.format, f'image/{profile.format}')
+
+    # Uploads finish on pool threads, so the callback is bound to this document's timings up front
+    try:
+        with PageUploader(s3_client, UPLOAD_CONCURRENCY, UPLOAD_MAX_INFLIGHT_BYTES, current_stage_timings().record_upload, UPLOAD_MULTIPART_THRESHOLD_BYTES) as uploader:
+            for page, body in pages:
+                thumbnail = None
+                if isinstance(body, DerivedPage):
+                    body, thumbnail = body.model, body
+
+                if isinstance(body, list):
+                    tiles = submit_tiles(uploader, page, body, key_info, fileId, bucket, content_type)
+                    output_keys.extend(tiles)
+                    submitted_items.extend([True] * len(tiles))
+                    if thumbnail is not None:
+                        submit_thumbnail(uploader, page, thumbnail, key_info, bucket, derivatives)
+                        submitted_items.append(False)
+                    logger.info(f"Processed {label} page {page}/{page_count} as {len(body)} tiles")
+                    continue
+
+                skipped = None
+                if page_filter is not None and page_filter.enabled:
+                    with current_stage_timings().stage('Filter'):
+                        skipped = page_filter.check(page, body)
+                    if skipped and page_filter.drops_pages:
+                        logger.info(f"Dropped {skipped['reason']} {label} page {page}/{page_count}")
+                        continue
+
+                output_key = get_output_key(key_info, page)
+                on_done = None
+                if progress is not None:
+                    on_done = lambda response, page=page, key=output_key, size=len(body): progress.record(page, key, size, response.get('ETag'))
+                uploader.submit(bucket, output_key, body, content_type, on_done)
+                output_keys.append({ 'key': output_key, 'page': page, 'filename': filename, 'fileId': fileId })
+                submitted_items.append(True)
+                if skipped:
+                    output_keys[-1]['skipped'] = skipped['reason']
+                if derivatives is not None:
+                    derivatives.add_model(page, len(body))
+                if thumbnail is not None:
+                    submit_thumbnail(uploader, page, thumbnail, key_info, bucket, derivatives)
+                    submitted_items.append(False)
+                logger.info(f"Processed {label} page {page}/{page_count}")
+
+            # Surface the first failed upload (in page order) before reporting any items
+            responses = [response for response, is_item in zip(uploader.wait(), submitted_items) if is_item]
+    finally:
+        if progress is not None:
+            # Also after a failure, so the retry skips every page that did land
+            progress.save()
+
+    if progress is not None:
+        uploaded = {item['page'] for item in output_keys}
+        resumed = [
+            ({ 'key': entry['key'], 'page': page, 'filename': filename, 'fileId': fileId }, { 'ETag': entry['etag'] })
+            for page, entry in progress.completed_pages.items()
+            if page not in uploaded
+        ]
+        if resumed:
+            pairs = sorted(resumed + list(zip(output_keys, responses)), key=lambda pair: pair[0]['page'])
+            output_keys, responses = [item for item, _ in pairs], [response for _, response in pairs]
+
+    if key_info.get('cacheKey'):
+        skipped_pages = page_filter.skipped_pages if page_filter is not None else None
+        render_cache.save_manifest(s3_client, bucket, RENDER_CACHE_PREFIX, key_info['cacheKey'], output_keys, responses, skipped_pages)
+
+    return output_keys
+
+
+def submit_thumbnail(uploader: PageUploader, page: int, derived: DerivedPage, key_info: Dict[str, str], bucket: str, derivatives: Optional[DerivativeIndex]) -> None:
+    """Queue the thumbnail rendered with a page and record it in the page index."""
+    thumbnail_key = get_derivative_key(key_info, page, 'thumbnail')
+    uploader.submit(bucket, thumbnail_key, derived.thumbnail, DERIVATIVE_CONTENT_TYPES['thumbnail'])
+    if derivatives is not None:
+        derivatives.add_thumbnail(page, thumbnail_key, derived.thumbnail_size, len(derived.thumbnail))
+
+
+def get_tile_key(key_info: Dict[str, str], page: int, tile: int) -> str:
+    filename = key_info.get('filename', 'image')
+    outputPrefix = key_info.get('outputPrefix', '')
+    format = key_info.get('format', 'jpeg')
+    return f"{outputPrefix}/{filename}-{page}-tile-{tile}.{format}"
+
+
+def submit_tiles(uploader: PageUploader, page: int, tiles: List[Tuple[Tuple[int, int, int, int], bytes]], key_info: Dict[str, str], fileId: str, bucket: str, content_type: str) -> List[Dict[str, Any]]:
+    """Queue the tiles of one page and return an item per tile, carrying its position on the page."""
+    filename = key_info.get('filename', 'image')
+    items = []
+    for index, ((left, top, right, bottom), body) in enumerate(tiles, start=1):
+        output_key = get_tile_key(key_info, page, index)
+        uploader.submit(bucket, output_key, body, content_type)
+        items.append({
+            'key': output_key,
+            'page': page,
+            'filename': filename,
+            'fileId': fileId,
+            'tile': { 'index': index, 'count': len(tiles), 'left': left, 'top': top, 'width': right - left, 'height': bottom - top },
+        })
+    return items
+
+
+def get_text_key(key_info: Dict[str, str], page: int) -> str:
+    filename = key_info.get('filename', 'image')
+    outputPrefix = key_info.get('outputPrefix', '')
+    return f"{outputPrefix}/{filename}-{page}.txt"
+
+
+def upload_text_pages(page_texts: Dict[int, str], key_info: Dict[str, str], fileId: str, bucket: str) -> List[Dict[str, Any]]:
+    """Upload per-page text chunks and return them as text items in page order."""
+    output_keys = []
+    filename = key_info.get('filename', 'image')
+
+    with PageUploader(s3_client, UPLOAD_CONCURRENCY, UPLOAD_MAX_INFLIGHT_BYTES, current_stage_timings().record_upload) as uploader:
+        for page in sorted(page_texts):
+            output_key = get_text_key(key_info, page)
+            uploader.submit(bucket, output_key, page_texts[page].encode('utf-8'), 'text/plain; charset=utf-8')
+            output_keys.append({ 'key': output_key, 'page': page, 'filename': filename, 'fileId': fileId, 'contentType': 'text' })
+
+        uploader.wait()
+
+    logger.info(f"Uploaded text for {len(output_keys)} pages")
+    return output_keys
+
+
+def combine_page_items(image_items: List[Dict[str, Any]], text_items: List[Dict[str, Any]], output_mode: str) -> List[Dict[str, Any]]:
+    """Merge image and text items into one item per page for the extraction Map state."""
+    if output_mode == 'hybrid':
+        text_keys = {item['page']: item['key'] for item in text_items}
+        return [
+            { **item, 'textKey': text_keys[item['page']] } if item['page'] in text_keys else item
+            for item in image_items
+        ]
+
+    return sorted(image_items + text_items, key=lambda item: item['page'])
+
+
 def get_lambda_response(body: Dict[str, Any] = None, status_code: int = 200):
     return {
         'statusCode': status_code,
@@ -77,86 +347,66 @@ def parse_s3_key(s3_path: str, output_prefix: str, format: str) -> dict:
         raise ValueError(f"Failed to parse S3 key: {s3_path}") from e
 
 
-def verify_poppler():
+@lru_cache(maxsize=1)
+def verify_poppler() -> bool:
+    """Check once per container that the poppler binaries are present and runnable."""
     try:
         logger.info("Verifying poppler installation...")
-        # Check binary location
-        result = subprocess.run(['ls', '-l', '/opt/poppler/bin'], capture_output=True, text=True)
-        logger.info(f"Checking /opt/poppler/bin contents: {result.stdout}")
-
-        # Try running pdftoppm
-        result = subprocess.run(['/opt/poppler/bin/pdftoppm', '-v'], capture_output=True, text=True)
-        logger.info(f"Testing pdftoppm: {result.stderr}")
+        for binary in ('pdftoppm', 'pdfinfo'):
+            binary_path = os.path.join(POPPLER_PATH, binary)
+            if not os.access(binary_path, os.X_OK):
+                raise FileNotFoundError(f"{binary_path} is missing or not executable")
+
+        # Running pdftoppm once also pulls the binary and its libraries into the page cache
+        result = subprocess.run([os.path.join(POPPLER_PATH, 'pdftoppm'), '-v'], capture_output=True, text=True, check=True)
+        logger.info(f"Testing pdftoppm: {result.stderr.strip()}")
         return True
     except Exception as e:
         logger.error(f"Poppler verification failed: {e}")
         return False
 
 
-def text_to_image(text: str, title: Optional[str] = None) -> List[Image.Image]:
-    """Convert text content to a list of PIL Image objects."""
-    try:
-        # Try to use a standard font
-        font = ImageFont.truetype("DejaVuSans.ttf", FONT_SIZE)
-    except IOError:
-        # Fallback to default
-        font = ImageFont.load_default()
-
-    # Preprocess the text (wrap lines to fit page width)
-    wrapped_lines = []
-    for line in text.split('\n'):
-        if line.strip() == '':
-            wrapped_lines.append('')  # Preserve empty lines
-        else:
-            wrapped_lines.extend(textwrap.wrap(line, width=MAX_CHARS_PER_LINE))
-
-    # Calculate how many lines fit on one page
-    lines_per_page = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
-    if title:
-        lines_per_page -= 2  # Reserve space for title and a blank line
-
-    # Split text into pages
-    pages = []
-    current_page_lines = []
+@tracer.capture_method(capture_response=False)
+def render_text_pages(text: str, title: str, profile: RenderProfile, skip_pages: Collection[int] = ()) -> Tuple[Iterable[Tuple[int, EncodedPage]], int]:
+    """Paginate text and return a lazy (page_number, encoded bytes) iterator together with the page count.
 
-    for line in wrapped_lines:
-        if len(current_page_lines) >= lines_per_page:
-            # Current page is full, start a new one
-            pages.append(current_page_lines)
-            current_page_lines = []
-        current_page_lines.append(line)
+    Pages in `skip_pages` are counted but not rendered.
+    """
+    pages = paginate_text(text, title)
+    page_numbers = [page for page in range(1, len(pages) + 1) if page not in skip_pages]
+    mode = '1' if profile.color_mode == '1' else 'L'
 
-    # Add the last page if it has content
-    if current_page_lines:
-        pages.append(current_page_lines)
+    workers = get_render_workers(TEXT_RENDER_WORKERS)
+    if workers > 1:
+        # Drawing and encoding both happen in the workers; only encoded buffers come back
+        encoded = iter_text_pages(pages, title, mode, workers, encode=lambda image: fit_and_encode(image, profile), page_numbers=page_numbers)
+        return current_stage_timings().timed_iter('Render', encoded), len(pages)
 
-    # Create images for each page
-    images = []
-    for page_lines in pages:
-        img = Image.new('RGB', (PAGE_WIDTH, PAGE_HEIGHT), color='white')
-        draw = ImageDraw.Draw(img)
+    return encode_pages(iter_text_pages(pages, title, mode, page_numbers=page_numbers), profile), len(pages)
 
-        y_position = MARGIN
 
-        # Add title if provided (only on the first page)
-        if title and pages.index(page_lines) == 0:
-            draw.text((MARGIN, y_position), title, font=font, fill='black')
-            y_position += LINE_HEIGHT * 2  # Move down after title + blank line
+def render_layout_pages(pages: List[LayoutPage], profile: RenderProfile, skip_pages: Collection[int] = ()) -> Iterable[Tuple[int, EncodedPage]]:
+    """Draw laid-out DOCX pages and return a lazy (page_number, encoded bytes) iterator; see render_text_pages."""
+    page_numbers = [page for page in range(1, len(pages) + 1) if page not in skip_pages]
+    mode = '1' if profile.color_mode == '1' else 'L'
+    draw = lambda canvas, index: canvas.render(pages[index])
 
-        # Add text lines
-        for line in page_lines:
-            draw.text((MARGIN, y_position), line, font=font, fill='black')
-            y_position += LINE_HEIGHT
+    workers = get_render_workers(TEXT_RENDER_WORKERS)
+    if workers > 1:
+        encoded = iter_canvas_pages(lambda: LayoutCanvas(mode), draw, len(pages), mode, workers, encode=lambda image: fit_and_encode(image, profile), page_numbers=page_numbers)
+        return current_stage_timings().timed_iter('Render', encoded)
 
-        images.append(img)
+    return encode_pages(iter_canvas_pages(lambda: LayoutCanvas(mode), draw, len(pages), mode, page_numbers=page_numbers), profile)
 
-    return images
 
+def convert_docx_to_html(docx_path: str) -> str:
+    """Convert a DOCX file to HTML using mammoth."""
+    # Imported on first use so PDF and text requests do not pay for it
+    import mammoth
 
-def convert_docx_to_html(docx_content: bytes) -> str:
-    """Convert DOCX content to HTML using mammoth."""
     try:
-        result = mammoth.convert_to_html(BytesIO(docx_content))
+        with open(docx_path, 'rb') as docx_file:
+            result = mammoth.convert_to_html(docx_file)
         return result.value
     except Exception as e:
         logger.error(f"Error converting DOCX to HTML: {e}")
@@ -186,99 +436,231 @@ def html_to_plain_text(html: str) -> str:
     return stripper.get_data()
 
 
-def process_pdf(pdf_content: bytes, key_info: Dict[str, str], fileId: str, bucket: str) -> List[str]:
-    """Process PDF file and return list of output S3 keys."""
-    logger.info("Processing PDF file...")
+def get_pdf_page_count(pdf_path: str) -> int:
+    """Return the number of pages in a PDF without rasterizing it."""
+    from PyPDF2 import PdfReader
 
-    images = convert_from_bytes(
-        pdf_content,
-        dpi=100,
-        fmt="jpeg",
-        thread_count=2,
-        poppler_path="/opt/poppler/bin"
+    try:
+        # Given a path, PyPDF2 reads the whole file into memory; a handle is read as needed
+        with open(pdf_path, 'rb') as pdf_file:
+            return len(PdfReader(pdf_file).pages)
+    except Exception as e:
+        # PyPDF2 is stricter than poppler about damaged files, so let poppler have the final word
+        logger.warning(f"PyPDF2 could not count pages, falling back to pdfinfo: {e}")
+        from pdf2image import pdfinfo_from_path
+
+        info = pdfinfo_from_path(pdf_path, poppler_path=POPPLER_PATH)
+        return int(info['Pages'])
+
+
+def group_page_ranges(page_numbers: Iterable[int], window: int) -> Iterable[Tuple[int, int]]:
+    """Group ascending page numbers into runs of consecutive pages no longer than `window`."""
+    run_start = run_end = None
+    for page in page_numbers:
+        if run_start is not None and page == run_end + 1 and page - run_start < window:
+            run_end = page
+            continue
+        if run_start is not None:
+            yield run_start, run_end
+        run_start = run_end = page
+
+    if run_start is not None:
+        yield run_start, run_end
+
+
+def iter_pdf_pages(pdf_path: str, page_numbers: Iterable[int], profile: RenderProfile, window: int = PDF_RENDER_WINDOW):
+    """Yield (page_number, image) pairs, rasterizing at most `window` pages at a time."""
+    from pdf2image import convert_from_path
+
+    for window_start, window_end in group_page_ranges(page_numbers, window):
+        images = convert_from_path(
+            pdf_path,
+            dpi=profile.dpi,
+            # Uncompressed output avoids a lossy poppler JPEG pass before the profile's own encode
+            fmt="ppm",
+            grayscale=profile.color_mode != 'RGB',
+            thread_count=2,
+            first_page=window_start,
+            last_page=window_end,
+            poppler_path=POPPLER_PATH
+        )
+
+        page_number = window_start
+        while images:
+            # Pop so the window list does not keep already uploaded pages alive
+            image = images.pop(0)
+            yield page_number, image
+            image.close()
+            page_number += 1
+
+
+@tracer.capture_method(capture_response=False)
+def render_pdf_window(pdf_path: str, first_page: int, last_page: int, profile: RenderProfile) -> List[Tuple[int, EncodedPage, float, float]]:
+    """Rasterize, fit and encode one page range in a render worker process.
+
+    Returns (page_number, encoded bytes, render seconds, encode seconds) per page, so
+    only encoded buffers cross the process boundary, never PIL images.
+    """
+    from pdf2image import convert_from_path
+
+    start = time.perf_counter()
+    images = convert_from_path(
+        pdf_path,
+        dpi=profile.dpi,
+        fmt="ppm",
+        grayscale=profile.color_mode != 'RGB',
+        # Parallelism comes from the worker processes, so each runs a single poppler
+        thread_count=1,
+        first_page=first_page,
+        last_page=last_page,
+        poppler_path=POPPLER_PATH
     )
+    render_seconds = (time.perf_counter() - start) / max(1, len(images))
 
-    logger.info(f"Extracted {len(images)} pages from PDF")
-    output_keys = []
-    filename = key_info.get('filename', 'image')
-    outputPrefix = key_info.get('outputPrefix', '')
-    format = key_info.get('format', 'jpeg')
+    encoded_pages = []
+    for offset, image in enumerate(images):
+        start = time.perf_counter()
+        body = fit_and_encode(image, profile)
+        image.close()
+        encoded_pages.append((first_page + offset, body, render_seconds, time.perf_counter() - start))
 
-    for i, image in enumerate(images):
-        output_key = f"{outputPrefix}/{filename}-{i + 1}.{format}"
-        process_page(image, bucket, output_key, format)
-        output_keys.append({ 'key': output_key, 'page': i + 1, 'filename': filename, 'fileId': fileId })
-        logger.info(f"Processed PDF page {i + 1}/{len(images)}")
+    return encoded_pages
+
+
+def iter_encoded_pdf_pages(pdf_path: str, page_numbers: List[int], profile: RenderProfile, workers: int) -> Iterator[Tuple[int, EncodedPage]]:
+    """Yield (page_number, encoded bytes) in page order, spreading page windows over `workers` processes."""
+    windows = list(group_page_ranges(page_numbers, PDF_RENDER_WINDOW))
+    if workers <= 1 or len(windows) <= 1:
+        yield from encode_pages(iter_pdf_pages(pdf_path, page_numbers, profile), profile)
+        return
+
+    timings = current_stage_timings()
+    def render_window(window: Tuple[int, int]) -> List[Tuple[int, EncodedPage, float, float]]:
+        return render_pdf_window(pdf_path, window[0], window[1], profile)
+
+    for encoded_pages in imap_ordered(render_window, windows, workers):
+        for page, body, render_seconds, encode_seconds in encoded_pages:
+            # Worker times overlap, so stage totals can exceed wall-clock time
+            timings.record('Render', render_seconds)
+            timings.record('Encode', encode_seconds)
+            yield page, body
+
+
+@tracer.capture_method(capture_response=False)
+def process_pdf(pdf_path: str, key_info: Dict[str, str], fileId: str, bucket: str, profile: RenderProfile, page_start: Optional[int] = None, page_end: Optional[int] = None, output_mode: str = 'images', progress: Optional[ProgressManifest] = None, page_filter: Optional[PageFilter] = None, derivatives: Optional[DerivativeIndex] = None) -> List[str]:
+    """Process PDF file (or the page_start..page_end shard of it) and return list of output S3 keys."""
+    logger.info("Processing PDF file...")
+
+    page_count = get_pdf_page_count(pdf_path)
+    first_page = max(1, page_start or 1)
+    last_page = min(page_count, page_end or page_count)
+    page_numbers = list(range(first_page, last_page + 1))
+
+    page_texts = {}
+    if output_mode != 'images':
+        extracted = extract_pdf_page_texts(pdf_path, page_numbers)
+        page_texts = {page: text for page, text in extracted.items() if has_usable_text_layer(text)}
+        logger.info(f"{len(page_texts)} of {len(page_numbers)} PDF pages have a usable text layer")
+
+    if output_mode == 'text':
+        # Only pages without a usable text layer still need OCR by the vision model
+        page_numbers = [page for page in page_numbers if page not in page_texts]
+
+    if progress is not None:
+        # Pages uploaded by an earlier attempt are taken from the progress manifest instead
+        page_numbers = [page for page in page_numbers if page not in progress.completed_pages]
+
+    workers = get_render_workers(PDF_RENDER_WORKERS)
+    logger.info(f"Rendering {len(page_numbers)} pages between {first_page}-{last_page} of {page_count} from PDF in windows of {PDF_RENDER_WINDOW} on {workers} workers")
+
+    pages = iter_encoded_pdf_pages(pdf_path, page_numbers, profile, workers)
+    image_items = upload_pages(pages, page_count, key_info, fileId, bucket, profile, 'PDF', progress, page_filter, derivatives)
+
+    text_items = upload_text_pages(page_texts, key_info, fileId, bucket)
+    return combine_page_items(image_items, text_items, output_mode)
 
-    return output_keys
 
+@tracer.capture_method(capture_response=False)
+def process_text_content(text: str, key_info: Dict[str, str], fileId: str, bucket: str, profile: RenderProfile, output_mode: str, label: str, progress: Optional[ProgressManifest] = None, page_filter: Optional[PageFilter] = None, derivatives: Optional[DerivativeIndex] = None) -> List[str]:
+    """Render and/or upload already machine-readable text, depending on the output mode."""
+    # Get the title from the filename
+    title = os.path.splitext(key_info['filename'])[0]
 
-def process_docx(docx_content: bytes, key_info: Dict[str, str], fileId: str, bucket: str) -> List[str]:
+    text_items = []
+    if output_mode != 'images':
+        # Pages are chunked exactly like the rendered pages, so page numbers agree across modes
+        page_texts = dict(enumerate(paginate_plain_text(text, title), start=1))
+        text_items = upload_text_pages(page_texts, key_info, fileId, bucket)
+        if output_mode == 'text':
+            return text_items
+
+    # Convert text to images
+    pages, page_count = render_text_pages(text, title, profile, progress.completed_pages if progress else ())
+
+    logger.info(f"Rendering {page_count} pages from {label}")
+    image_items = upload_pages(pages, page_count, key_info, fileId, bucket, profile, label, progress, page_filter, derivatives)
+    return combine_page_items(image_items, text_items, output_mode)
+
+
+def process_docx_layout(pages: List[LayoutPage], key_info: Dict[str, str], fileId: str, bucket: str, profile: RenderProfile, output_mode: str, progress: Optional[ProgressManifest] = None, page_filter: Optional[PageFilter] = None, derivatives: Optional[DerivativeIndex] = None) -> List[str]:
+    """Render and/or upload laid-out DOCX pages, depending on the output mode."""
+    text_items = []
+    if output_mode != 'images':
+        text_items = upload_text_pages({page: layout.text for page, layout in enumerate(pages, start=1)}, key_info, fileId, bucket)
+        if output_mode == 'text':
+            return text_items
+
+    logger.info(f"Rendering {len(pages)} laid-out pages from DOCX")
+    rendered = render_layout_pages(pages, profile, progress.completed_pages if progress else ())
+    image_items = upload_pages(rendered, len(pages), key_info, fileId, bucket, profile, 'DOCX', progress, page_filter, derivatives)
+    return combine_page_items(image_items, text_items, output_mode)
+
+
+def process_docx(docx_path: str, key_info: Dict[str, str], fileId: str, bucket: str, profile: RenderProfile, output_mode: str = 'images', progress: Optional[ProgressManifest] = None, page_filter: Optional[PageFilter] = None, derivatives: Optional[DerivativeIndex] = None) -> List[str]:
     """Process DOCX file and return list of output S3 keys."""
     logger.info("Processing DOCX file...")
 
+    if DOCX_RENDERER == 'layout' and docx_path.lower().endswith('.docx'):
+        try:
+            pages = layout_docx(docx_path, os.path.splitext(key_info['filename'])[0])
+        except Exception as e:
+            # Legacy .doc content renamed to .docx, or XML python-docx rejects; mammoth is more lenient
+            logger.warning(f"Could not lay out DOCX, flattening it to text instead: {e}")
+        else:
+            return process_docx_layout(pages, key_info, fileId, bucket, profile, output_mode, progress, page_filter, derivatives)
+
     try:
         # Convert DOCX to HTML and then to plain text
-        html = convert_docx_to_html(docx_content)
+        html = convert_docx_to_html(docx_path)
         text = html_to_plain_text(html)
 
-        # Get the title from the filename
-        title = os.path.splitext(key_info['filename'])[0]
-
-        # Convert text to images
-        images = text_to_image(text, title)
-
-        logger.info(f"Created {len(images)} pages from DOCX")
-        output_keys = []
-        filename = key_info.get('filename', 'image')
-        outputPrefix = key_info.get('outputPrefix', '')
-        format = key_info.get('format', 'jpeg')
-
-        for i, image in enumerate(images):
-            output_key = f"{outputPrefix}/{filename}-{i + 1}.{format}"
-            process_page(image, bucket, output_key, format)
-            output_keys.append({ 'key': output_key, 'page': i + 1, 'filename': filename, 'fileId': fileId })
-            logger.info(f"Processed DOCX page {i + 1}/{len(images)}")
-
-        return output_keys
+        return process_text_content(text, key_info, fileId, bucket, profile, output_mode, 'DOCX', progress, page_filter, derivatives)
     except Exception as e:
         logger.error(f"Error processing DOCX file: {e}")
         raise
 
 
-def process_txt_file(text_content: bytes, key_info: Dict[str, str], fileId: str, bucket: str, is_markdown: bool = False) -> List[str]:
-    """Process TXT or MD file and return list of output S3 keys."""
-    try:
-        # Decode bytes to string
-        content = text_content.decode('utf-8')
-
-        # Convert markdown to HTML if needed
-        if is_markdown:
-            logger.info("Processing Markdown file...")
-            content = markdown.markdown(content)
-            content = html_to_plain_text(content)
-        else:
-            logger.info("Processing TXT file...")
+def read_text_file(text_path: str, is_markdown: bool = False) -> str:
+    """Read a TXT or MD file as the plain text that is rendered."""
+    with open(text_path, encoding='utf-8') as text_file:
+        content = text_file.read()
 
-        # Get the title from the filename
-        title = os.path.splitext(key_info['filename'])[0]
+    # Convert markdown to HTML if needed
+    if is_markdown:
+        import markdown
 
-        # Convert text to images
-        images = text_to_image(content, title)
+        content = markdown.markdown(content)
+        content = html_to_plain_text(content)
+    return content
 
-        logger.info(f"Created {len(images)} pages from text file")
-        output_keys = []
-        filename = key_info.get('filename', 'image')
-        outputPrefix = key_info.get('outputPrefix', '')
-        format = key_info.get('format', 'jpeg')
 
-        for i, image in enumerate(images):
-            output_key = f"{outputPrefix}/{filename}-{i + 1}.{format}"
-            process_page(image, bucket, output_key, format)
-            output_keys.append({ 'key': output_key, 'page': i + 1, 'filename': filename, 'fileId': fileId })
-            logger.info(f"Processed text page {i + 1}/{len(images)}")
+def process_txt_file(text_path: str, key_info: Dict[str, str], fileId: str, bucket: str, profile: RenderProfile, is_markdown: bool = False, output_mode: str = 'images', progress: Optional[ProgressManifest] = None, page_filter: Optional[PageFilter] = None, derivatives: Optional[DerivativeIndex] = None) -> List[str]:
+    """Process TXT or MD file and return list of output S3 keys."""
+    try:
+        logger.info(f"Processing {'Markdown' if is_markdown else 'TXT'} file...")
+        content = read_text_file(text_path, is_markdown)
 
-        return output_keys
+        return process_text_content(content, key_info, fileId, bucket, profile, output_mode, 'text', progress, page_filter, derivatives)
     except Exception as e:
         logger.error(f"Error processing text file: {e}")
         raise
@@ -286,63 +668,462 @@ def process_txt_file(text_content: bytes, key_info: Dict[str, str], fileId: str,
 def decode_utf_characters(input_string):
     return urllib.parse.unquote(input_string)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@contextmanager
+def open_source_file(bucket: str, key: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Stream the uploaded document referenced by a state machine event to /tmp and yield (path, metadata)."""
+    keyPath = decode_utf_characters(key).replace('+', ' ')
+    suffix = os.path.splitext(keyPath.lower())[1]
+
+    start = time.perf_counter()
+    with downloaded_source(s3_client, bucket, keyPath, suffix, MAX_SOURCE_BYTES, SOURCE_CHUNK_BYTES, UPLOAD_CONCURRENCY) as (source_path, metadata):
+        download_seconds = time.perf_counter() - start
+        current_stage_timings().record('Download', download_seconds)
+        current_stage_timings().count('bytesDownloaded', metadata['size'])
+        # Metadata only: the document itself never goes to CloudWatch
+        logger.info("Downloaded source file", extra={**metadata, 'downloadMs': round(download_seconds * 1000, 1)})
+        yield source_path, metadata
+
+
+def plan_shards(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Split a document into page-range shards that can be rendered by separate invocations."""
+    file_ext = os.path.splitext(document['pdfKey'].lower())[1]
+    if file_ext != '.pdf':
+        # Only PDFs can be rendered by page range; everything else is a single shard
+        return {**document, 'shards': [document]}
+
+    with open_source_file(document['bucket'], document['pdfKey']) as (pdf_path, _):
+        page_count = get_pdf_page_count(pdf_path)
+
+    shards = [
+        {**document, 'pageStart': page_start, 'pageEnd': min(page_start + PDF_SHARD_PAGES - 1, page_count)}
+        for page_start in range(1, page_count + 1, PDF_SHARD_PAGES)
+    ]
+    logger.info(f"Planned {len(shards)} shards of up to {PDF_SHARD_PAGES} pages for {page_count} pages")
+
+    return {**document, 'pages': page_count, 'shards': shards}
+
+
+def merge_shards(document: Dict[str, Any], shard_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the items rendered by each shard into the single-invocation response shape."""
+    output_keys = []
+    skipped_pages = []
+    for shard_result in shard_results:
+        if 'items' not in shard_result:
+            raise Exception(f"Shard failed: {shard_result.get('body', shard_result)}")
+        output_keys.extend(shard_result['items'])
+        skipped_pages.extend(shard_result.get('skippedPages', []))
+
+    output_keys.sort(key=lambda item: item['page'])
+    document = {key: value for key, value in document.items() if key != 'shards'}
+
+    merged = {
+        **document,
+        'pages': len(output_keys),
+        'items': output_keys
+    }
+    if any('skippedPages' in shard_result for shard_result in shard_results):
+        merged['skippedPages'] = sorted(skipped_pages, key=lambda skipped: skipped['page'])
+
+    index_parts = [shard_result['pageIndex'] for shard_result in shard_results if 'pageIndex' in shard_result]
+    if index_parts:
+        # Each shard wrote the index of its own pages; clients read one index per document
+        bucket = document['resultBucket']
+        key_info = parse_s3_key(document['pdfKey'], document.get('outputPrefix', ''), document.get('format', 'png'))
+        index = merge_indexes([load_index(s3_client, bucket, part['key']) for part in index_parts])
+        index_key = get_index_key(key_info)
+        save_index(s3_client, bucket, index_key, index)
+        merged['pageIndex'] = {'bucket': bucket, 'key': index_key}
+    return merged
+
+
+def render_original_page(source_path: str, file_ext: str, key_info: Dict[str, str], page: int) -> Image.Image:
+    """Render one page of a source document at archival quality, regardless of the conversion's profile."""
+    if file_ext == '.pdf':
+        page_count = get_pdf_page_count(source_path)
+        if not 1 <= page <= page_count:
+            raise ValueError(f"Page {page} is outside the document's {page_count} pages")
+        profile = RenderProfile('original', dpi=ORIGINAL_DPI, color_mode='RGB', format='png', quality=100)
+        for _, image in iter_pdf_pages(source_path, [page], profile):
+            # iter_pdf_pages closes each page once the next one is requested
+            return image.copy()
+
+    title = os.path.splitext(key_info['filename'])[0]
+    if file_ext in ('.doc', '.docx'):
+        if DOCX_RENDERER == 'layout' and source_path.lower().endswith('.docx'):
+            try:
+                layout_pages = layout_docx(source_path, title)
+            except Exception as e:
+                logger.warning(f"Could not lay out DOCX, flattening it to text instead: {e}")
+            else:
+                if not 1 <= page <= len(layout_pages):
+                    raise ValueError(f"Page {page} is outside the document's {len(layout_pages)} pages")
+                draw = lambda canvas, index: canvas.render(layout_pages[index])
+                for _, image in iter_canvas_pages(lambda: LayoutCanvas('L'), draw, len(layout_pages), 'L', page_numbers=[page]):
+                    return image.copy()
+        text = html_to_plain_text(convert_docx_to_html(source_path))
+    else:
+        text = read_text_file(source_path, is_markdown=file_ext == '.md')
+
+    # Text pages have a fixed size, so the page the conversion rendered is already full resolution
+    text_pages = paginate_text(text, title)
+    if not 1 <= page <= len(text_pages):
+        raise ValueError(f"Page {page} is outside the document's {len(text_pages)} pages")
+    for _, image in iter_text_pages(text_pages, title, 'L', page_numbers=[page]):
+        return image.copy()
+
+
+def derive_page(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Produce a lazy derivative of one page (the full-resolution original) unless it already exists.
+
+    Takes the conversion's bucket, pdfKey, resultBucket, outputPrefix and format with the
+    page number and derivative name, and returns where the derivative is stored.
+    """
+    derivative = event.get('derivative', 'original')
+    if derivative != 'original':
+        raise ValueError(f"Only the original is derived on request, not {derivative}")
+    page = int(event['page'])
+    bucket = event['resultBucket']
+    file_ext = os.path.splitext(event['pdfKey'].lower())[1]
+    if file_ext not in SUPPORTED_FILE_EXTENSIONS:
+        raise ValueError(f"File type {file_ext} not supported for conversion")
+
+    key_info = parse_s3_key(event['pdfKey'], event.get('outputPrefix', ''), event.get('format', 'png'))
+    output_key = get_derivative_key(key_info, page, derivative)
     try:
-        logger.info(f"Processing event: {json.dumps(event)}")
+        existing = s3_client.head_object(Bucket=bucket, Key=output_key)
+        return {'bucket': bucket, 'key': output_key, 'page': page, 'generated': False, 'bytes': existing['ContentLength']}
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+
+    current_stage_timings().reset()
+    with open_source_file(event['bucket'], event['pdfKey']) as (source_path, _):
+        if file_ext == '.pdf' and not verify_poppler():
+            raise Exception("Poppler verification failed")
+        with current_stage_timings().stage('Render'):
+            image = render_original_page(source_path, file_ext, key_info, page)
+
+    with current_stage_timings().stage('Encode'):
+        body = encode_original(image)
+    width, height = image.size
+    image.close()
+    s3_client.put_object(Bucket=bucket, Key=output_key, Body=body, ContentType=DERIVATIVE_CONTENT_TYPES[derivative])
+    logger.info(f"Derived {derivative} of page {page}", extra={'key': output_key, 'bytes': len(body), **current_stage_timings().summary()})
+
+    return {'bucket': bucket, 'key': output_key, 'page': page, 'generated': True, 'bytes': len(body), 'width': width, 'height': height}
+
+
+def apply_image_budget(profile: RenderProfile, event: Dict[str, Any]) -> RenderProfile:
+    """Set the vision-token budget on a profile from the event (maxImageTokens or maxImagePixels) or the environment."""
+    if event.get('maxImageTokens') is not None:
+        max_tokens = int(event['maxImageTokens'])
+    elif event.get('maxImagePixels') is not None:
+        max_tokens = tokens_for_pixels(int(event['maxImagePixels']))
+    elif DEFAULT_IMAGE_TOKEN_BUDGET:
+        max_tokens = int(DEFAULT_IMAGE_TOKEN_BUDGET)
+    else:
+        return profile
+
+    if max_tokens < MIN_TOKEN_BUDGET:
+        raise ValueError(f"Image token budget {max_tokens} is below the minimum of {MIN_TOKEN_BUDGET}")
+
+    return replace(profile, max_image_tokens=max_tokens, tile_dense_pages=bool(event.get('tileDensePages', DEFAULT_TILE_DENSE_PAGES)))
+
+
+def get_render_params(file_ext: str, key_info: Dict[str, str], profile: RenderProfile, page_start: Optional[int], page_end: Optional[int], page_filter: str = 'off') -> Dict[str, Any]:
+    """Everything besides the source bytes that changes the rendered pages."""
+    profile_params = asdict(profile)
+    # Left out when unset so renders cached before token budgets and thumbnails existed stay valid
+    for field in ('max_image_tokens', 'tile_dense_pages', 'thumbnail_size'):
+        if not profile_params[field]:
+            del profile_params[field]
+
+    params = {
+        'fileExt': file_ext,
+        'profile': profile_params,
+        'pageStart': page_start,
+        'pageEnd': page_end,
+    }
+
+    if page_filter != 'off':
+        # Left out when off so renders cached before page filtering existed stay valid
+        params['pageFilter'] = page_filter
+
+    if file_ext != '.pdf':
+        # Text pages carry the filename as a title, so it is part of the output
+        params.update({
+            'title': key_info.get('filename'),
+            'pageWidth': PAGE_WIDTH,
+            'pageHeight': PAGE_HEIGHT,
+            'margin': MARGIN,
+            'fontSize': FONT_SIZE,
+            'maxCharsPerLine': MAX_CHARS_PER_LINE,
+        })
+    if file_ext in ('.doc', '.docx'):
+        params['docxRenderer'] = DOCX_RENDERER
 
-        bucket = event['bucket']
-        resultBucket = event['resultBucket']
-        key = event['pdfKey']
-        fileId = event['fileId']
-        output_prefix = event.get('outputPrefix', '')
-        format = event.get('format', 'png')
+    return params
 
-        # Get file extension
-        file_ext = os.path.splitext(key.lower())[1]
-        keyPath = decode_utf_characters(key).replace('+', ' ')
-        key_info = parse_s3_key(key, output_prefix, format)
 
-        logger.info(f"file_ext: {file_ext}")
-        logger.info(f"key_info: {key_info}")
+def get_cached_pages(cache_key: str, key_info: Dict[str, str], fileId: str, bucket: str, page_filter: Optional[PageFilter] = None) -> Optional[List[Dict[str, Any]]]:
+    """Return items for a previous identical render, or None if it has to be rendered.
 
-        response = s3_client.get_object(Bucket=bucket, Key=keyPath)
-        file_content = response['Body'].read()
+    The pages that render skipped are restored into `page_filter`.
+    """
+    manifest = render_cache.load_manifest(s3_client, bucket, RENDER_CACHE_PREFIX, cache_key)
 
-        logger.info(f"response: {response}")
-        logger.info(f"file_content: {file_content}")
+    if manifest and render_cache.reuse_pages(s3_client, bucket, manifest, lambda page: get_output_key(key_info, page), UPLOAD_CONCURRENCY):
+        render_cache.stats['hits'] += 1
+        logger.info("Render cache hit", extra={'cacheKey': cache_key, 'cacheHits': render_cache.stats['hits'], 'cacheMisses': render_cache.stats['misses']})
+
+        filename = key_info.get('filename', 'image')
+        items = [
+            { 'key': get_output_key(key_info, page['page']), 'page': page['page'], 'filename': filename, 'fileId': fileId }
+            for page in manifest['pages']
+        ]
+        if page_filter is not None:
+            page_filter.skipped_pages.extend(manifest.get('skippedPages', []))
+            reasons = {skipped['page']: skipped['reason'] for skipped in page_filter.skipped_pages}
+            for item in items:
+                if item['page'] in reasons:
+                    item['skipped'] = reasons[item['page']]
+        return items
+
+    render_cache.stats['misses'] += 1
+    logger.info("Render cache miss", extra={'cacheKey': cache_key, 'cacheHits': render_cache.stats['hits'], 'cacheMisses': render_cache.stats['misses']})
+    return None
+
+
+def load_conversion_progress(event: Dict[str, Any], file_ext: str, key_info: Dict[str, str], profile: RenderProfile, output_mode: str, page_filter: str, source_etag: str) -> ProgressManifest:
+    """Load the pages an earlier attempt at this conversion already uploaded (keyed by fileId and shard)."""
+    render_params = {
+        **get_render_params(file_ext, key_info, profile, event.get('pageStart'), event.get('pageEnd'), page_filter),
+        'outputMode': output_mode,
+        'outputPrefix': key_info.get('outputPrefix'),
+        'filename': key_info.get('filename'),
+    }
+    progress = load_progress(
+        s3_client,
+        event['resultBucket'],
+        manifest_key(PROGRESS_PREFIX, event['fileId'], event.get('pageStart'), event.get('pageEnd')),
+        compute_fingerprint(source_etag, render_params),
+        PROGRESS_CHECKPOINT_PAGES
+    )
+
+    stale_pages = progress.verify(UPLOAD_CONCURRENCY)
+    if stale_pages:
+        logger.info(f"{stale_pages} previously uploaded pages changed since they were recorded and will be rendered again")
+
+    resumed_pages = len(progress.completed_pages)
+    if resumed_pages:
+        current_stage_timings().count('pagesResumed', resumed_pages)
+        logger.info(f"Resuming conversion with {resumed_pages} pages already uploaded", extra={'fileId': event['fileId']})
+    return progress
+
+
+def warm_up() -> Dict[str, Any]:
+    """Pay every one-time initialization cost up front instead of on the first real request."""
+    timings = {}
+
+    start = time.perf_counter()
+    import docx  # noqa: F401
+    import mammoth  # noqa: F401
+    import markdown  # noqa: F401
+    import pdf2image  # noqa: F401
+    import PyPDF2  # noqa: F401
+    timings['importsMs'] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    get_font()
+    get_font(FONT_SIZE, True)
+    # Seed the word cache with glyphs that appear on almost every page
+    for word in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.,:;-/()':
+        get_word_mask(word)
+    timings['fontsMs'] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    poppler_ready = verify_poppler()
+    timings['popplerMs'] = round((time.perf_counter() - start) * 1000, 1)
+
+    logger.info("Warm-up completed", extra=timings)
+    return {'warm': True, 'poppler': poppler_ready, 'timings': timings}
+
+
+def convert_document(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert the single document described by `event` into page items, raising on failure."""
+    bucket = event['bucket']
+    resultBucket = event['resultBucket']
+    key = event['pdfKey']
+    fileId = event['fileId']
+    output_prefix = event.get('outputPrefix', '')
+    profile = get_render_profile(event.get('renderProfile', DEFAULT_RENDER_PROFILE), event.get('format', 'png'))
+    profile = apply_image_budget(profile, event)
+    output_mode = event.get('outputMode', DEFAULT_OUTPUT_MODE)
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Invalid outputMode: {output_mode}. Must be one of {', '.join(OUTPUT_MODES)}")
+    page_filter = PageFilter(event.get('pageFilter', DEFAULT_PAGE_FILTER))
+    # Text-only output has no page images to derive from
+    derivative_names = parse_derivatives(event.get('derivatives', DEFAULT_PAGE_DERIVATIVES)) if output_mode != 'text' else ()
+    if 'thumbnail' in derivative_names:
+        profile = replace(profile, thumbnail_size=THUMBNAIL_MAX_PX)
+
+    # Get file extension
+    file_ext = os.path.splitext(key.lower())[1]
+    key_info = parse_s3_key(key, output_prefix, profile.format)
+
+    logger.info(f"file_ext: {file_ext}")
+    logger.info(f"key_info: {key_info}")
+
+    if file_ext not in SUPPORTED_FILE_EXTENSIONS:
+        # Non-supported file type, just mark as uploaded without children
+        logger.info(f"File type {file_ext} not supported for conversion")
+        return get_lambda_response({'message': f'File type {file_ext} not supported for conversion'})
+
+    current_stage_timings().reset()
+
+    with open_source_file(bucket, key) as (source_path, source_metadata):
+        cached_keys = None
+        # Cache manifests only describe image pages, one object per page, and no derivatives
+        if RENDER_CACHE_ENABLED and output_mode == 'images' and not profile.tile_dense_pages and not derivative_names:
+            render_params = get_render_params(file_ext, key_info, profile, event.get('pageStart'), event.get('pageEnd'), page_filter.mode)
+            cache_key = render_cache.compute_cache_key(source_path, render_params)
+            cached_keys = get_cached_pages(cache_key, key_info, fileId, resultBucket, page_filter)
+            if cached_keys is None:
+                # upload_pages records a manifest for this render under the same key
+                key_info['cacheKey'] = cache_key
+
+        progress = None
+        if PROGRESS_MANIFEST_ENABLED and cached_keys is None:
+            progress = load_conversion_progress(event, file_ext, key_info, profile, output_mode, page_filter.mode, source_metadata['etag'])
+
+        derivatives = None
+        if derivative_names:
+            derivatives = DerivativeIndex(derivative_names, key_info, CONTENT_TYPES.get(profile.format, f'image/{profile.format}'), ORIGINAL_DPI)
 
         # Process based on file type
-        if file_ext == '.pdf':
+        if cached_keys is not None:
+            output_keys = cached_keys
+
+        elif file_ext == '.pdf':
             if not verify_poppler():
                 raise Exception("Poppler verification failed")
 
-            output_keys = process_pdf(file_content, key_info, fileId, resultBucket)
+            output_keys = process_pdf(source_path, key_info, fileId, resultBucket, profile, event.get('pageStart'), event.get('pageEnd'), output_mode, progress, page_filter, derivatives)
 
         elif file_ext in ['.doc', '.docx']:
-            output_keys = process_docx(file_content, key_info, fileId, resultBucket)
+            output_keys = process_docx(source_path, key_info, fileId, resultBucket, profile, output_mode, progress, page_filter, derivatives)
 
         elif file_ext == '.txt':
-            output_keys = process_txt_file(file_content, key_info, fileId, resultBucket)
-
-        elif file_ext == '.md':
-            output_keys = process_txt_file(file_content, key_info, fileId, resultBucket, is_markdown=True)
+            output_keys = process_txt_file(source_path, key_info, fileId, resultBucket, profile, output_mode=output_mode, progress=progress, page_filter=page_filter, derivatives=derivatives)
 
         else:
-            # Non-supported file type, just mark as uploaded without children
-            logger.info(f"File type {file_ext} not supported for conversion")
-            return get_lambda_response({'message': f'File type {file_ext} not supported for conversion'})
+            output_keys = process_txt_file(source_path, key_info, fileId, resultBucket, profile, is_markdown=True, output_mode=output_mode, progress=progress, page_filter=page_filter, derivatives=derivatives)
 
-        return {
-            **event,
-            'pages': len(output_keys),
-            'items': output_keys
-        }
+    current_stage_timings().count('pagesSkipped', len(page_filter.skipped_pages))
+    publish_document_metrics(file_ext, len(output_keys))
+    logger.info("Document converted", extra={'fileType': file_ext, 'pages': len(output_keys), **current_stage_timings().summary()})
+
+    result = {
+        **event,
+        'pages': len(output_keys),
+        'items': output_keys
+    }
+    if page_filter.enabled:
+        result['skippedPages'] = page_filter.skipped_pages
+    if derivatives is not None:
+        # Shards write a part of the index, which merge_shards combines
+        index_key = get_index_key(key_info, event.get('pageStart'), event.get('pageEnd'))
+        save_index(s3_client, resultBucket, index_key, derivatives.build(output_keys, fileId, {'bucket': bucket, 'key': key}))
+        result['pageIndex'] = {'bucket': resultBucket, 'key': index_key}
+    return result
+
+
+def convert_batch_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one document of a batch, reporting failure in the result instead of raising."""
+    with document_stage_timings():
+        try:
+            result = convert_document(document)
+        except Exception as e:
+            logger.exception(f"Error processing file {document.get('pdfKey')}: {e}")
+            return {**document, 'status': 'failed', 'error': str(e)}
+
+    if 'items' not in result:
+        return {**document, 'status': 'skipped', 'message': json.loads(result['body'])['message']}
+
+    return {**result, 'status': 'succeeded'}
+
+
+def process_batch(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert every record in `event['documents']` on a shared pool of document workers.
+
+    Top-level fields other than `documents` (resultBucket, outputPrefix, format, renderProfile,
+    outputMode, ...) apply to every record unless the record sets them itself.
+    """
+    shared = {key: value for key, value in event.items() if key != 'documents'}
+    documents = [{**shared, **record} for record in event['documents']]
+    logger.info(f"Converting a batch of {len(documents)} documents with {BATCH_CONCURRENCY} workers")
+
+    results = []
+    if documents:
+        with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(documents)), thread_name_prefix='batch-document') as executor:
+            results = list(executor.map(convert_batch_document, documents))
+
+    counts = Counter(result['status'] for result in results)
+    metrics.add_metric(name='BatchDocuments', unit=MetricUnit.Count, value=len(results))
+    metrics.add_metric(name='ConvertedDocuments', unit=MetricUnit.Count, value=counts['succeeded'])
+    metrics.add_metric(name='FailedDocuments', unit=MetricUnit.Count, value=counts['failed'])
+    metrics.add_metric(name='UnsupportedDocuments', unit=MetricUnit.Count, value=counts['skipped'])
+
+    return {
+        **shared,
+        'documents': results,
+        'succeeded': counts['succeeded'],
+        'failed': counts['failed'],
+        'skipped': counts['skipped'],
+    }
+
+
+@metrics.log_metrics
+@tracer.capture_lambda_handler(capture_response=False)
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    try:
+        logger.info(f"Processing event: {json.dumps(event)}")
+
+        # Sharded mode: the state machine plans page ranges, renders each one, then merges the items
+        action = event.get('action')
+        if action == 'warmup':
+            metrics.add_metric(name='WarmUps', unit=MetricUnit.Count, value=1)
+            return warm_up()
+        if action == 'plan':
+            plan = plan_shards(event['document'])
+            metrics.add_metric(name='PlannedShards', unit=MetricUnit.Count, value=len(plan['shards']))
+            return plan
+        if action == 'derive':
+            derived = derive_page(event)
+            metrics.add_metric(name='DerivedPages', unit=MetricUnit.Count, value=int(derived['generated']))
+            return derived
+        if action == 'merge':
+            merged = merge_shards(event['document'], event['shards'])
+            metrics.add_metric(name='MergedPages', unit=MetricUnit.Count, value=merged['pages'])
+            return merged
+
+        # Batch mode: many small documents share one invocation and report results individually
+        if 'documents' in event:
+            return process_batch(event)
+
+        tracer.put_annotation(key='fileType', value=os.path.splitext(event['pdfKey'].lower())[1])
+        result = convert_document(event)
+        metrics.add_metric(name='ConvertedDocuments' if 'items' in result else 'UnsupportedDocuments', unit=MetricUnit.Count, value=1)
+
+        return result
 
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'message': f"Error processing file: {str(e)}"
-            })
-        }
+        metrics.add_metric(name='FailedDocuments', unit=MetricUnit.Count, value=1)
+        # Failing the invocation lets the state machine retry the shard, which resumes from its progress manifest
+        raise
+
+
+# Provisioned concurrency runs module initialization ahead of traffic, so warm up there as well
+if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency' or os.environ.get('WARM_UP_ON_INIT', 'false').lower() == 'true':
+    warm_up()
@@ -0,0 +1,163 @@
+import json
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from image_budget import EncodedPage
+
+# Besides the model-input page every conversion writes: a small preview, uploaded with the
+# page, and a full-resolution archival copy, rendered only when first requested
+DERIVATIVE_NAMES = ('thumbnail', 'original')
+
+THUMBNAIL_FORMAT = 'jpeg'
+THUMBNAIL_QUALITY = 70
+ORIGINAL_FORMAT = 'png'
+
+DERIVATIVE_CONTENT_TYPES = {
+    'thumbnail': 'image/jpeg',
+    'original': 'image/png',
+}
+
+
+@dataclass
+class DerivedPage:
+    """An encoded model-input page together with the derivatives made from the same render."""
+    model: EncodedPage
+    thumbnail: bytes
+    thumbnail_size: Tuple[int, int]
+
+
+def parse_derivatives(setting: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """Derivative names from a comma-separated setting or a list; empty means none."""
+    if not setting:
+        return ()
+    names = [name.strip() for name in setting.split(',')] if isinstance(setting, str) else list(setting)
+    names = [name for name in names if name]
+    unknown = [name for name in names if name not in DERIVATIVE_NAMES]
+    if unknown:
+        raise ValueError(f"Unknown page derivatives: {', '.join(unknown)}. Must be among {', '.join(DERIVATIVE_NAMES)}")
+    return tuple(name for name in DERIVATIVE_NAMES if name in names)
+
+
+def get_derivative_key(key_info: Dict[str, str], page: int, name: str) -> str:
+    filename = key_info.get('filename', 'image')
+    outputPrefix = key_info.get('outputPrefix', '')
+    format = THUMBNAIL_FORMAT if name == 'thumbnail' else ORIGINAL_FORMAT
+    return f"{outputPrefix}/{filename}-{page}-{name}.{format}"
+
+
+def get_index_key(key_info: Dict[str, str], page_start: Optional[int] = None, page_end: Optional[int] = None) -> str:
+    """Key of the document's page index, or of the part written by one shard of it."""
+    filename = key_info.get('filename', 'image')
+    outputPrefix = key_info.get('outputPrefix', '')
+    if page_start is None and page_end is None:
+        return f"{outputPrefix}/{filename}-pages.json"
+    return f"{outputPrefix}/{filename}-pages-{page_start}-{page_end}.json"
+
+
+def make_thumbnail(image: Image.Image, max_size: int) -> Tuple[bytes, Tuple[int, int]]:
+    """Encode a preview of a rendered page that fits in a `max_size` square."""
+    thumbnail = image.copy()
+    # reducing_gap shrinks by whole factors first, which is much faster on 200 DPI pages
+    thumbnail.thumbnail((max_size, max_size), Image.LANCZOS, reducing_gap=3.0)
+    if thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('L' if thumbnail.mode == '1' else 'RGB')
+
+    buffer = BytesIO()
+    thumbnail.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    size = thumbnail.size
+    thumbnail.close()
+    return buffer.getvalue(), size
+
+
+def encode_original(image: Image.Image) -> bytes:
+    """Encode a page losslessly for archiving, independent of the render profile's format."""
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('L' if image.mode == '1' else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+class DerivativeIndex:
+    """Collects what was uploaded for each page of a conversion and describes it as a JSON index.
+
+    The index lists, per page, the model-input image (or its tiles), the thumbnail and
+    the key the original will have once requested. Clients read it instead of guessing
+    keys, and fetch the thumbnail for previews rather than the full page.
+    """
+
+    def __init__(self, derivatives: Tuple[str, ...], key_info: Dict[str, str], content_type: str, original_dpi: int):
+        self.derivatives = derivatives
+        self.key_info = key_info
+        self.content_type = content_type
+        self.original_dpi = original_dpi
+        self._lock = threading.Lock()
+        self._model_bytes: Dict[int, int] = {}
+        self._thumbnails: Dict[int, Dict[str, Any]] = {}
+
+    def add_model(self, page: int, size: int) -> None:
+        with self._lock:
+            self._model_bytes[page] = size
+
+    def add_thumbnail(self, page: int, key: str, dimensions: Tuple[int, int], size: int) -> None:
+        with self._lock:
+            self._thumbnails[page] = {
+                'key': key,
+                'contentType': DERIVATIVE_CONTENT_TYPES['thumbnail'],
+                'width': dimensions[0],
+                'height': dimensions[1],
+                'bytes': size,
+            }
+
+    def build(self, items: List[Dict[str, Any]], fileId: str, source: Dict[str, str]) -> Dict[str, Any]:
+        """The index for the image items a conversion returned (text items are left out)."""
+        pages: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            if item.get('contentType') == 'text':
+                continue
+            entry = pages.setdefault(item['page'], {'page': item['page']})
+            if 'tile' in item:
+                entry.setdefault('model', {'contentType': self.content_type, 'tiles': []})['tiles'].append(item['key'])
+            else:
+                entry['model'] = {'key': item['key'], 'contentType': self.content_type}
+                if item['page'] in self._model_bytes:
+                    entry['model']['bytes'] = self._model_bytes[item['page']]
+            if 'skipped' in item:
+                entry['skipped'] = item['skipped']
+
+        for page, entry in pages.items():
+            if 'thumbnail' in self.derivatives:
+                # Pages resumed from an earlier attempt had their thumbnail uploaded by it
+                entry['thumbnail'] = self._thumbnails.get(page, {'key': get_derivative_key(self.key_info, page, 'thumbnail'), 'contentType': DERIVATIVE_CONTENT_TYPES['thumbnail']})
+            if 'original' in self.derivatives:
+                entry['original'] = {
+                    'key': get_derivative_key(self.key_info, page, 'original'),
+                    'contentType': DERIVATIVE_CONTENT_TYPES['original'],
+                    'dpi': self.original_dpi,
+                    'lazy': True,
+                }
+
+        return {
+            'fileId': fileId,
+            'source': source,
+            'derivatives': ['model', *self.derivatives],
+            'pages': [pages[page] for page in sorted(pages)],
+        }
+
+
+def merge_indexes(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the index parts written by the shards of one document."""
+    pages = sorted((page for part in parts for page in part['pages']), key=lambda page: page['page'])
+    return {**parts[0], 'pages': pages}
+
+
+def save_index(client: Any, bucket: str, key: str, index: Dict[str, Any]) -> None:
+    client.put_object(Bucket=bucket, Key=key, Body=json.dumps(index).encode('utf-8'), ContentType='application/json')
+
+
+def load_index(client: Any, bucket: str, key: str) -> Dict[str, Any]:
+    return json.loads(client.get_object(Bucket=bucket, Key=key)['Body'].read())
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# off: every page is kept; flag: pages are kept but marked; drop: flagged pages are neither uploaded nor returned
+PAGE_FILTER_MODES = ['off', 'flag', 'drop']
+
+# Pages are compared as grayscale thumbnails this wide: enough to tell one line of text from
+# another, small enough that a few hundred of them fit comfortably in memory
+THUMBNAIL_WIDTH = 256
+# A thumbnail pixel counts as ink when it is this much darker than the page background...
+INK_CONTRAST = 32
+# ...and a page with less than this fraction of ink pixels is blank. Scanner speckle averages
+# out entirely; a single printed word is ~0.0001, so any legible mark keeps the page
+BLANK_MAX_INK_RATIO = 0.00005
+# Two pages are the same when no thumbnail pixel differs by more than this. Re-encoding and
+# speckle stay under ~15, while one changed character of 10pt text exceeds ~40; edits to
+# text much smaller than that (under ~6pt) can fall below it
+DUPLICATE_MAX_PIXEL_DIFFERENCE = 24
+
+
+@dataclass(frozen=True)
+class PageSignature:
+    """The downscaled view of a page used to decide whether it is worth extracting."""
+    thumbnail: Image.Image
+    ink_ratio: float
+
+
+def page_signature(body: bytes) -> PageSignature:
+    """Decode an encoded page straight to a grayscale thumbnail and measure how much of it is ink."""
+    with Image.open(BytesIO(body)) as image:
+        # JPEG decodes at 1/2, 1/4 or 1/8 scale for free; other formats decode in full
+        image.draft('L', thumbnail_size(image))
+        return image_signature(image)
+
+
+def thumbnail_size(image: Image.Image) -> Tuple[int, int]:
+    return THUMBNAIL_WIDTH, max(1, round(THUMBNAIL_WIDTH * image.height / image.width))
+
+
+def image_signature(image: Image.Image) -> PageSignature:
+    """Signature of a page that is already decoded."""
+    thumbnail = image.convert('L').resize(thumbnail_size(image), Image.BOX)
+
+    histogram = thumbnail.histogram()
+    pixels = thumbnail.width * thumbnail.height
+    # The median is the background level, which is rarely pure white on a scan
+    running, background = 0, 255
+    for level, count in enumerate(histogram):
+        running += count
+        if running * 2 >= pixels:
+            background = level
+            break
+
+    ink_pixels = sum(histogram[:max(0, background - INK_CONTRAST)])
+    return PageSignature(thumbnail, ink_pixels / pixels)
+
+
+class PageFilter:
+    """Flag near-blank pages and near-identical repeats among the pages of one document.
+
+    `check` is called with each encoded page in page order and returns a skip record
+    ({'page', 'reason'[, 'duplicateOf']}) or None to keep the page. Repeats are only
+    looked for among pages checked by this filter, so shards and resumed conversions
+    deduplicate within the pages they render themselves.
+    """
+
+    def __init__(self, mode: str):
+        if mode not in PAGE_FILTER_MODES:
+            raise ValueError(f"Invalid pageFilter: {mode}. Must be one of {', '.join(PAGE_FILTER_MODES)}")
+        self.mode = mode
+        self.skipped_pages: List[Dict[str, Any]] = []
+        self._kept: List[Tuple[int, PageSignature]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    @property
+    def drops_pages(self) -> bool:
+        return self.mode == 'drop'
+
+    def check(self, page: int, body: bytes) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+
+        signature = page_signature(body)
+        if signature.ink_ratio < BLANK_MAX_INK_RATIO:
+            return self._skip({'page': page, 'reason': 'blank'})
+
+        for kept_page, kept in self._kept:
+            if is_same_page(signature, kept):
+                return self._skip({'page': page, 'reason': 'duplicate', 'duplicateOf': kept_page})
+
+        self._kept.append((page, signature))
+        return None
+
+    def _skip(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        self.skipped_pages.append(record)
+        return record
+
+
+def is_same_page(first: PageSignature, second: PageSignature) -> bool:
+    if first.thumbnail.size != second.thumbnail.size:
+        return False
+    # Pages with clearly different amounts of ink cannot be the same; skips most pixel comparisons
+    if abs(first.ink_ratio - second.ink_ratio) > 0.2 * max(first.ink_ratio, second.ink_ratio):
+        return False
+    return ImageChops.difference(first.thumbnail, second.thumbnail).getextrema()[1] <= DUPLICATE_MAX_PIXEL_DIFFERENCE
@@ -0,0 +1,140 @@
+import io
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# S3 rejects multipart parts under 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class BufferReader(io.RawIOBase):
+    """A seekable, read-only file object over a memoryview.
+
+    botocore accepts bytes or file objects but not memoryviews as a request body; this lets
+    a multipart part be sent from a slice of the encoded page without copying the slice.
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = max(0, min(len(target), len(self._view) - self._position))
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+
+class PageUploader:
+    """Upload encoded pages to S3 on a thread pool while the caller keeps rendering.
+
+    The number of bytes waiting to be uploaded is capped by `max_inflight_bytes`;
+    `submit` blocks once the cap is reached, which keeps memory bounded when
+    rendering outpaces the network. Results are returned in submission order.
+    `on_uploaded(size, seconds)` is called from the upload thread after each put, as is
+    a page's own `on_done(response)` when one is passed to `submit`.
+
+    Pages over `multipart_threshold` bytes are sent as a multipart upload whose parts
+    are `part_size` views into the page, so no part is copied before it is sent.
+    """
+
+    def __init__(self, client: Any, max_workers: int, max_inflight_bytes: int, on_uploaded: Optional[Callable[[int, float], None]] = None, multipart_threshold: int = 16 * 1024 * 1024, part_size: int = 8 * 1024 * 1024):
+        self._client = client
+        self._on_uploaded = on_uploaded
+        self._multipart_threshold = multipart_threshold
+        self._part_size = max(MIN_PART_SIZE, part_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='page-upload')
+        self._max_inflight_bytes = max_inflight_bytes
+        self._inflight_bytes = 0
+        self._condition = threading.Condition()
+        self._futures: List[Future] = []
+        self._error: Optional[BaseException] = None
+
+    def __enter__(self) -> 'PageUploader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+
+    def submit(self, bucket: str, key: str, body: bytes, content_type: str, on_done: Optional[Callable[[Any], None]] = None) -> None:
+        """Queue a page for upload, blocking while the in-flight byte budget is exhausted."""
+        size = len(body)
+        with self._condition:
+            # A single page larger than the budget is let through once nothing else is in flight
+            while self._error is None and self._inflight_bytes and self._inflight_bytes + size > self._max_inflight_bytes:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            self._inflight_bytes += size
+
+        self._futures.append(self._executor.submit(self._put, bucket, key, body, content_type, size, on_done))
+
+    def wait(self) -> List[Any]:
+        """Wait for every queued upload and return the put_object responses in submission order."""
+        return [future.result() for future in self._futures]
+
+    def _put(self, bucket: str, key: str, body: bytes, content_type: str, size: int, on_done: Optional[Callable[[Any], None]]) -> Any:
+        try:
+            start = time.perf_counter()
+            if size > self._multipart_threshold:
+                response = self._put_multipart(bucket, key, memoryview(body), content_type)
+            else:
+                response = self._client.put_object(
+                    Bucket=bucket,
+                    Key=key,
+                    Body=body,
+                    ContentType=content_type
+                )
+            if self._on_uploaded is not None:
+                self._on_uploaded(size, time.perf_counter() - start)
+            if on_done is not None:
+                on_done(response)
+            return response
+        except BaseException as e:
+            with self._condition:
+                if self._error is None:
+                    self._error = e
+            raise
+        finally:
+            with self._condition:
+                self._inflight_bytes -= size
+                self._condition.notify_all()
+
+    def _put_multipart(self, bucket: str, key: str, view: memoryview, content_type: str) -> Dict[str, Any]:
+        upload_id = self._client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+        try:
+            parts = []
+            for part_number, start in enumerate(range(0, len(view), self._part_size), start=1):
+                response = self._client.upload_part(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=BufferReader(view[start:start + self._part_size])
+                )
+                parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+            return self._client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+        except BaseException:
+            # Incomplete uploads are billed until aborted
+            self._client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import traceback
+from typing import Callable, Iterator, List, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on (Lambda grants more vCPUs as memory grows)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_workers(setting: str) -> int:
+    """Turn a worker-count setting into a number: 'auto' means one worker per available CPU."""
+    if setting.strip().lower() == 'auto':
+        return available_cpus()
+    return max(1, int(setting))
+
+
+def imap_ordered(func: Callable[[T], R], items: List[T], workers: int) -> Iterator[R]:
+    """Map `func` over `items` in forked worker processes, yielding results in input order.
+
+    Lambda has no /dev/shm, so multiprocessing.Pool, Queue and ProcessPoolExecutor are
+    unavailable; workers report back over plain pipes instead. Items are dealt out
+    round-robin and each worker blocks until its previous result has been read, so at
+    most one result per worker is buffered at a time. `func` and `items` reach the
+    workers through fork and never need to be picklable; only results are pickled.
+    """
+    workers = min(workers, len(items))
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    context = multiprocessing.get_context('fork')
+    connections = []
+    processes = []
+    for worker in range(workers):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_worker, args=(func, items[worker::workers], sender), daemon=True)
+        process.start()
+        sender.close()
+        connections.append(receiver)
+        processes.append(process)
+
+    try:
+        for index in range(len(items)):
+            succeeded, value = connections[index % workers].recv()
+            if not succeeded:
+                raise RuntimeError(f"Worker process failed:\n{value}")
+            yield value
+    finally:
+        for connection in connections:
+            connection.close()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+def _run_worker(func: Callable, items: List, connection) -> None:
+    try:
+        for item in items:
+            connection.send((True, func(item)))
+    except BaseException:
+        connection.send((False, traceback.format_exc()))
+    finally:
+        connection.close()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+
+def compute_fingerprint(source_etag: str, render_params: Dict[str, Any]) -> str:
+    """Identify what a conversion produces, so progress is never resumed against a changed source or request."""
+    payload = json.dumps({'sourceETag': source_etag, **render_params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def manifest_key(prefix: str, file_id: str, page_start: Optional[int] = None, page_end: Optional[int] = None) -> str:
+    # Shards of one file convert in parallel, so each keeps its own manifest
+    if page_start is not None or page_end is not None:
+        return f"{prefix}/{file_id}/pages-{page_start or 1}-{page_end or 'end'}.json"
+    return f"{prefix}/{file_id}.json"
+
+
+class ProgressManifest:
+    """The pages of one conversion that have been rendered and uploaded, checkpointed to S3.
+
+    `record` is called from upload threads as each page lands; every `checkpoint_pages`
+    pages the manifest is written back, so a retry after a crash or timeout loses at
+    most that many pages of work.
+    """
+
+    def __init__(self, client: Any, bucket: str, key: str, fingerprint: str, pages: Optional[Dict[int, Dict[str, Any]]] = None, checkpoint_pages: int = 10):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._fingerprint = fingerprint
+        self._pages = dict(pages or {})
+        self._checkpoint_pages = max(1, checkpoint_pages)
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        # Held across the put so checkpoints reach S3 in the order they were taken
+        self._save_lock = threading.Lock()
+
+    @property
+    def completed_pages(self) -> Dict[int, Dict[str, Any]]:
+        """page number -> {'key', 'size', 'etag'} for every page already uploaded."""
+        with self._lock:
+            return dict(self._pages)
+
+    def record(self, page: int, key: str, size: int, etag: Optional[str]) -> None:
+        with self._lock:
+            self._pages[page] = {'key': key, 'size': size, 'etag': etag}
+            self._unsaved += 1
+            due = self._unsaved >= self._checkpoint_pages
+
+        if due:
+            self.save()
+
+    def verify(self, max_workers: int) -> int:
+        """Forget pages whose object is gone or has been overwritten since it was recorded.
+
+        Returns the number of pages dropped; they are rendered and uploaded again.
+        """
+        def is_current(item: Tuple[int, Dict[str, Any]]) -> bool:
+            try:
+                return self._client.head_object(Bucket=self._bucket, Key=item[1]['key']).get('ETag') == item[1]['etag']
+            except ClientError:
+                return False
+
+        pages = self.completed_pages
+        if not pages:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            current = dict(item for item, ok in zip(pages.items(), executor.map(is_current, pages.items())) if ok)
+
+        with self._lock:
+            self._pages = current
+        return len(pages) - len(current)
+
+    def save(self) -> None:
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                self._unsaved = 0
+                manifest = {
+                    'fingerprint': self._fingerprint,
+                    'pages': [{'page': page, **entry} for page, entry in sorted(self._pages.items())],
+                }
+
+            self._client.put_object(
+                Bucket=self._bucket,
+                Key=self._key,
+                Body=json.dumps(manifest).encode('utf-8'),
+                ContentType='application/json'
+            )
+
+
+def load_progress(client: Any, bucket: str, key: str, fingerprint: str, checkpoint_pages: int = 10) -> ProgressManifest:
+    """Return the progress recorded for this conversion, or an empty manifest if there is none.
+
+    Progress recorded for a different fingerprint (the source was replaced or the request
+    changed) is discarded, and its pages are rendered again.
+    """
+    pages: List[Dict[str, Any]] = []
+    try:
+        response = client.get_object(Bucket=bucket, Key=key)
+        manifest = json.loads(response['Body'].read())
+        if manifest.get('fingerprint') == fingerprint:
+            pages = manifest.get('pages', [])
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+            raise
+
+    return ProgressManifest(
+        client, bucket, key, fingerprint,
+        {entry['page']: {'key': entry['key'], 'size': entry['size'], 'etag': entry['etag']} for entry in pages},
+        checkpoint_pages
+    )
@@ -0,0 +1,88 @@
+import hashlib
+import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+# Per-container hit/miss counters, logged with every lookup
+stats = Counter()
+
+
+def compute_cache_key(source_path: str, render_params: Dict[str, Any]) -> str:
+    """Content-address a render: SHA-256 of the source file plus the parameters that shape the output."""
+    with open(source_path, 'rb') as source_file:
+        # file_digest hashes in fixed-size blocks, so large sources are never read into memory
+        digest = hashlib.file_digest(source_file, 'sha256')
+    digest.update(json.dumps(render_params, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def manifest_key(prefix: str, cache_key: str) -> str:
+    return f"{prefix}/{cache_key}.json"
+
+
+def load_manifest(client: Any, bucket: str, prefix: str, cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return the manifest recorded for a previous identical render, or None."""
+    try:
+        response = client.get_object(Bucket=bucket, Key=manifest_key(prefix, cache_key))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+
+    return json.loads(response['Body'].read())
+
+
+def save_manifest(client: Any, bucket: str, prefix: str, cache_key: str, items: List[Dict[str, Any]], responses: List[Dict[str, Any]], skipped_pages: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Record the page keys and ETags produced by a render so identical uploads can reuse them."""
+    manifest = {
+        'pages': [
+            {'page': item['page'], 'key': item['key'], 'etag': response.get('ETag')}
+            for item, response in zip(items, responses)
+        ]
+    }
+    if skipped_pages is not None:
+        manifest['skippedPages'] = skipped_pages
+    client.put_object(
+        Bucket=bucket,
+        Key=manifest_key(prefix, cache_key),
+        Body=json.dumps(manifest).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def reuse_pages(client: Any, bucket: str, manifest: Dict[str, Any], key_for_page: Callable[[int], str], max_workers: int) -> bool:
+    """Place cached page images at the keys this request would have written.
+
+    Pages already at the target key are checked by ETag; others are copied with
+    CopySourceIfMatch so a cached key that has since been overwritten is never reused.
+    Returns False if any page is missing or stale, in which case the caller should render.
+    """
+    def reuse(page: Dict[str, Any]) -> None:
+        target_key = key_for_page(page['page'])
+        if target_key == page['key']:
+            response = client.head_object(Bucket=bucket, Key=target_key)
+            if response.get('ETag') != page['etag']:
+                raise LookupError(f"Cached page {target_key} has changed")
+            return
+
+        client.copy_object(
+            Bucket=bucket,
+            Key=target_key,
+            CopySource={'Bucket': bucket, 'Key': page['key']},
+            CopySourceIfMatch=page['etag']
+        )
+
+    pages = manifest.get('pages', [])
+    if not pages:
+        return False
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(reuse, pages))
+    except (ClientError, LookupError):
+        return False
+
+    return True
@@ -0,0 +1,92 @@
+from dataclasses import dataclass, replace
+from io import BytesIO
+from typing import Dict, Optional
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """How pages are rasterized and encoded before they reach the vision model."""
+    name: str
+    dpi: int
+    color_mode: str  # PIL mode: 'RGB', 'L' (grayscale) or '1' (bilevel)
+    format: Optional[str]  # 'jpeg' or 'png'; None keeps the format requested by the event
+    quality: int
+    max_width: Optional[int] = None
+    max_height: Optional[int] = None
+    # Vision-token budget per image (see image_budget); pages over it are downscaled to fit
+    max_image_tokens: Optional[int] = None
+    # With a budget, dense pages that would lose too much detail are split into tiles instead
+    tile_dense_pages: bool = False
+    # Longest side of the preview encoded next to each page (see page_derivatives); None for no preview
+    thumbnail_size: Optional[int] = None
+
+
+RENDER_PROFILES: Dict[str, RenderProfile] = {
+    profile.name: profile
+    for profile in (
+        # Matches the original converter output: colour, event format, maximum quality, native size
+        RenderProfile('standard', dpi=100, color_mode='RGB', format=None, quality=100),
+        # Black-and-white faxes: grayscale JPEG is a fraction of the size with no loss of legibility
+        RenderProfile('fax-grayscale-jpeg-q80', dpi=150, color_mode='L', format='jpeg', quality=80, max_width=1700, max_height=2200),
+        # Clean bilevel scans compress far better as 1-bit PNG than as JPEG
+        RenderProfile('fax-bilevel-png', dpi=200, color_mode='1', format='png', quality=100, max_width=1700, max_height=2200),
+        # Small print and dense forms where the model needs every detail
+        RenderProfile('high-fidelity-png', dpi=200, color_mode='RGB', format='png', quality=100, max_width=2480, max_height=3508),
+    )
+}
+
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+
+def get_render_profile(name: str, default_format: str) -> RenderProfile:
+    """Look up a profile by name, filling in the event's format for profiles that do not set one."""
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile: {name}. Must be one of {', '.join(RENDER_PROFILES)}")
+
+    profile = RENDER_PROFILES[name]
+    if profile.format is None:
+        profile = replace(profile, format=default_format)
+
+    return profile
+
+
+def fit_to_profile(image: Image.Image, profile: RenderProfile) -> Image.Image:
+    """Convert a rendered page to the profile's colour mode and maximum dimensions.
+
+    Returns the input image when it already fits, otherwise a new image.
+    """
+    fitted = image
+    if profile.max_width and profile.max_height and (fitted.width > profile.max_width or fitted.height > profile.max_height):
+        scale = min(profile.max_width / fitted.width, profile.max_height / fitted.height)
+        fitted = fitted.resize((max(1, round(fitted.width * scale)), max(1, round(fitted.height * scale))), Image.LANCZOS)
+
+    if fitted.mode != profile.color_mode:
+        if profile.color_mode == '1':
+            # Threshold rather than dither: dithered text compresses badly and reads worse
+            fitted = fitted.convert('L').convert('1', dither=Image.Dither.NONE)
+        else:
+            fitted = fitted.convert(profile.color_mode)
+
+    return fitted
+
+
+def encode_image(image: Image.Image, profile: RenderProfile) -> bytes:
+    """Encode a page that has already been fitted to the profile."""
+    buffer = BytesIO()
+    if profile.format in ('jpeg', 'jpg'):
+        # JPEG has no bilevel mode
+        if image.mode == '1':
+            image = image.convert('L')
+        image.save(buffer, format='JPEG', quality=profile.quality, optimize=True)
+    else:
+        image.save(buffer, format=profile.format)
+
+    # getvalue() hands over the encoder's buffer without copying it when nothing else
+    # references the buffer; getbuffer() would also keep BytesIO's over-allocation alive
+    return buffer.getvalue()
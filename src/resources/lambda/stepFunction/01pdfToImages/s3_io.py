@@ -0,0 +1,91 @@
+import threading
+from typing import Any, Optional
+
+import boto3
+from botocore.config import Config
+
+
+def create_s3_client(max_connections: int, max_concurrency: int, max_attempts: int) -> 'LimitedS3Client':
+    """Create the S3 client shared by every download, upload and cache lookup of the lambda.
+
+    botocore's adaptive retry mode retries throttling and transient errors with exponential
+    backoff and, once S3 answers SlowDown, also paces new requests client-side, so a burst
+    of pages backs off instead of failing.
+    """
+    client = boto3.client('s3', config=Config(
+        max_pool_connections=max_connections,
+        retries={'mode': 'adaptive', 'max_attempts': max_attempts},
+        tcp_keepalive=True,
+    ))
+    return LimitedS3Client(client, max_concurrency)
+
+
+class LimitedS3Client:
+    """Wrap an S3 client so at most `max_concurrency` requests are in flight at once.
+
+    Every thread pool of the lambda (ranged downloads, page uploads, cache copies, one set
+    per document of a batch) shares the limit, so bursty loads stay under the request rate
+    S3 allows per prefix. A get_object keeps its slot until its body has been read to the
+    end or closed, since the transfer is still running until then.
+    """
+
+    def __init__(self, client: Any, max_concurrency: int):
+        self._client = client
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if not callable(attribute) or name.startswith('_') or name in ('can_paginate', 'get_paginator', 'get_waiter', 'generate_presigned_url'):
+            return attribute
+
+        def limited(*args, **kwargs):
+            self._slots.acquire()
+            try:
+                response = attribute(*args, **kwargs)
+            except BaseException:
+                self._slots.release()
+                raise
+
+            if name == 'get_object':
+                response['Body'] = _SlotHoldingBody(response['Body'], self._slots)
+            else:
+                self._slots.release()
+            return response
+
+        return limited
+
+
+class _SlotHoldingBody:
+    """A streaming response body that returns its request slot once it is drained or closed."""
+
+    def __init__(self, body: Any, slots: threading.BoundedSemaphore):
+        self._body = body
+        self._slots: Optional[threading.BoundedSemaphore] = slots
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        try:
+            data = self._body.read(amt)
+        except BaseException:
+            self.close()
+            raise
+        if amt is None or not data:
+            self._release()
+        return data
+
+    def close(self) -> None:
+        try:
+            self._body.close()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+            self._slots = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._body, name)
+
+    def __del__(self) -> None:
+        # A body dropped without being read to the end must not leak its slot
+        self._release()
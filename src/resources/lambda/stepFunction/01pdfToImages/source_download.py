@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+from botocore.exceptions import BotoCoreError
+
+# Bytes requested per ranged GET; the body of each range is streamed to disk, never held whole
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Bytes read from a response body per write
+STREAM_BLOCK_SIZE = 1024 * 1024
+# botocore retries a failed request, but not a body that breaks off mid-stream; such a range
+# is requested again this many times in total, backing off exponentially (with jitter)
+RANGE_ATTEMPTS = 3
+RANGE_RETRY_BASE_SECONDS = 0.2
+
+
+class SourceTooLargeError(Exception):
+    """The source object is larger than the configured download limit."""
+
+
+class IncompleteRangeError(IOError):
+    """A ranged GET ended before the end of its range."""
+
+
+def chunk_ranges(size: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Split [0, size) into inclusive (start, end) byte ranges of at most `chunk_size` bytes."""
+    for start in range(0, size, chunk_size):
+        yield start, min(start + chunk_size, size) - 1
+
+
+def _download_range(client: Any, bucket: str, key: str, etag: str, file_descriptor: int, start: int, end: int) -> None:
+    for attempt in range(1, RANGE_ATTEMPTS + 1):
+        try:
+            _read_range(client, bucket, key, etag, file_descriptor, start, end)
+            return
+        except (BotoCoreError, IncompleteRangeError):
+            if attempt == RANGE_ATTEMPTS:
+                raise
+            time.sleep(random.uniform(0, RANGE_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def _read_range(client: Any, bucket: str, key: str, etag: str, file_descriptor: int, start: int, end: int) -> None:
+    # IfMatch makes every range fail rather than mix two versions of an overwritten object
+    response = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+    offset = start
+    body = response['Body']
+    try:
+        while True:
+            block = body.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            os.pwrite(file_descriptor, block, offset)
+            offset += len(block)
+    finally:
+        body.close()
+
+    if offset != end + 1:
+        raise IncompleteRangeError(f"Short read for s3://{bucket}/{key} bytes {start}-{end}: got {offset - start} bytes")
+
+
+def download_to_file(client: Any, bucket: str, key: str, file_descriptor: int, max_bytes: int, chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = 1) -> Dict[str, Any]:
+    """Stream an S3 object into an open file in ranged chunks and return its metadata.
+
+    Raises SourceTooLargeError before downloading anything if the object exceeds `max_bytes`.
+    """
+    head = client.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    if size > max_bytes:
+        raise SourceTooLargeError(f"s3://{bucket}/{key} is {size} bytes, over the {max_bytes} byte limit")
+
+    ranges = list(chunk_ranges(size, chunk_size))
+    if len(ranges) <= 1 or max_workers <= 1:
+        for start, end in ranges:
+            _download_range(client, bucket, key, head['ETag'], file_descriptor, start, end)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(ranges))) as executor:
+            futures = [executor.submit(_download_range, client, bucket, key, head['ETag'], file_descriptor, start, end) for start, end in ranges]
+            for future in futures:
+                future.result()
+
+    return {
+        'bucket': bucket,
+        'key': key,
+        'size': size,
+        'etag': head['ETag'],
+        'contentType': head.get('ContentType'),
+        'chunks': len(ranges),
+    }
+
+
+@contextmanager
+def downloaded_source(client: Any, bucket: str, key: str, suffix: str, max_bytes: int, chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = 1) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Download an S3 object to a temporary file under /tmp, yielding (path, metadata).
+
+    The file is removed when the block exits, so warm containers do not fill ephemeral storage.
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix) as source_file:
+        metadata = download_to_file(client, bucket, key, source_file.fileno(), max_bytes, chunk_size, max_workers)
+        yield source_file.name, metadata
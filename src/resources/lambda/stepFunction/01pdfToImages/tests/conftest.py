@@ -0,0 +1,166 @@
+import hashlib
+import importlib.util
+import os
+import sys
+from io import BytesIO
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from botocore.exceptions import ClientError
+from PIL import Image, ImageDraw
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LAMBDA_DIR)
+
+POPPLER_PATH = "/opt/poppler/bin"
+
+requires_poppler = pytest.mark.skipif(
+    not os.path.exists(os.path.join(POPPLER_PATH, 'pdftoppm')),
+    reason=f"poppler is not installed in {POPPLER_PATH}"
+)
+
+
+class StubS3:
+    """In-memory stand-in for the subset of the boto3 S3 client used by the lambda."""
+
+    def __init__(self):
+        self.objects: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.puts: List[Tuple[str, str]] = []
+        self.gets: List[Tuple[str, str, str]] = []
+        self.multipart_uploads: Dict[str, Dict[int, bytes]] = {}
+        self.aborted: List[str] = []
+
+    def add_object(self, bucket: str, key: str, body: bytes, **kwargs) -> None:
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self.objects[(bucket, key)] = {'Body': body, 'ETag': etag, **kwargs}
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, **kwargs) -> Dict[str, Any]:
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        self.add_object(Bucket, Key, bytes(Body), **kwargs)
+        self.puts.append((Bucket, Key))
+        return {'ETag': self.objects[(Bucket, Key)]['ETag']}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        upload_id = f"upload-{len(self.multipart_uploads) + 1}"
+        self.multipart_uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any, **kwargs) -> Dict[str, Any]:
+        body = Body.read() if hasattr(Body, 'read') else Body
+        self.multipart_uploads[UploadId][PartNumber] = bytes(body)
+        return {'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        parts = self.multipart_uploads.pop(UploadId)
+        self.add_object(Bucket, Key, b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts']))
+        self.puts.append((Bucket, Key))
+        return {'ETag': self.objects[(Bucket, Key)]['ETag']}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> Dict[str, Any]:
+        self.multipart_uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None, IfMatch: str = None, **kwargs) -> Dict[str, Any]:
+        stored = self._get(Bucket, Key, 'GetObject')
+        if IfMatch is not None and IfMatch != stored['ETag']:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'ETag mismatch'}}, 'GetObject')
+        body = stored['Body']
+        if Range is not None:
+            start, end = Range.removeprefix('bytes=').split('-')
+            body = body[int(start):int(end) + 1]
+        self.gets.append((Bucket, Key, Range))
+        return {
+            'Body': BytesIO(body),
+            'ContentLength': len(body),
+            'ETag': stored['ETag'],
+            'Metadata': stored.get('Metadata', {}),
+        }
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        stored = self._get(Bucket, Key, 'HeadObject')
+        return {'ContentLength': len(stored['Body']), 'ETag': stored['ETag'], 'Metadata': stored.get('Metadata', {})}
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: Dict[str, str], CopySourceIfMatch: str = None, **kwargs) -> Dict[str, Any]:
+        stored = self._get(CopySource['Bucket'], CopySource['Key'], 'CopyObject')
+        if CopySourceIfMatch is not None and CopySourceIfMatch != stored['ETag']:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'ETag mismatch'}}, 'CopyObject')
+        self.objects[(Bucket, Key)] = dict(stored)
+        return {'CopyObjectResult': {'ETag': stored['ETag']}}
+
+    def _get(self, bucket: str, key: str, operation: str) -> Dict[str, Any]:
+        if (bucket, key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not found'}}, operation)
+        return self.objects[(bucket, key)]
+
+    def keys(self, bucket: str, prefix: str = '') -> List[str]:
+        return sorted(key for stored_bucket, key in self.objects if stored_bucket == bucket and key.startswith(prefix))
+
+
+@pytest.fixture
+def stub_s3() -> StubS3:
+    return StubS3()
+
+
+@pytest.fixture
+def lambda_module(stub_s3, monkeypatch):
+    """Import a fresh copy of lambda.py with its S3 client replaced by the stub."""
+    spec = importlib.util.spec_from_file_location('pdf_to_images_lambda', os.path.join(LAMBDA_DIR, 'lambda.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 's3_client', stub_s3)
+    return module
+
+
+def make_pdf(page_count: int) -> bytes:
+    """Build a PDF whose pages are numbered so rendered output can be told apart."""
+    pages = []
+    for page in range(1, page_count + 1):
+        image = Image.new('RGB', (612, 792), color='white')
+        ImageDraw.Draw(image).text((72, 72), f"Page {page}", fill='black')
+        pages.append(image)
+
+    buffer = BytesIO()
+    pages[0].save(buffer, format='PDF', save_all=True, append_images=pages[1:])
+    return buffer.getvalue()
+
+
+def make_text_pdf(page_texts: List[str]) -> bytes:
+    """Build a PDF with an embedded text layer (one line of Helvetica per page)."""
+    page_count = len(page_texts)
+    font_id = 3 + 2 * page_count
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(f"{3 + 2 * i} 0 R".encode() for i in range(page_count)) + f"] /Count {page_count} >>".encode(),
+    ]
+    for i, text in enumerate(page_texts):
+        escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        stream = f"BT /F1 10 Tf 40 700 Td ({escaped}) Tj ET".encode('latin-1')
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R /Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def make_event(key: str, **overrides) -> Dict[str, Any]:
+    return {
+        'bucket': 'input-bucket',
+        'resultBucket': 'result-bucket',
+        'pdfKey': key,
+        'fileId': 'file-id',
+        'filename': os.path.splitext(os.path.basename(key))[0],
+        'outputPrefix': 'images',
+        'format': 'jpeg',
+        **overrides,
+    }
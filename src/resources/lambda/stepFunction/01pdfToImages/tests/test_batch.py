@@ -0,0 +1,61 @@
+from conftest import make_pdf, requires_poppler
+
+
+def batch_event(*records):
+    return {
+        'resultBucket': 'result-bucket',
+        'outputPrefix': 'images',
+        'format': 'jpeg',
+        'documents': [{'bucket': 'input-bucket', 'pdfKey': key, 'fileId': f'file-{index}'} for index, key in enumerate(records)],
+    }
+
+
+def test_batch_reports_each_document_separately(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/a.txt', b'first document\n')
+    stub_s3.add_object('input-bucket', 'uploads/b.md', b'# second\n\ndocument\n')
+
+    result = lambda_module.handler(batch_event('uploads/a.txt', 'uploads/missing.txt', 'uploads/b.md', 'uploads/c.xlsx'), None)
+
+    statuses = [(document['pdfKey'], document['status']) for document in result['documents']]
+    assert statuses == [
+        ('uploads/a.txt', 'succeeded'),
+        ('uploads/missing.txt', 'failed'),
+        ('uploads/b.md', 'succeeded'),
+        ('uploads/c.xlsx', 'skipped'),
+    ]
+    assert (result['succeeded'], result['failed'], result['skipped']) == (2, 1, 1)
+    assert 'NoSuchKey' in result['documents'][1]['error']
+    assert result['documents'][0]['items'] == [{'key': 'images/a-1.jpeg', 'page': 1, 'filename': 'a', 'fileId': 'file-0'}]
+    assert result['documents'][2]['resultBucket'] == 'result-bucket'
+
+
+def test_records_override_shared_fields(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/a.txt', b'first document\n')
+    event = batch_event('uploads/a.txt')
+    event['documents'][0]['outputPrefix'] = 'custom'
+
+    result = lambda_module.handler(event, None)
+
+    assert result['documents'][0]['items'][0]['key'] == 'custom/a-1.jpeg'
+
+
+@requires_poppler
+def test_batch_of_pdfs_matches_single_invocations(lambda_module, stub_s3, monkeypatch):
+    # The single invocations have to render again rather than resume the batch's pages
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    monkeypatch.setattr(lambda_module, 'PROGRESS_MANIFEST_ENABLED', False)
+    keys = [f'uploads/fax-{n}.pdf' for n in range(5)]
+    for n, key in enumerate(keys):
+        stub_s3.add_object('input-bucket', key, make_pdf(n + 1))
+
+    event = batch_event(*keys)
+    shared = {key: value for key, value in event.items() if key != 'documents'}
+
+    batch = lambda_module.handler(event, None)
+    batch_puts = len(stub_s3.puts)
+    singles = [lambda_module.handler({**shared, **record}, None) for record in event['documents']]
+
+    assert len(stub_s3.puts) - batch_puts == 1 + 2 + 3 + 4 + 5
+
+    assert [document['pages'] for document in batch['documents']] == [1, 2, 3, 4, 5]
+    assert [document['items'] for document in batch['documents']] == [single['items'] for single in singles]
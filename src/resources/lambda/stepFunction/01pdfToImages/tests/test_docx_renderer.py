@@ -0,0 +1,88 @@
+from io import BytesIO
+
+from docx import Document
+
+from conftest import make_event
+from docx_renderer import layout_docx
+
+
+def referral_form(rows: int = 60) -> bytes:
+    document = Document()
+    document.add_heading('Referral form', 1)
+    document.add_paragraph('Please complete every field below.')
+    table = document.add_table(rows=rows, cols=3)
+    for number, row in enumerate(table.rows):
+        row.cells[0].text = f'Field {number}'
+        row.cells[1].text = f'Value {number}'
+        row.cells[2].text = 'Checked'
+    document.add_page_break()
+    document.add_paragraph('Signature')
+
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def test_table_rows_stay_together_on_one_line(tmp_path):
+    path = tmp_path / 'form.docx'
+    path.write_bytes(referral_form(rows=3))
+
+    pages = layout_docx(str(path), 'form')
+
+    assert len(pages) == 2
+    assert 'Field 1 | Value 1 | Checked' in pages[0].text_lines
+    assert len(pages[0].rules) == 9
+    assert pages[1].text == 'Signature'
+
+
+def test_tall_table_continues_on_the_next_page(tmp_path):
+    path = tmp_path / 'form.docx'
+    path.write_bytes(referral_form(rows=120))
+
+    pages = layout_docx(str(path))
+
+    rows = [line for page in pages for line in page.text_lines if line.startswith('Field ')]
+    assert rows == [f'Field {number} | Value {number} | Checked' for number in range(120)]
+    assert len(pages) == 4
+
+
+def clinical_notes() -> bytes:
+    document = Document()
+    for number in range(120):
+        document.add_paragraph(f'Note {number}: patient reviewed in clinic, medication unchanged, follow-up booked in two weeks.')
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def test_layout_keeps_paragraphs_without_adding_pages(lambda_module, stub_s3, monkeypatch):
+    stub_s3.add_object('input-bucket', 'uploads/form.docx', clinical_notes())
+
+    laid_out = lambda_module.handler(make_event('uploads/form.docx', outputPrefix='layout'), None)
+    monkeypatch.setattr(lambda_module, 'DOCX_RENDERER', 'text')
+    flattened = lambda_module.handler(make_event('uploads/form.docx', outputPrefix='text'), None)
+
+    # Flattening runs every paragraph together, which is as dense as text can get
+    assert laid_out['pages'] <= flattened['pages']
+    assert ('result-bucket', 'layout/form-1.jpeg') in stub_s3.objects
+
+
+def test_text_mode_returns_table_rows(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/form.docx', referral_form(rows=2))
+
+    result = lambda_module.handler(make_event('uploads/form.docx', outputMode='text'), None)
+
+    first_page = stub_s3.objects[('result-bucket', result['items'][0]['key'])]['Body'].decode('utf-8')
+    assert 'Field 0 | Value 0 | Checked' in first_page
+
+
+def test_unreadable_docx_falls_back_to_mammoth(lambda_module, stub_s3, monkeypatch):
+    stub_s3.add_object('input-bucket', 'uploads/form.docx', referral_form(rows=2))
+
+    def fail(*args):
+        raise ValueError('unsupported content')
+
+    monkeypatch.setattr(lambda_module, 'layout_docx', fail)
+    result = lambda_module.handler(make_event('uploads/form.docx'), None)
+
+    assert result['pages'] == 1
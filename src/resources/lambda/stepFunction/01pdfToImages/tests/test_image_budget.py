@@ -0,0 +1,65 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from conftest import make_event
+from image_budget import VISION_PATCH_SIZE, fit_to_token_budget, image_tokens, plan_tiles
+
+DENSE_TEXT = '\n'.join(f'Referral notes line {line} with a long sentence of clinical text' for line in range(200)).encode('utf-8')
+
+
+def page_size(stub_s3, key):
+    with Image.open(BytesIO(stub_s3.objects[('result-bucket', key)]['Body'])) as image:
+        return image.size
+
+
+@pytest.mark.parametrize('width, height, max_tokens', [(2480, 3508, 1024), (1700, 2200, 256), (3508, 2480, 64), (500, 300, 4096)])
+def test_tiles_stay_within_budget_and_cover_the_page(width, height, max_tokens):
+    tiles = plan_tiles(width, height, max_tokens)
+
+    covered = Image.new('1', (width, height), 0)
+    for left, top, right, bottom in tiles:
+        assert 0 <= left < right <= width and 0 <= top < bottom <= height
+        assert image_tokens(right - left, bottom - top) <= max_tokens
+        covered.paste(1, (left, top, right, bottom))
+    assert covered.getextrema() == (1, 1)
+
+
+def test_budget_below_minimum_is_rejected():
+    with pytest.raises(ValueError):
+        plan_tiles(2480, 3508, 16)
+
+
+def test_fitted_page_is_whole_patches_within_budget():
+    fitted = fit_to_token_budget(Image.new('L', (2480, 3508), 255), 1024)
+
+    assert fitted.width % VISION_PATCH_SIZE == 0 and fitted.height % VISION_PATCH_SIZE == 0
+    assert image_tokens(*fitted.size) <= 1024
+    assert abs(fitted.width / fitted.height - 2480 / 3508) < 0.05
+
+
+def test_token_budget_downscales_pages(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', b'Short note\n')
+
+    full = lambda_module.handler(make_event('uploads/notes.txt', outputPrefix='full'), None)
+    budgeted = lambda_module.handler(make_event('uploads/notes.txt', outputPrefix='budget', maxImageTokens=1024), None)
+
+    full_size = page_size(stub_s3, full['items'][0]['key'])
+    budgeted_size = page_size(stub_s3, budgeted['items'][0]['key'])
+    assert image_tokens(*full_size) > 1024 >= image_tokens(*budgeted_size)
+
+
+def test_dense_pages_are_tiled(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', DENSE_TEXT)
+
+    result = lambda_module.handler(make_event('uploads/notes.txt', maxImageTokens=1024, tileDensePages=True), None)
+
+    first_page = [item for item in result['items'] if item['page'] == 1]
+    assert len(first_page) > 1
+    assert first_page[0]['key'] == 'images/notes-1-tile-1.jpeg'
+    for item in first_page:
+        assert item['tile']['count'] == len(first_page)
+        assert page_size(stub_s3, item['key']) == (item['tile']['width'], item['tile']['height'])
+        assert image_tokens(item['tile']['width'], item['tile']['height']) <= 1024
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from conftest import make_event
+
+
+def emitted_metrics(output: str) -> dict:
+    """Merge every EMF record printed by Metrics into {name: values}."""
+    records = [json.loads(line) for line in output.splitlines() if line.startswith('{') and '"_aws"' in line]
+    merged = {}
+    for record in records:
+        merged.update({key: value for key, value in record.items() if key != '_aws'})
+    return merged
+
+
+def test_conversion_emits_per_stage_metrics(lambda_module, stub_s3, capsys):
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', b'line\n' * 200)
+
+    result = lambda_module.handler(make_event('uploads/notes.txt'), None)
+
+    emitted = emitted_metrics(capsys.readouterr().out)
+    assert result['pages'] == 4
+    assert emitted['FileType'] == 'txt'
+    assert emitted['Pages'] == [4]
+    assert len(emitted['PageRenderTime']) == len(emitted['PageEncodeTime']) == len(emitted['PageUploadTime']) == 4
+    assert emitted['BytesUploaded'] == [sum(len(stub_s3.objects[('result-bucket', item['key'])]['Body']) for item in result['items'])]
+    assert emitted['BytesDownloaded'] == [1000]
+    assert emitted['PeakRss'][0] > 0
+
+
+def test_failed_conversion_is_counted(lambda_module, capsys):
+    with pytest.raises(ClientError):
+        lambda_module.handler(make_event('uploads/missing.txt'), None)
+
+    assert emitted_metrics(capsys.readouterr().out)['FailedDocuments'] == [1]
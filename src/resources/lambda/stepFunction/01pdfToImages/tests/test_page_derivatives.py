@@ -0,0 +1,128 @@
+import json
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from conftest import make_event, make_pdf, requires_poppler
+from page_derivatives import get_derivative_key, parse_derivatives
+
+PDF_KEY = 'uploads/fax.pdf'
+TEXT_KEY = 'uploads/notes.txt'
+
+
+def read_index(stub_s3, result):
+    location = result['pageIndex']
+    return json.loads(stub_s3.objects[(location['bucket'], location['key'])]['Body'])
+
+
+def test_parse_derivatives_rejects_unknown_names():
+    assert parse_derivatives('') == ()
+    assert parse_derivatives('original, thumbnail') == ('thumbnail', 'original')
+    with pytest.raises(ValueError, match='Unknown page derivatives: poster'):
+        parse_derivatives(['thumbnail', 'poster'])
+
+
+def test_no_derivatives_by_default(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', TEXT_KEY, b'Plain text')
+
+    result = lambda_module.handler(make_event(TEXT_KEY), None)
+
+    assert 'pageIndex' not in result
+    assert stub_s3.keys('result-bucket', prefix='images/') == ['images/notes-1.jpeg']
+
+
+def test_thumbnails_and_index_written_with_pages(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'THUMBNAIL_MAX_PX', 100)
+    stub_s3.add_object('input-bucket', TEXT_KEY, ('line of text\n' * 200).encode('utf-8'))
+
+    result = lambda_module.handler(make_event(TEXT_KEY, derivatives='thumbnail,original'), None)
+
+    # Thumbnails are not items, so extraction still sees only the model-input pages
+    assert [item['key'] for item in result['items']] == [f'images/notes-{page}.jpeg' for page in range(1, result['pages'] + 1)]
+    assert result['pageIndex'] == {'bucket': 'result-bucket', 'key': 'images/notes-pages.json'}
+
+    index = read_index(stub_s3, result)
+    assert [page['page'] for page in index['pages']] == [item['page'] for item in result['items']]
+    assert index['fileId'] == 'file-id'
+    assert index['source'] == {'bucket': 'input-bucket', 'key': TEXT_KEY}
+    assert index['derivatives'] == ['model', 'thumbnail', 'original']
+    first = index['pages'][0]
+    assert first['model'] == {'key': 'images/notes-1.jpeg', 'contentType': 'image/jpeg', 'bytes': len(stub_s3.objects[('result-bucket', 'images/notes-1.jpeg')]['Body'])}
+    assert first['original'] == {'key': 'images/notes-1-original.png', 'contentType': 'image/png', 'dpi': lambda_module.ORIGINAL_DPI, 'lazy': True}
+
+    thumbnail = stub_s3.objects[('result-bucket', first['thumbnail']['key'])]
+    assert thumbnail['ContentType'] == 'image/jpeg'
+    with Image.open(BytesIO(thumbnail['Body'])) as image:
+        assert max(image.size) == 100
+        assert image.size == (first['thumbnail']['width'], first['thumbnail']['height'])
+
+    # Originals are only listed until someone asks for them
+    assert ('result-bucket', 'images/notes-1-original.png') not in stub_s3.objects
+
+
+def test_text_output_has_no_derivatives(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', TEXT_KEY, b'Plain text')
+
+    result = lambda_module.handler(make_event(TEXT_KEY, outputMode='text', derivatives='thumbnail'), None)
+
+    assert 'pageIndex' not in result
+    assert not any(key.endswith('-thumbnail.jpeg') for key in stub_s3.keys('result-bucket'))
+
+
+def test_derive_renders_original_once(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', TEXT_KEY, ('line of text\n' * 200).encode('utf-8'))
+    event = make_event(TEXT_KEY, action='derive', page=2)
+
+    derived = lambda_module.handler(event, None)
+
+    assert derived['generated'] is True
+    assert derived['key'] == get_derivative_key({'filename': 'notes', 'outputPrefix': 'images'}, 2, 'original')
+    stored = stub_s3.objects[('result-bucket', derived['key'])]
+    assert stored['ContentType'] == 'image/png'
+    with Image.open(BytesIO(stored['Body'])) as image:
+        assert image.format == 'PNG'
+        assert image.size == (derived['width'], derived['height'])
+
+    puts = len(stub_s3.puts)
+    again = lambda_module.handler(event, None)
+
+    assert again['generated'] is False
+    assert again['bytes'] == derived['bytes']
+    assert len(stub_s3.puts) == puts
+
+
+def test_derive_rejects_pages_outside_document(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', TEXT_KEY, b'Plain text')
+
+    with pytest.raises(ValueError, match='outside'):
+        lambda_module.handler(make_event(TEXT_KEY, action='derive', page=5), None)
+
+
+@requires_poppler
+def test_derive_renders_pdf_page_at_original_dpi(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'ORIGINAL_DPI', 144)
+    stub_s3.add_object('input-bucket', PDF_KEY, make_pdf(2))
+
+    derived = lambda_module.handler(make_event(PDF_KEY, action='derive', page=2), None)
+
+    # Letter pages are 8.5 x 11 inches, independent of the profile used for the model input
+    assert (derived['width'], derived['height']) == (1224, 1584)
+
+
+@requires_poppler
+def test_sharded_index_parts_are_merged(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'PDF_SHARD_PAGES', 2)
+    stub_s3.add_object('input-bucket', PDF_KEY, make_pdf(5))
+    event = make_event(PDF_KEY, derivatives=['thumbnail'])
+
+    plan = lambda_module.handler({'action': 'plan', 'document': event}, None)
+    shard_results = [lambda_module.handler(shard, None) for shard in plan['shards']]
+    merged = lambda_module.handler({'action': 'merge', 'document': plan, 'shards': shard_results}, None)
+
+    assert [shard['pageIndex']['key'] for shard in shard_results] == ['images/fax-pages-1-2.json', 'images/fax-pages-3-4.json', 'images/fax-pages-5-5.json']
+    assert merged['pageIndex'] == {'bucket': 'result-bucket', 'key': 'images/fax-pages.json'}
+    index = read_index(stub_s3, merged)
+    assert [page['page'] for page in index['pages']] == [1, 2, 3, 4, 5]
+    assert [page['thumbnail']['key'] for page in index['pages']] == [f'images/fax-{page}-thumbnail.jpeg' for page in range(1, 6)]
+    assert all('original' not in page for page in index['pages'])
@@ -0,0 +1,79 @@
+import random
+from io import BytesIO
+
+import pytest
+
+from conftest import make_event
+from page_filter import PageFilter, page_signature
+from text_renderer import LINE_HEIGHT, MARGIN, PAGE_HEIGHT, PAGE_WIDTH, PageCanvas
+
+LINES_PER_TITLED_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT - 2
+
+
+def scanned_page(lines, speckle_seed=None) -> bytes:
+    """A 10pt text page on an off-white background, optionally with scanner speckle."""
+    image = PageCanvas('L').render(lines).point(lambda value: min(value, 245))
+    if speckle_seed is not None:
+        generator = random.Random(speckle_seed)
+        for _ in range(3000):
+            image.putpixel((generator.randrange(PAGE_WIDTH), generator.randrange(PAGE_HEIGHT)), 0)
+
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def test_speckled_scan_is_blank_but_a_single_word_is_not():
+    assert page_signature(scanned_page([], speckle_seed=1)).ink_ratio == 0
+    assert page_signature(scanned_page(['Page 2'])).ink_ratio > 0
+
+    page_filter = PageFilter('flag')
+    assert page_filter.check(1, scanned_page([], speckle_seed=1)) == {'page': 1, 'reason': 'blank'}
+    assert page_filter.check(2, scanned_page(['Page 2'])) is None
+
+
+def test_only_near_identical_pages_are_duplicates():
+    cover = ['FAX COVER SHEET', 'To: Intake', 'From: Clinic', 'Pages: 4', 'Date: 2024-03-01']
+    page_filter = PageFilter('drop')
+
+    assert page_filter.check(1, scanned_page(cover)) is None
+    assert page_filter.check(2, scanned_page(cover[:3] + ['Pages: 5'] + cover[4:])) is None
+    assert page_filter.check(3, scanned_page(cover, speckle_seed=2)) == {'page': 3, 'reason': 'duplicate', 'duplicateOf': 1}
+    assert page_filter.skipped_pages == [{'page': 3, 'reason': 'duplicate', 'duplicateOf': 1}]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        PageFilter('skip')
+
+
+def repeated_page_text() -> bytes:
+    first = [f'Referral {line}' for line in range(LINES_PER_TITLED_PAGE)]
+    repeated = [f'Repeated notes {line}' for line in range(LINES_PER_TITLED_PAGE)]
+    blank = [''] * LINES_PER_TITLED_PAGE
+    last = [f'Signature {line}' for line in range(3)]
+    return '\n'.join(first + repeated + repeated + blank + last).encode('utf-8')
+
+
+def test_drop_mode_leaves_blank_and_repeated_pages_out(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/fax.txt', repeated_page_text())
+
+    result = lambda_module.handler(make_event('uploads/fax.txt', pageFilter='drop'), None)
+
+    assert [item['page'] for item in result['items']] == [1, 2, 5]
+    assert result['skippedPages'] == [
+        {'page': 3, 'reason': 'duplicate', 'duplicateOf': 2},
+        {'page': 4, 'reason': 'blank'},
+    ]
+    assert ('result-bucket', 'images/fax-3.jpeg') not in stub_s3.objects
+
+
+def test_flag_mode_keeps_pages_and_marks_them(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/fax.txt', repeated_page_text())
+
+    result = lambda_module.handler(make_event('uploads/fax.txt', pageFilter='flag'), None)
+
+    assert [(item['page'], item.get('skipped')) for item in result['items']] == [
+        (1, None), (2, None), (3, 'duplicate'), (4, 'blank'), (5, None),
+    ]
+    assert len(result['skippedPages']) == 2
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from page_uploader import MIN_PART_SIZE, BufferReader, PageUploader
+
+
+def test_buffer_reader_reads_a_view_in_chunks():
+    data = bytes(range(256)) * 10
+    reader = BufferReader(memoryview(data)[100:2100])
+
+    assert len(reader) == 2000
+    chunks = iter(lambda: reader.read(300), b'')
+    assert b''.join(chunks) == data[100:2100]
+    reader.seek(0)
+    assert reader.read() == data[100:2100]
+
+
+def test_large_page_is_uploaded_in_parts(stub_s3):
+    page = os.urandom(2 * MIN_PART_SIZE + 123)
+
+    with PageUploader(stub_s3, 2, len(page), multipart_threshold=MIN_PART_SIZE, part_size=MIN_PART_SIZE) as uploader:
+        uploader.submit('bucket', 'large.png', page, 'image/png')
+        uploader.submit('bucket', 'small.png', b'small', 'image/png')
+        uploader.wait()
+
+    assert stub_s3.objects[('bucket', 'large.png')]['Body'] == page
+    assert stub_s3.objects[('bucket', 'small.png')]['Body'] == b'small'
+    assert not stub_s3.multipart_uploads
+
+
+def test_failed_part_aborts_the_upload(stub_s3, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError('connection reset')
+
+    monkeypatch.setattr(stub_s3, 'upload_part', fail)
+
+    with pytest.raises(RuntimeError):
+        with PageUploader(stub_s3, 1, MIN_PART_SIZE * 2, multipart_threshold=MIN_PART_SIZE) as uploader:
+            uploader.submit('bucket', 'large.png', bytes(MIN_PART_SIZE + 1), 'image/png')
+            uploader.wait()
+
+    assert stub_s3.aborted == ['upload-1']
+    assert ('bucket', 'large.png') not in stub_s3.objects
@@ -0,0 +1,56 @@
+from conftest import make_event, make_pdf, requires_poppler
+
+from process_pool import resolve_workers
+
+
+def rendered_pages(stub_s3, result):
+    return [stub_s3.objects[('result-bucket', item['key'])]['Body'] for item in result['items']]
+
+
+def page_puts(stub_s3):
+    return [key for _, key in stub_s3.puts if key.startswith('images/')]
+
+
+def test_resolve_workers():
+    assert resolve_workers('3') == 3
+    assert resolve_workers('0') == 1
+    assert resolve_workers('auto') >= 1
+
+
+@requires_poppler
+def test_pdf_workers_produce_the_same_pages_as_inline_rendering(lambda_module, stub_s3, monkeypatch):
+    # Both runs have to render: neither may reuse the first one's pages
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    monkeypatch.setattr(lambda_module, 'PROGRESS_MANIFEST_ENABLED', False)
+    monkeypatch.setattr(lambda_module, 'PDF_RENDER_WINDOW', 2)
+    stub_s3.add_object('input-bucket', 'uploads/fax.pdf', make_pdf(7))
+
+    monkeypatch.setattr(lambda_module, 'PDF_RENDER_WORKERS', 1)
+    inline = lambda_module.handler(make_event('uploads/fax.pdf'), None)
+    inline_pages = rendered_pages(stub_s3, inline)
+
+    inline_puts = len(page_puts(stub_s3))
+    monkeypatch.setattr(lambda_module, 'PDF_RENDER_WORKERS', 3)
+    parallel = lambda_module.handler(make_event('uploads/fax.pdf'), None)
+
+    assert len(page_puts(stub_s3)) - inline_puts == 7
+    assert [item['page'] for item in parallel['items']] == list(range(1, 8))
+    assert parallel['items'] == inline['items']
+    assert rendered_pages(stub_s3, parallel) == inline_pages
+
+
+def test_text_workers_encode_in_the_worker_processes(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    monkeypatch.setattr(lambda_module, 'PROGRESS_MANIFEST_ENABLED', False)
+    stub_s3.add_object('input-bucket', 'uploads/log.txt', '\n'.join(f'entry {n}' for n in range(200)).encode())
+
+    monkeypatch.setattr(lambda_module, 'TEXT_RENDER_WORKERS', 1)
+    inline_pages = rendered_pages(stub_s3, lambda_module.handler(make_event('uploads/log.txt'), None))
+
+    inline_puts = len(page_puts(stub_s3))
+    monkeypatch.setattr(lambda_module, 'TEXT_RENDER_WORKERS', 2)
+    parallel = lambda_module.handler(make_event('uploads/log.txt'), None)
+
+    assert parallel['pages'] == 4
+    assert len(page_puts(stub_s3)) - inline_puts == 4
+    assert rendered_pages(stub_s3, parallel) == inline_pages
@@ -0,0 +1,97 @@
+import pytest
+
+from conftest import make_event, make_pdf, requires_poppler
+
+TEXT = b'Line of a long fax transcript\n' * 300
+
+
+def fail_page_puts_after(stub_s3, monkeypatch, allowed):
+    """Make every page upload after the first `allowed` fail, like an invocation timing out mid-document."""
+    put_object = stub_s3.put_object
+    page_puts = []
+
+    def failing_put_object(Bucket, Key, Body, **kwargs):
+        if Key.startswith('images/'):
+            if len(page_puts) >= allowed:
+                raise TimeoutError('Task timed out')
+            page_puts.append(Key)
+        return put_object(Bucket, Key, Body, **kwargs)
+
+    monkeypatch.setattr(stub_s3, 'put_object', failing_put_object)
+    return lambda: monkeypatch.setattr(stub_s3, 'put_object', put_object)
+
+
+def page_puts(stub_s3):
+    return [key for _, key in stub_s3.puts if key.startswith('images/')]
+
+
+def test_retry_renders_only_pages_missing_from_the_manifest(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    monkeypatch.setattr(lambda_module, 'PROGRESS_CHECKPOINT_PAGES', 1)
+    monkeypatch.setattr(lambda_module, 'UPLOAD_CONCURRENCY', 1)
+    stub_s3.add_object('input-bucket', 'uploads/long.txt', TEXT)
+
+    restore = fail_page_puts_after(stub_s3, monkeypatch, 2)
+    # The invocation fails, so Step Functions retries the shard
+    with pytest.raises(TimeoutError):
+        lambda_module.handler(make_event('uploads/long.txt'), None)
+    first_attempt = page_puts(stub_s3)
+
+    restore()
+    result = lambda_module.handler(make_event('uploads/long.txt'), None)
+    second_attempt = page_puts(stub_s3)[len(first_attempt):]
+
+    assert len(first_attempt) == 2
+    assert [item['page'] for item in result['items']] == list(range(1, result['pages'] + 1))
+    assert sorted(first_attempt + second_attempt) == sorted(item['key'] for item in result['items'])
+
+
+def test_completed_conversion_is_returned_without_rendering(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    stub_s3.add_object('input-bucket', 'uploads/long.txt', TEXT)
+
+    first = lambda_module.handler(make_event('uploads/long.txt'), None)
+    rendered = len(page_puts(stub_s3))
+    second = lambda_module.handler(make_event('uploads/long.txt'), None)
+
+    assert len(page_puts(stub_s3)) == rendered
+    assert second['items'] == first['items']
+
+
+def test_replaced_source_discards_progress(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    stub_s3.add_object('input-bucket', 'uploads/long.txt', TEXT)
+    lambda_module.handler(make_event('uploads/long.txt'), None)
+    rendered = len(page_puts(stub_s3))
+
+    stub_s3.add_object('input-bucket', 'uploads/long.txt', TEXT + b'one more line\n')
+    lambda_module.handler(make_event('uploads/long.txt'), None)
+
+    assert len(page_puts(stub_s3)) >= 2 * rendered
+
+
+@requires_poppler
+def test_pdf_shard_resumes_from_its_own_manifest(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'RENDER_CACHE_ENABLED', False)
+    monkeypatch.setattr(lambda_module, 'PROGRESS_CHECKPOINT_PAGES', 1)
+    monkeypatch.setattr(lambda_module, 'UPLOAD_CONCURRENCY', 1)
+    monkeypatch.setattr(lambda_module, 'PDF_RENDER_WORKERS', 1)
+    stub_s3.add_object('input-bucket', 'uploads/scan.pdf', make_pdf(6))
+    event = make_event('uploads/scan.pdf', pageStart=2, pageEnd=5)
+
+    rendered = []
+    iter_encoded_pdf_pages = lambda_module.iter_encoded_pdf_pages
+    def recording_iter(pdf_path, page_numbers, *args):
+        rendered.append(list(page_numbers))
+        return iter_encoded_pdf_pages(pdf_path, page_numbers, *args)
+    monkeypatch.setattr(lambda_module, 'iter_encoded_pdf_pages', recording_iter)
+
+    restore = fail_page_puts_after(stub_s3, monkeypatch, 1)
+    with pytest.raises(TimeoutError):
+        lambda_module.handler(event, None)
+    restore()
+    result = lambda_module.handler(event, None)
+
+    assert rendered == [[2, 3, 4, 5], [3, 4, 5]]
+    assert [item['page'] for item in result['items']] == [2, 3, 4, 5]
+    assert ('result-bucket', 'progress/file-id/pages-2-5.json') in stub_s3.objects
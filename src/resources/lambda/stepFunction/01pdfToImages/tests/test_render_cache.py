@@ -0,0 +1,36 @@
+from conftest import make_event
+
+TEXT = b'Line of a re-sent fax\n' * 200
+
+
+def test_identical_upload_reuses_rendered_pages(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/fax.txt', TEXT)
+    first = lambda_module.handler(make_event('uploads/fax.txt'), None)
+    rendered_puts = len(stub_s3.puts)
+
+    second = lambda_module.handler(make_event('uploads/fax.txt', fileId='retry'), None)
+
+    assert len(stub_s3.puts) == rendered_puts
+    assert [item['key'] for item in second['items']] == [item['key'] for item in first['items']]
+    assert {item['fileId'] for item in second['items']} == {'retry'}
+    assert lambda_module.render_cache.stats['hits'] >= 1
+
+
+def test_changed_render_params_miss_the_cache(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/fax.txt', TEXT)
+    lambda_module.handler(make_event('uploads/fax.txt'), None)
+    rendered_puts = len(stub_s3.puts)
+
+    lambda_module.handler(make_event('uploads/fax.txt', format='png'), None)
+
+    assert len(stub_s3.puts) > rendered_puts
+
+
+def test_overwritten_cached_page_is_rendered_again(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/fax.txt', TEXT)
+    first = lambda_module.handler(make_event('uploads/fax.txt'), None)
+    stub_s3.add_object('result-bucket', first['items'][0]['key'], b'another document')
+
+    lambda_module.handler(make_event('uploads/fax.txt'), None)
+
+    assert stub_s3.objects[('result-bucket', first['items'][0]['key'])]['Body'] != b'another document'
@@ -0,0 +1,38 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from conftest import make_event
+from render_profiles import encode_image, fit_to_profile, get_render_profile
+
+
+def test_standard_profile_keeps_event_format():
+    assert get_render_profile('standard', 'png').format == 'png'
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        get_render_profile('does-not-exist', 'jpeg')
+
+
+def test_fax_profile_downscales_to_grayscale_jpeg():
+    profile = get_render_profile('fax-grayscale-jpeg-q80', 'png')
+    page = Image.new('RGB', (2550, 3300), color='white')
+
+    encoded = encode_image(fit_to_profile(page, profile), profile)
+
+    decoded = Image.open(BytesIO(encoded))
+    assert decoded.format == 'JPEG'
+    assert decoded.mode == 'L'
+    assert decoded.width <= profile.max_width and decoded.height <= profile.max_height
+
+
+def test_event_profile_sets_key_extension(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', b'hello\n')
+
+    result = lambda_module.handler(make_event('uploads/notes.txt', renderProfile='fax-bilevel-png'), None)
+
+    key = result['items'][0]['key']
+    assert key == 'images/notes-1.png'
+    assert stub_s3.objects[('result-bucket', key)]['ContentType'] == 'image/png'
@@ -0,0 +1,62 @@
+import threading
+import time
+
+from page_uploader import PageUploader
+from s3_io import LimitedS3Client
+
+
+class CountingS3:
+    """Records the largest number of put_object calls running at once."""
+
+    def __init__(self, stub_s3):
+        self._stub = stub_s3
+        self._lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def put_object(self, **kwargs):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.01)
+        with self._lock:
+            self.running -= 1
+        return self._stub.put_object(**kwargs)
+
+
+def test_uploads_from_several_pools_share_the_limit(stub_s3):
+    counting = CountingS3(stub_s3)
+    client = LimitedS3Client(counting, 3)
+
+    def upload(prefix):
+        with PageUploader(client, 4, 1024) as uploader:
+            for page in range(8):
+                uploader.submit('bucket', f'{prefix}/{page}.png', b'page', 'image/png')
+            uploader.wait()
+
+    documents = [threading.Thread(target=upload, args=(f'document-{number}',)) for number in range(2)]
+    for document in documents:
+        document.start()
+    for document in documents:
+        document.join()
+
+    assert len(stub_s3.puts) == 16
+    assert counting.peak == 3
+
+
+def test_get_holds_its_slot_until_the_body_is_read(stub_s3):
+    stub_s3.add_object('bucket', 'source.pdf', b'x' * 10)
+    client = LimitedS3Client(stub_s3, 1)
+
+    body = client.get_object(Bucket='bucket', Key='source.pdf')['Body']
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(client.head_object(Bucket='bucket', Key='source.pdf')))
+    waiter.start()
+    waiter.join(0.1)
+    assert not acquired
+
+    assert body.read(4) == b'xxxx'
+    assert body.read(100) == b'x' * 6
+    assert body.read(100) == b''
+    waiter.join(1)
+    assert acquired[0]['ContentLength'] == 10
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import make_event, make_pdf, requires_poppler
+
+PDF_KEY = 'uploads/fax.pdf'
+
+
+def run_sharded(lambda_module, event):
+    plan = lambda_module.handler({'action': 'plan', 'document': event}, None)
+    shard_results = [lambda_module.handler(shard, None) for shard in plan['shards']]
+    return lambda_module.handler({'action': 'merge', 'document': plan, 'shards': shard_results}, None)
+
+
+def test_plan_splits_pdf_into_page_ranges(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'PDF_SHARD_PAGES', 4)
+    stub_s3.add_object('input-bucket', PDF_KEY, make_pdf(10))
+
+    plan = lambda_module.handler({'action': 'plan', 'document': make_event(PDF_KEY)}, None)
+
+    assert plan['pages'] == 10
+    assert [(shard['pageStart'], shard['pageEnd']) for shard in plan['shards']] == [(1, 4), (5, 8), (9, 10)]
+    assert stub_s3.puts == []
+
+
+def test_plan_keeps_non_pdf_as_single_shard(lambda_module, stub_s3):
+    event = make_event('uploads/notes.txt')
+
+    plan = lambda_module.handler({'action': 'plan', 'document': event}, None)
+
+    assert plan['shards'] == [event]
+
+
+def test_merge_reports_failed_shard(lambda_module):
+    failed = {'statusCode': 500, 'body': '{"message": "boom"}'}
+
+    with pytest.raises(Exception, match='Shard failed'):
+        lambda_module.handler({'action': 'merge', 'document': make_event(PDF_KEY), 'shards': [failed]}, None)
+
+
+@requires_poppler
+def test_sharded_run_matches_single_shot(lambda_module, stub_s3, monkeypatch):
+    monkeypatch.setattr(lambda_module, 'PDF_SHARD_PAGES', 3)
+    stub_s3.add_object('input-bucket', PDF_KEY, make_pdf(7))
+    event = make_event(PDF_KEY)
+
+    single = lambda_module.handler(event, None)
+    single_keys = stub_s3.keys('result-bucket', prefix='images/')
+    for bucket_key in list(stub_s3.objects):
+        if bucket_key[0] == 'result-bucket':
+            del stub_s3.objects[bucket_key]
+
+    sharded = run_sharded(lambda_module, event)
+
+    assert sharded['items'] == single['items']
+    assert sharded['pages'] == single['pages'] == 7
+    assert [item['page'] for item in sharded['items']] == list(range(1, 8))
+    assert stub_s3.keys('result-bucket', prefix='images/') == single_keys
@@ -0,0 +1,73 @@
+import os
+from io import BytesIO
+
+import pytest
+
+import source_download
+from conftest import make_event
+from source_download import SourceTooLargeError, chunk_ranges, downloaded_source
+
+
+def test_chunk_ranges_cover_the_object_exactly():
+    assert list(chunk_ranges(10, 4)) == [(0, 3), (4, 7), (8, 9)]
+    assert list(chunk_ranges(0, 4)) == []
+
+
+def test_ranged_chunks_reassemble_the_object(stub_s3):
+    body = os.urandom(100_000)
+    stub_s3.add_object('input-bucket', 'uploads/big.pdf', body)
+
+    with downloaded_source(stub_s3, 'input-bucket', 'uploads/big.pdf', '.pdf', max_bytes=1_000_000, chunk_size=16_384, max_workers=4) as (path, metadata):
+        with open(path, 'rb') as downloaded:
+            assert downloaded.read() == body
+        assert metadata['size'] == len(body)
+        assert metadata['chunks'] == 7
+        assert all(get_range is not None for _, _, get_range in stub_s3.gets)
+
+    assert not os.path.exists(path)
+
+
+def test_oversized_source_is_rejected_before_download(stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/huge.pdf', b'x' * 2048)
+
+    with pytest.raises(SourceTooLargeError):
+        with downloaded_source(stub_s3, 'input-bucket', 'uploads/huge.pdf', '.pdf', max_bytes=1024):
+            pass
+
+    assert stub_s3.gets == []
+
+
+def test_handler_logs_source_metadata_but_not_content(lambda_module, stub_s3, monkeypatch):
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', b'confidential referral details\n')
+    logged = []
+    monkeypatch.setattr(lambda_module.logger, 'info', lambda message, *args, **kwargs: logged.append(f"{message} {kwargs.get('extra')}"))
+
+    result = lambda_module.handler(make_event('uploads/notes.txt'), None)
+
+    assert result['pages'] == 1
+    assert any(message.startswith('Downloaded source file') and "'size': 30" in message for message in logged)
+    assert not any('confidential referral details' in message for message in logged)
+
+
+def test_broken_range_is_requested_again(stub_s3, monkeypatch):
+    body = os.urandom(50_000)
+    stub_s3.add_object('input-bucket', 'uploads/big.pdf', body)
+    monkeypatch.setattr(source_download, 'RANGE_RETRY_BASE_SECONDS', 0)
+    get_object = stub_s3.get_object
+    broken = []
+
+    def flaky_get_object(**kwargs):
+        response = get_object(**kwargs)
+        if kwargs['Range'] == 'bytes=16384-32767' and not broken:
+            broken.append(kwargs['Range'])
+            response['Body'] = BytesIO(response['Body'].read()[:100])
+        return response
+
+    monkeypatch.setattr(stub_s3, 'get_object', flaky_get_object)
+
+    with downloaded_source(stub_s3, 'input-bucket', 'uploads/big.pdf', '.pdf', max_bytes=1_000_000, chunk_size=16_384, max_workers=2) as (path, metadata):
+        with open(path, 'rb') as downloaded:
+            assert downloaded.read() == body
+
+    assert broken == ['bytes=16384-32767']
+    assert [get_range for _, _, get_range in stub_s3.gets].count('bytes=16384-32767') == 2
@@ -0,0 +1,64 @@
+import PyPDF2
+
+from conftest import make_event, make_pdf, make_text_pdf, requires_poppler
+from text_extraction import extract_pdf_page_texts, has_usable_text_layer
+
+SENTENCE = 'Patient name: Jordan Smith. Date of birth: 01/02/1980. Referral for cardiology review.'
+
+
+def test_text_layer_heuristic():
+    assert has_usable_text_layer(SENTENCE)
+    assert not has_usable_text_layer('')
+    assert not has_usable_text_layer('Page 1')
+    assert not has_usable_text_layer('�' * 60)
+    assert not has_usable_text_layer(' '.join(['¤¦§¨©'] * 20))
+
+
+def test_pdf_is_read_from_a_file_handle(lambda_module, tmp_path, monkeypatch):
+    pdf_path = tmp_path / 'scan.pdf'
+    pdf_path.write_bytes(make_text_pdf([SENTENCE, 'Second page']))
+    sources = []
+    reader = PyPDF2.PdfReader
+    def recording_reader(stream, *args, **kwargs):
+        sources.append(stream)
+        return reader(stream, *args, **kwargs)
+    monkeypatch.setattr(PyPDF2, 'PdfReader', recording_reader)
+
+    assert extract_pdf_page_texts(str(pdf_path), [1])[1].startswith('Patient name')
+    assert lambda_module.get_pdf_page_count(str(pdf_path)) == 2
+    # A path would make PyPDF2 read the whole document into memory
+    assert all(hasattr(source, 'read') for source in sources) and len(sources) == 2
+
+
+def test_text_mode_emits_text_items_for_txt(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', b'first line\nsecond line\n')
+
+    result = lambda_module.handler(make_event('uploads/notes.txt', outputMode='text'), None)
+
+    assert result['items'] == [
+        {'key': 'images/notes-1.txt', 'page': 1, 'filename': 'notes', 'fileId': 'file-id', 'contentType': 'text'}
+    ]
+    assert stub_s3.objects[('result-bucket', 'images/notes-1.txt')]['Body'] == b'first line\nsecond line\n'
+    assert stub_s3.keys('result-bucket', prefix='images/') == ['images/notes-1.txt']
+
+
+def test_hybrid_mode_links_text_to_image_items(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/notes.txt', b'first line\n')
+
+    result = lambda_module.handler(make_event('uploads/notes.txt', outputMode='hybrid'), None)
+
+    assert result['items'] == [
+        {'key': 'images/notes-1.jpeg', 'page': 1, 'filename': 'notes', 'fileId': 'file-id', 'textKey': 'images/notes-1.txt'}
+    ]
+
+
+@requires_poppler
+def test_text_mode_only_renders_pdf_pages_without_text_layer(lambda_module, stub_s3):
+    stub_s3.add_object('input-bucket', 'uploads/typed.pdf', make_text_pdf([SENTENCE, SENTENCE]))
+    stub_s3.add_object('input-bucket', 'uploads/scan.pdf', make_pdf(2))
+
+    typed = lambda_module.handler(make_event('uploads/typed.pdf', outputMode='text'), None)
+    scan = lambda_module.handler(make_event('uploads/scan.pdf', outputMode='text'), None)
+
+    assert [(item['page'], item.get('contentType')) for item in typed['items']] == [(1, 'text'), (2, 'text')]
+    assert [item['key'] for item in scan['items']] == ['images/scan-1.jpeg', 'images/scan-2.jpeg']
@@ -0,0 +1,32 @@
+from text_renderer import LINE_HEIGHT, MARGIN, MAX_CHARS_PER_LINE, PAGE_HEIGHT, iter_text_pages, paginate_text
+
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+
+
+def test_paginate_wraps_long_lines_and_keeps_blank_lines():
+    text = 'short line\n\n' + 'word ' * 40
+
+    pages = paginate_text(text)
+
+    assert pages[0][:2] == ['short line', '']
+    assert all(len(line) <= MAX_CHARS_PER_LINE for line in pages[0])
+    assert len(pages[0]) == 5
+
+
+def test_title_reserves_two_lines_on_every_page():
+    text = '\n'.join(f'line {n}' for n in range(LINES_PER_PAGE * 2))
+
+    pages = paginate_text(text, title='title')
+
+    assert [len(page) for page in pages[:2]] == [LINES_PER_PAGE - 2, LINES_PER_PAGE - 2]
+    assert sum(len(page) for page in pages) == LINES_PER_PAGE * 2
+
+
+def test_parallel_rendering_matches_inline_rendering():
+    pages = paginate_text('\n'.join(f'log entry {n} status=ok' for n in range(LINES_PER_PAGE * 3)), title='log')
+
+    inline = [(number, image.tobytes()) for number, image in iter_text_pages(pages, 'log', 'L', workers=1)]
+    parallel = [(number, image.tobytes()) for number, image in iter_text_pages(pages, 'log', 'L', workers=2)]
+
+    assert [number for number, _ in inline] == [1, 2, 3, 4]
+    assert parallel == inline
@@ -0,0 +1,19 @@
+import text_renderer
+
+
+def test_warmup_event_initializes_without_touching_s3(lambda_module, stub_s3):
+    # The renderer caches are shared with other tests, so start from empty ones
+    text_renderer.get_font.cache_clear()
+    text_renderer.get_word_mask.cache_clear()
+
+    result = lambda_module.handler({'action': 'warmup'}, None)
+
+    assert result['warm'] is True
+    assert set(result['timings']) == {'importsMs', 'fontsMs', 'popplerMs'}
+    assert stub_s3.gets == []
+    assert stub_s3.puts == []
+    # Fonts were loaded and common glyphs rasterized ahead of the first page
+    assert text_renderer.get_font.cache_info().currsize > 0
+    assert text_renderer.get_word_mask.cache_info().currsize > 0
+    # Poppler is only validated once per container
+    assert lambda_module.verify_poppler.cache_info().currsize == 1
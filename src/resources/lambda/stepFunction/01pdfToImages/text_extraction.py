@@ -0,0 +1,65 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+from text_renderer import paginate_text
+
+# A page needs at least this much extracted text before it is trusted over OCR
+MIN_TEXT_CHARS = 40
+MIN_WORDS = 8
+# Share of characters that must be letters, digits, punctuation or whitespace
+MIN_PRINTABLE_RATIO = 0.9
+# Share of "words" that must look like words rather than glyph soup from a broken font encoding
+MIN_WORDLIKE_RATIO = 0.6
+
+WORD_PATTERN = re.compile(r'\S+')
+WORDLIKE_PATTERN = re.compile(r"^[\w'’.,:;!?()/%&$#@+\-\"]{1,25}$")
+
+
+def has_usable_text_layer(text: Optional[str]) -> bool:
+    """Decide whether a PDF page's embedded text can replace OCR of its image.
+
+    Scans usually have no text layer at all; PDFs produced by broken or subset fonts
+    often have one full of replacement and control characters or run-together glyphs.
+    Both cases fall back to rendering the page for the vision model.
+    """
+    if not text:
+        return False
+
+    stripped = text.strip()
+    if len(stripped) < MIN_TEXT_CHARS:
+        return False
+
+    # U+FFFD is what extractors emit for glyphs they could not map back to characters
+    printable = sum(1 for char in stripped if (char.isprintable() or char.isspace()) and char != '\ufffd')
+    if printable / len(stripped) < MIN_PRINTABLE_RATIO:
+        return False
+
+    words = WORD_PATTERN.findall(stripped)
+    if len(words) < MIN_WORDS:
+        return False
+
+    wordlike = sum(1 for word in words if WORDLIKE_PATTERN.match(word))
+    return wordlike / len(words) >= MIN_WORDLIKE_RATIO
+
+
+def extract_pdf_page_texts(pdf_path: str, page_numbers: Iterable[int]) -> Dict[int, str]:
+    """Extract the embedded text layer of the given 1-based pages with PyPDF2."""
+    from PyPDF2 import PdfReader
+
+    page_texts = {}
+    # Given a path, PyPDF2 reads the whole file into memory; a handle is read as pages need it
+    with open(pdf_path, 'rb') as pdf_file:
+        reader = PdfReader(pdf_file)
+        for page_number in page_numbers:
+            try:
+                page_texts[page_number] = reader.pages[page_number - 1].extract_text() or ''
+            except Exception:
+                # A page PyPDF2 cannot parse is treated as having no text layer
+                page_texts[page_number] = ''
+
+    return page_texts
+
+
+def paginate_plain_text(text: str, title: Optional[str] = None) -> List[str]:
+    """Split text into page-sized chunks that line up with the rendered text pages."""
+    return ['\n'.join(page_lines) for page_lines in paginate_text(text, title)]
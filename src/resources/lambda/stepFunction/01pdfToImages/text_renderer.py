@@ -0,0 +1,151 @@
+import textwrap
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image, ImageDraw, ImageFont
+
+from process_pool import imap_ordered
+
+# Constants for text rendering
+PAGE_WIDTH = 2480  # A4 at 300 DPI
+PAGE_HEIGHT = 3508
+MARGIN = 200
+FONT_SIZE = 36
+LINE_HEIGHT = int(FONT_SIZE * 1.5)
+MAX_CHARS_PER_LINE = 80
+FONT_NAME = "DejaVuSans.ttf"
+BOLD_FONT_NAME = "DejaVuSans-Bold.ttf"
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int = FONT_SIZE, bold: bool = False) -> ImageFont.ImageFont:
+    """Load the text font once per container and size."""
+    try:
+        # Try to use a standard font
+        return ImageFont.truetype(BOLD_FONT_NAME if bold else FONT_NAME, size)
+    except IOError:
+        # Fallback to default
+        return ImageFont.load_default()
+
+
+def wrap_lines(text: str) -> Iterator[str]:
+    """Wrap text to the page width, preserving empty lines."""
+    for line in text.split('\n'):
+        expanded = line.expandtabs()
+        if expanded.strip() == '':
+            yield ''
+        elif len(expanded) <= MAX_CHARS_PER_LINE:
+            # Most lines already fit; textwrap is by far the slowest step for large logs
+            yield expanded.rstrip()
+        else:
+            yield from textwrap.wrap(expanded, width=MAX_CHARS_PER_LINE)
+
+
+def paginate_text(text: str, title: Optional[str] = None) -> List[List[str]]:
+    """Split text into pages of wrapped lines in a single pass."""
+    lines_per_page = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+    if title:
+        lines_per_page -= 2  # Reserve space for title and a blank line
+
+    pages = []
+    current_page_lines = []
+    for line in wrap_lines(text):
+        if len(current_page_lines) >= lines_per_page:
+            pages.append(current_page_lines)
+            current_page_lines = []
+        current_page_lines.append(line)
+
+    if current_page_lines:
+        pages.append(current_page_lines)
+
+    return pages
+
+
+@lru_cache(maxsize=20000)
+def get_word_mask(word: str, size: int = FONT_SIZE, bold: bool = False) -> Tuple[Image.Image, int, int, float]:
+    """Rasterize a word once and return (coverage mask, x offset, y offset, advance width).
+
+    Text pages repeat the same words constantly, and FreeType rasterization is by far the
+    most expensive part of drawing a page, so pages are composed from cached word masks.
+    """
+    font = get_font(size, bold)
+    left, top, right, bottom = font.getbbox(word)
+    mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), word, font=font, fill=255)
+    return mask, left, top, font.getlength(word)
+
+
+class PageCanvas:
+    """A single page-sized image that is cleared and redrawn for every page."""
+
+    def __init__(self, mode: str):
+        self.image = Image.new(mode, (PAGE_WIDTH, PAGE_HEIGHT), color=255)
+        self.draw = ImageDraw.Draw(self.image)
+        self.font = get_font()
+        self.space_width = self.font.getlength(' ')
+
+    def draw_line(self, y_position: int, line: str) -> None:
+        x_position = float(MARGIN)
+        for word in line.split(' '):
+            if word:
+                mask, left, top, advance = get_word_mask(word)
+                self.image.paste(0, (round(x_position) + left, y_position + top), mask)
+                x_position += advance
+            x_position += self.space_width
+
+    def render(self, page_lines: List[str], title: Optional[str] = None) -> Image.Image:
+        self.image.paste(255, (0, 0, PAGE_WIDTH, PAGE_HEIGHT))
+
+        y_position = MARGIN
+        if title:
+            self.draw.text((MARGIN, y_position), title, font=self.font, fill=0)
+            y_position += LINE_HEIGHT * 2  # Move down after title + blank line
+
+        for line in page_lines:
+            self.draw_line(y_position, line)
+            y_position += LINE_HEIGHT
+
+        return self.image
+
+
+def iter_text_pages(pages: List[List[str]], title: Optional[str] = None, mode: str = 'L', workers: int = 1, encode: Optional[Callable[[Image.Image], bytes]] = None, page_numbers: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Union[Image.Image, bytes]]]:
+    """Yield (page_number, image) pairs for paginated text, or (page_number, encoded bytes) with `encode`.
+
+    With one worker, every page is drawn on the same canvas, so each image is only
+    valid until the next one is requested. With more workers, pages are drawn in
+    forked processes and returned as encoded buffers when `encode` is given (so the
+    encoding also leaves the main interpreter), otherwise as raw pixel buffers.
+    `page_numbers` (1-based) limits rendering to those pages.
+    """
+    return iter_canvas_pages(
+        lambda: PageCanvas(mode),
+        lambda canvas, index: canvas.render(pages[index], title if index == 0 else None),
+        len(pages), mode, workers, encode, page_numbers
+    )
+
+
+def iter_canvas_pages(new_canvas: Callable[[], Any], render: Callable[[Any, int], Image.Image], page_count: int, mode: str, workers: int = 1, encode: Optional[Callable[[Image.Image], bytes]] = None, page_numbers: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, Union[Image.Image, bytes]]]:
+    """Draw pages with `render(canvas, index)` on reused canvases, serially or in forked workers.
+
+    `new_canvas()` returns an object with an `image` attribute; each process makes one.
+    Results are as described for iter_text_pages.
+    """
+    indexes = list(range(page_count)) if page_numbers is None else sorted(page - 1 for page in page_numbers)
+    if workers <= 1 or len(indexes) <= 1:
+        canvas = new_canvas()
+        for index in indexes:
+            image = render(canvas, index)
+            yield index + 1, encode(image) if encode else image
+        canvas.image.close()
+        return
+
+    worker_canvas = {}
+
+    def render_in_worker(index: int) -> bytes:
+        if 'canvas' not in worker_canvas:
+            worker_canvas['canvas'] = new_canvas()
+        image = render(worker_canvas['canvas'], index)
+        return encode(image) if encode else image.tobytes()
+
+    for index, buffer in zip(indexes, imap_ordered(render_in_worker, indexes, workers)):
+        yield index + 1, buffer if encode else Image.frombytes(mode, (PAGE_WIDTH, PAGE_HEIGHT), buffer)
@@ -2,7 +2,7 @@ import { runLLMExtraction } from './helpers';
 import { ALL_EXTRACTION_FIELDS } from '../../../../shared/constants/fields';
 import { errorHandler } from '../../../../shared/services/Errors';
 import { generateFaxExtractionPrompt } from '../../../../shared/services/PromptGenerator';
-import { getFileAsJson, getFileAsPresignedUrl, uploadFile } from '../../../../shared/services/S3';
+import { getFileAsJson, getFileAsPresignedUrl, getFileAsString, uploadFile } from '../../../../shared/services/S3';
 import { LambdaHandlerEvent } from '../../../../shared/types';
 import { extractPayload, parseFieldsFromLLMResponse, parseLLMResponseSafe } from '../../helper';
 
@@ -16,9 +16,11 @@ export const handler = async (event: LambdaHandlerEvent) => {
     const payload = extractPayload(event).Event;
     if (!payload) throw new Error('Payload is required');
 
-    const { key, page, filename, fileId } = payload;
-    const imagePresignedUrl = await getFileAsPresignedUrl(ASYNC_S3_BUCKET, key);
-    const imageData = { url: imagePresignedUrl, page };
+    const { key, page, filename, fileId, contentType } = payload;
+    // Text-native pages carry their extracted text instead of an image for the model to read back
+    const imageData = contentType === 'text'
+      ? { url: '', page, text: await getFileAsString(ASYNC_S3_BUCKET, key) }
+      : { url: await getFileAsPresignedUrl(ASYNC_S3_BUCKET, key), page };
 
     // Get extracted data
     const resultKey = `text/${filename}.json`;
@@ -1,6 +1,6 @@
 import { pollAsyncResult, processImageAsync } from '../../../../shared/services/models/qwenVision';
 
-export const runLLMExtraction = async (imageData: { url: string; page: number }, prompt: string) => {
+export const runLLMExtraction = async (imageData: { url: string; page: number; text?: string }, prompt: string) => {
   const asyncResponse = await processImageAsync({ data: imageData, prompt });
   console.log('Async Response:', JSON.stringify(asyncResponse, null, 2));
 
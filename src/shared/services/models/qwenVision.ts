@@ -22,7 +22,7 @@ const formatQwenPayload = (request: VisionModelRequest) => {
   };
 };
 
-type Data = { url: string; page: number };
+type Data = { url: string; page: number; text?: string };
 
 export const processImageSynch = async ({
   data,
@@ -116,20 +116,26 @@ export const processImageAsync = async ({
   max_tokens?: number;
   customInferenceId?: string;
 }): Promise<AsyncModelResponse> => {
-  const imagesContent: { type: 'image_url'; image_url: { url: string } } = {
-    type: 'image_url',
-    image_url: {
-      url: data.url,
-    },
-  };
-  console.log('imagesContent', imagesContent);
+  // Pages with a text layer are sent as text, which is far cheaper than an image prompt
+  const pageContent: { type: 'text' | 'image_url'; text?: string; image_url?: { url: string } } = data.text !== undefined
+    ? {
+      type: 'text',
+      text: `Document text (page ${data.page}):\n${data.text}`,
+    }
+    : {
+      type: 'image_url',
+      image_url: {
+        url: data.url,
+      },
+    };
+  console.log('pageContent', pageContent);
 
   const request: VisionModelRequest = {
     messages: [
       {
         role: 'user',
         content: [
-          imagesContent,
+          pageContent,
           { type: 'text', text: prompt },
         ],
       },
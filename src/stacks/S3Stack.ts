@@ -138,6 +138,15 @@ export class S3Stack extends cdk.Stack {
       blockPublicAccess: BlockPublicAccess.BLOCK_ALL,
       enforceSSL: true,
       autoDeleteObjects: this.removalPolicy === RemovalPolicy.DESTROY,
+      lifecycleRules: [
+        {
+          // Conversion progress manifests (PROGRESS_PREFIX in the pdfToImages lambda) only matter while a run can be retried
+          id: 'expire-conversion-progress',
+          prefix: 'progress/',
+          expiration: cdk.Duration.days(7),
+          noncurrentVersionExpiration: cdk.Duration.days(1),
+        },
+      ],
     });
 
     this.sageMakerAsyncBucket.addToResourcePolicy(
@@ -24,6 +24,17 @@ export interface LlamaNemotronStackProps extends cdk.StackProps {
   readonly sageMakerAsyncBucket: IBucket;
   readonly labels: Labels;
   readonly huggingfaceHubToken: string;
+  /**
+   * How model updates reach the endpoint: 'BLUE_GREEN' shifts traffic to a new fleet once it
+   * passes a health check probe, 'RECREATE' deletes and recreates the endpoint.
+   */
+  readonly deploymentMode?: string;
+  /**
+   * TGI batching limits, async concurrency per instance and autoscaling of the endpoint:
+   * 'standard', 'balanced', 'throughput' or 'scale-to-zero' (see deployModel/throughput_profiles.py).
+   * Defaults to 'standard', which keeps TGI's own limits.
+   */
+  readonly throughputProfile?: string;
 }
 
 export class SageMakerStack extends NestedStack {
@@ -38,6 +49,8 @@ export class SageMakerStack extends NestedStack {
   public readonly removalPolicy = RemovalPolicy.DESTROY;
   public readonly sageMakerAsyncBucket: IBucket;
   public readonly huggingfaceHubToken: string;
+  public readonly deploymentMode: string;
+  public readonly throughputProfile: string;
 
   constructor(scope: Construct, id: string, props: LlamaNemotronStackProps) {
     super(scope, id, props);
@@ -53,6 +66,8 @@ export class SageMakerStack extends NestedStack {
     this.initialInstanceCount = props?.initialInstanceCount || 1;
     this.sageMakerAsyncBucket = props.sageMakerAsyncBucket;
     this.huggingfaceHubToken = props.huggingfaceHubToken;
+    this.deploymentMode = props?.deploymentMode || 'BLUE_GREEN';
+    this.throughputProfile = props?.throughputProfile || 'standard';
 
     // Security group
     const securityGroup = new SecurityGroup(scope, getCdkConstructId({ context: 'deploy-model-to-sagemaker', resourceName: 'security-group' }, this), {
@@ -137,6 +152,21 @@ export class SageMakerStack extends NestedStack {
       operations: ['PassRole'],
       resources: ['*'],
     }));
+    deployModelToSageMakerLambdaRole.addToPolicy(getPolicyStatement({
+      service: 'iam',
+      operations: ['CreateServiceLinkedRole'],
+      resources: ['arn:aws:iam::*:role/aws-service-role/sagemaker.application-autoscaling.amazonaws.com/*'],
+    }));
+    deployModelToSageMakerLambdaRole.addToPolicy(getPolicyStatement({
+      service: 'application-autoscaling',
+      operations: ['RegisterScalableTarget', 'DeregisterScalableTarget', 'PutScalingPolicy', 'DescribeScalableTargets', 'DescribeScalingPolicies'],
+      resources: ['*'],
+    }));
+    deployModelToSageMakerLambdaRole.addToPolicy(getPolicyStatement({
+      service: 'cloudwatch',
+      operations: ['PutMetricAlarm', 'DeleteAlarms', 'DescribeAlarms'],
+      resources: ['*'],
+    }));
     deployModelToSageMakerLambdaRole.addToPolicy(getPolicyStatement({
       service: 'logs',
       operations: [
@@ -156,6 +186,20 @@ export class SageMakerStack extends NestedStack {
       default: this.huggingfaceHubToken || '',
     });
 
+    const deployModelEnvironment = {
+      ROLE_ARN: sageMakerRole.roleArn,
+      HUGGINGFACE_HUB_TOKEN: huggingfaceHubTokenParam.valueAsString,
+      ENDPOINT_NAME: this.endpointName, // 'llama-nemotron-nano-endpoint',
+      MODEL_NAME: this.modelName, // 'llama-nemotron-nano-model',
+      HF_MODEL_ID: this.modelId, // 'nvidia/Llama-3.1-Nemotron-Nano-8B-v1', // 'Qwen/Qwen2.5-VL-7B-Instruct'
+      INSTANCE_TYPE: this.instanceType,
+      INSTANCE_COUNT: this.initialInstanceCount.toString(),
+      INFERENCE_TYPE: this.inferenceType,
+      ASYNC_S3_BUCKET: this.sageMakerAsyncBucket.bucketName,
+      DEPLOYMENT_MODE: this.deploymentMode,
+      THROUGHPUT_PROFILE: this.throughputProfile,
+    };
+
     // Lambdas
     const deployModelTOSageMakerName = getCdkConstructId({ context: 'deploy-model-to-sagemaker', resourceName: 'lambda' }, this);
     const deployModelToSageMakerLambda = new DockerImageFunction(this, deployModelTOSageMakerName, {
@@ -168,17 +212,24 @@ export class SageMakerStack extends NestedStack {
       vpc: this.vpc,
       securityGroups: [securityGroup],
       reservedConcurrentExecutions: 5,
-      environment: {
-        ROLE_ARN: sageMakerRole.roleArn,
-        HUGGINGFACE_HUB_TOKEN: huggingfaceHubTokenParam.valueAsString,
-        ENDPOINT_NAME: this.endpointName, // 'llama-nemotron-nano-endpoint',
-        MODEL_NAME: this.modelName, // 'llama-nemotron-nano-model',
-        HF_MODEL_ID: this.modelId, // 'nvidia/Llama-3.1-Nemotron-Nano-8B-v1', // 'Qwen/Qwen2.5-VL-7B-Instruct'
-        INSTANCE_TYPE: this.instanceType,
-        INSTANCE_COUNT: this.initialInstanceCount.toString(),
-        INFERENCE_TYPE: this.inferenceType,
-        ASYNC_S3_BUCKET: this.sageMakerAsyncBucket.bucketName,
-      },
+      environment: deployModelEnvironment,
+    });
+
+    // Polled by the provider until a blue/green update is in service and has passed its probe
+    const modelDeploymentCompleteName = getCdkConstructId({ context: 'deploy-model-to-sagemaker', resourceName: 'is-complete-lambda' }, this);
+    const modelDeploymentCompleteLambda = new DockerImageFunction(this, modelDeploymentCompleteName, {
+      functionName: modelDeploymentCompleteName,
+      code: DockerImageCode.fromImageAsset(path.join(__dirname, '../../resources/lambda/sageMaker/deployModel'), {
+        cmd: ['lambda.is_complete'],
+      }),
+      timeout: Duration.minutes(15),
+      memorySize: 1024,
+      architecture: Architecture.X86_64,
+      role: deployModelToSageMakerLambdaRole,
+      vpc: this.vpc,
+      securityGroups: [securityGroup],
+      reservedConcurrentExecutions: 5,
+      environment: deployModelEnvironment,
     });
 
     // Custom resource
@@ -232,6 +283,9 @@ export class SageMakerStack extends NestedStack {
 
     const customResourceProvider = new Provider(this, getCdkConstructId({ context: 'deploy-model-to-sagemaker', resourceName: 'custom-resource-provider' }, this), {
       onEventHandler: deployModelToSageMakerLambda,
+      isCompleteHandler: modelDeploymentCompleteLambda,
+      queryInterval: Duration.seconds(30),
+      totalTimeout: Duration.hours(2),
       vpc: this.vpc,
       role: customResourceProviderRole,
       securityGroups: [securityGroup],
@@ -239,7 +293,14 @@ export class SageMakerStack extends NestedStack {
 
     new CustomResource(this, getCdkConstructId({ context: 'deploy-model-to-sagemaker', resourceName: 'custom-resource' }, this), {
       serviceToken: customResourceProvider.serviceToken,
-      properties: {},
+      // A change to any of these rolls a new model version out to the endpoint
+      properties: {
+        ModelId: this.modelId,
+        InstanceType: this.instanceType,
+        InstanceCount: this.initialInstanceCount.toString(),
+        InferenceType: this.inferenceType,
+        ThroughputProfile: this.throughputProfile,
+      },
     });
 
     // Outputs
@@ -262,6 +323,7 @@ export class SageMakerStack extends NestedStack {
     NagSuppressions.addResourceSuppressions(
       [
         deployModelToSageMakerLambda,
+        modelDeploymentCompleteLambda,
         customResourceProvider,
       ],
       [{ id: 'HIPAA.Security-LambdaDLQ', reason: 'Lambda functions used in this solution are synchronous, DQL is not needed' }],
@@ -5,7 +5,7 @@ import { Table } from 'aws-cdk-lib/aws-dynamodb';
 import { IVpc, SecurityGroup } from 'aws-cdk-lib/aws-ec2';
 import { Role } from 'aws-cdk-lib/aws-iam';
 import { Key } from 'aws-cdk-lib/aws-kms';
-import { Architecture, DockerImageCode, DockerImageFunction } from 'aws-cdk-lib/aws-lambda';
+import { Architecture, DockerImageCode, DockerImageFunction, Tracing } from 'aws-cdk-lib/aws-lambda';
 import { LogGroup } from 'aws-cdk-lib/aws-logs';
 import { IBucket } from 'aws-cdk-lib/aws-s3';
 import { Chain, IntegrationPattern, StateMachine, StateMachineType } from 'aws-cdk-lib/aws-stepfunctions';
@@ -114,8 +114,24 @@ export class StepFunctionsStack extends NestedStack {
       vpc: this.vpc,
       securityGroups: [this.securityGroup],
       reservedConcurrentExecutions: 40,
+      tracing: Tracing.ACTIVE,
       environment: {
         REGION: this.region || 'eu-central-1',
+        POWERTOOLS_METRICS_NAMESPACE: 'DocumentProcessor',
+        PDF_SHARD_PAGES: '50',
+        RENDER_PROFILE: 'standard',
+        // One render worker process per vCPU the memory size grants
+        TEXT_RENDER_WORKERS: 'auto',
+        PDF_RENDER_WORKERS: 'auto',
+        OUTPUT_MODE: 'images',
+        // Blank and repeated pages are marked on their items but still extracted; 'drop' leaves them out (opt in per document with pageFilter)
+        PAGE_FILTER: 'flag',
+        // Sources are streamed to /tmp (512 MB by default), so the cap leaves room for temporary files
+        MAX_SOURCE_MB: '400',
+        // Documents converted at once by a batch ({ documents: [...] }) invocation
+        BATCH_CONCURRENCY: '4',
+        // Import converters and load fonts during init rather than on the first request
+        WARM_UP_ON_INIT: 'true',
       },
     });
 
@@ -142,9 +158,39 @@ export class StepFunctionsStack extends NestedStack {
     this.outputBucket.grantReadWrite(fileProcessingLambda);
 
     // Step Functions Tasks ---------------------------------------------------------------------------------------------
+    // Large PDFs are split into page ranges so rendering fans out across several invocations
+    const pdfToImagesPlanTask = new tasks.LambdaInvoke(this, getCdkConstructId({ context: 'pdf-to-images-plan', resourceName: 'task' }, this), {
+      lambdaFunction: pdfToImagesLambda,
+      integrationPattern: IntegrationPattern.REQUEST_RESPONSE,
+      payload: sfn.TaskInput.fromObject({
+        'action': 'plan',
+        'document.$': '$',
+      }),
+      taskTimeout: sfn.Timeout.duration(Duration.seconds(900)),
+    });
+
     const pdfToImagesTask = new tasks.LambdaInvoke(this, getCdkConstructId({ context: 'pdf-to-images', resourceName: 'task' }, this), {
       lambdaFunction: pdfToImagesLambda,
       integrationPattern: IntegrationPattern.REQUEST_RESPONSE,
+      payloadResponseOnly: true,
+      taskTimeout: sfn.Timeout.duration(Duration.seconds(900)),
+    });
+    // A shard that timed out or failed is run again and resumes from its progress manifest
+    pdfToImagesTask.addRetry({
+      errors: ['Sandbox.Timedout', 'States.TaskFailed'],
+      interval: Duration.seconds(10),
+      maxAttempts: 3,
+      backoffRate: 2,
+    });
+
+    const pdfToImagesMergeTask = new tasks.LambdaInvoke(this, getCdkConstructId({ context: 'pdf-to-images-merge', resourceName: 'task' }, this), {
+      lambdaFunction: pdfToImagesLambda,
+      integrationPattern: IntegrationPattern.REQUEST_RESPONSE,
+      payload: sfn.TaskInput.fromObject({
+        'action': 'merge',
+        'document.$': '$.Payload',
+        'shards.$': '$.shardResults',
+      }),
       taskTimeout: sfn.Timeout.duration(Duration.seconds(900)),
     });
 
@@ -161,7 +207,16 @@ export class StepFunctionsStack extends NestedStack {
     });
 
     // State Machines ---------------------------------------------------------------------------------------------
-    // 1) Map
+    // 1) Shards Map
+    const shardsMapState = new sfn.Map(this, getCdkConstructId({ context: 'render-shards', resourceName: 'map' }, this), {
+      itemsPath: '$.Payload.shards',
+      resultPath: '$.shardResults',
+      maxConcurrency: 10,
+    });
+
+    shardsMapState.itemProcessor(Chain.start(pdfToImagesTask));
+
+    // 2) Map
     const mapMapSubTasks = Chain
       .start(textExtractTask);
 
@@ -177,7 +232,9 @@ export class StepFunctionsStack extends NestedStack {
 
     // Define the state machine
     const processingMapChain = Chain
-      .start(pdfToImagesTask)
+      .start(pdfToImagesPlanTask)
+      .next(shardsMapState)
+      .next(pdfToImagesMergeTask)
       .next(mapMapState)
       .next(fileProcessingTask);
 